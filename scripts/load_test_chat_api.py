@@ -0,0 +1,177 @@
+"""Load test for the chat API, against a fake OpenAI-compatible LLM.
+
+Starts the chat API and a fake LLM server locally, creates one chat
+session per client through the API, then has every client send its
+messages one after another. Clients retry after the server's Retry-After
+when they get 429 Too Many Requests. Reports latency percentiles, with
+retries included, and requests per second.
+
+    python scripts/load_test_chat_api.py --clients 50 --messages 10 --llm-latency 0.2
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import time
+import uuid
+from typing import Tuple
+import httpx
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--clients", type=int, default=50)
+    parser.add_argument("--messages", type=int, default=10, help="per client")
+    parser.add_argument("--llm-latency", type=float, default=0.2, help="seconds")
+    parser.add_argument("--stream", action="store_true", help="use SSE replies")
+    parser.add_argument("--max-inflight", type=int, default=64)
+    parser.add_argument("--max-concurrent-runs", type=int, default=64)
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--llm-port", type=int, default=8101)
+    return parser.parse_args()
+
+
+def fake_llm_app(latency: float, reply: str = "This is a fake answer.") -> FastAPI:
+    """Minimal OpenAI chat completions endpoint answering after ``latency``."""
+    app = FastAPI()
+
+    @app.post("/v1/chat/completions")
+    async def completions(request: Request):
+        body = await request.json()
+        await asyncio.sleep(latency)
+        completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+        if not body.get("stream"):
+            return JSONResponse(
+                {
+                    "id": completion_id,
+                    "object": "chat.completion",
+                    "created": int(time.time()),
+                    "model": body["model"],
+                    "choices": [
+                        {
+                            "index": 0,
+                            "message": {"role": "assistant", "content": reply},
+                            "finish_reason": "stop",
+                        }
+                    ],
+                    "usage": {
+                        "prompt_tokens": 1,
+                        "completion_tokens": 1,
+                        "total_tokens": 2,
+                    },
+                }
+            )
+
+        async def chunks():
+            for n, word in enumerate(reply.split(" ")):
+                delta = {"content": word if n == 0 else " " + word}
+                yield _chunk(completion_id, body["model"], delta, None)
+            yield _chunk(completion_id, body["model"], {}, "stop")
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(chunks(), media_type="text/event-stream")
+
+    return app
+
+
+def _chunk(completion_id: str, model: str, delta: dict, finish_reason) -> str:
+    data = {
+        "id": completion_id,
+        "object": "chat.completion.chunk",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+    }
+    return f"data: {json.dumps(data)}\n\n"
+
+
+async def start_server(
+    app: FastAPI, port: int
+) -> Tuple[uvicorn.Server, asyncio.Task]:
+    """Serve ``app`` in the background, returning once it accepts requests."""
+    config = uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning")
+    server = uvicorn.Server(config)
+    task = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.01)
+    return server, task
+
+
+async def client_session(
+    client: httpx.AsyncClient, messages: int, stream: bool, stats: dict
+) -> None:
+    response = await client.post("/api/v1/sessions", json={"agent_type": "chat"})
+    response.raise_for_status()
+    session_id = response.json()["session_id"]
+    for n in range(messages):
+        body = {"session_id": session_id, "message": f"Question {n}", "stream": stream}
+        start = time.perf_counter()
+        while True:
+            response = await client.post("/api/v1/chat", json=body)
+            if response.status_code != 429:
+                break
+            stats["rejected"] += 1
+            await asyncio.sleep(float(response.headers.get("Retry-After", 1)))
+        if response.status_code == 200 and "event: error" not in response.text:
+            stats["latencies"].append(time.perf_counter() - start)
+        else:
+            stats["failed"] += 1
+
+
+async def run(args: argparse.Namespace) -> None:
+    # Settings are read on import, so point the LLM clients at the fake first
+    os.environ["BOTIFY_LLM_BASE_URL"] = f"http://127.0.0.1:{args.llm_port}/v1"
+    os.environ.setdefault("OPENAI_API_KEY", "load-test")
+    os.environ.setdefault("TAVILY_API_KEY", "load-test")
+    from botify.app import create_api
+    from botify.services.agent_service import AgentService
+    from botify.services.session_store import create_session_store
+
+    service = AgentService(
+        max_concurrent_runs=args.max_concurrent_runs, store=create_session_store("")
+    )
+    api = create_api(agent_service=service)
+    api.state.chat_limit.limit = args.max_inflight
+    llm_server = await start_server(fake_llm_app(args.llm_latency), args.llm_port)
+    api_server = await start_server(api, args.port)
+
+    stats = {"latencies": [], "rejected": 0, "failed": 0}
+    limits = httpx.Limits(max_connections=args.clients)
+    async with httpx.AsyncClient(
+        base_url=f"http://127.0.0.1:{args.port}", limits=limits, timeout=60
+    ) as client:
+        start = time.perf_counter()
+        await asyncio.gather(
+            *(
+                client_session(client, args.messages, args.stream, stats)
+                for _ in range(args.clients)
+            )
+        )
+        elapsed = time.perf_counter() - start
+
+    for server, task in (api_server, llm_server):
+        server.should_exit = True
+        await task
+    latencies = stats["latencies"]
+    if len(latencies) < 2:
+        print(f"Only {len(latencies)} requests succeeded; {stats['failed']} failed")
+        return
+    quantiles = statistics.quantiles(latencies, n=100)
+    print(
+        f"{args.clients} clients x {args.messages} messages, "
+        f"{args.llm_latency * 1e3:.0f}ms LLM latency"
+        f"{', streamed' if args.stream else ''}:\n"
+        f"  p50 {quantiles[49] * 1e3:.0f}ms  p99 {quantiles[98] * 1e3:.0f}ms  "
+        f"{len(latencies) / elapsed:.1f} requests/s\n"
+        f"  {len(latencies)} answered, {stats['failed']} failed, "
+        f"{stats['rejected']} retried after 429"
+    )
+
+
+if __name__ == "__main__":
+    asyncio.run(run(parse_args()))
@@ -1,63 +1,105 @@
 import importlib
 import inspect
+from importlib.metadata import entry_points
 from pathlib import Path
-from typing import Type, Dict
+from typing import Type, Dict, Optional
+from langchain_core.language_models import BaseChatModel
 from botify.agent.agents.base_agent import BaseAgent
-from langchain_openai import ChatOpenAI
+
+
+# Entry point group through which other packages add agents, e.g.
+#   [project.entry-points."botify.agents"]
+#   poet = "my_package.poet_agent:PoetAgent"
+ENTRY_POINT_GROUP = "botify.agents"
+
+
+def _agent_type(class_name: str) -> str:
+    # Convert class name to agent type (e.g., RAGAgent -> rag)
+    return class_name.lower().replace("agent", "")
 
 
 class AgentFactory:
-    """Factory class for creating agents with automatic loading."""
+    """Factory class for creating agents with automatic loading.
+
+    Agents are found without importing them: every ``*_agent.py`` module in
+    the agents directory, and every ``botify.agents`` entry point. An agent's
+    module is only imported when the agent is first created, as agents pull
+    in slow to import libraries.
+    """
 
+    # Where to import each agent type from, as "module" or "module:Class"
+    _agent_specs: Dict[str, str] = {}
     _agent_classes: Dict[str, Type[BaseAgent]] = {}
 
     @classmethod
-    def _load_agents(cls):
-        """Automatically load all agent classes from the agents directory."""
-        if not cls._agent_classes:
+    def _discover_agents(cls):
+        """List the agent types and where they live, without importing them."""
+        if not cls._agent_specs:
             # Get the directory containing the agent modules
             agents_dir = Path(__file__).parent / "agents"
 
-            # Iterate through all python files in the directory
-            for file_path in agents_dir.glob("*_agent.py"):
+            for file_path in sorted(agents_dir.glob("*_agent.py")):
                 if file_path.stem == "base_agent":
                     continue
+                # The module of an agent type is named after it, as the
+                # class is (e.g., chat_agent.py holds ChatAgent)
+                agent_type = _agent_type(file_path.stem.replace("_", ""))
+                cls._agent_specs[agent_type] = f"botify.agent.agents.{file_path.stem}"
 
-                # Import the module
-                module_name = f"botify.agent.agents.{file_path.stem}"
-                module = importlib.import_module(module_name)
+            for entry_point in entry_points(group=ENTRY_POINT_GROUP):
+                cls._agent_specs.setdefault(entry_point.name, entry_point.value)
 
-                # Find all classes that inherit from BaseAgent
+    @classmethod
+    def _load_agent(cls, agent_type: str) -> Optional[Type[BaseAgent]]:
+        """Import the agent type's class on first use."""
+        cls._discover_agents()
+        if agent_type not in cls._agent_classes and agent_type in cls._agent_specs:
+            module_name, _, class_name = cls._agent_specs[agent_type].partition(":")
+            module = importlib.import_module(module_name)
+            if class_name:
+                cls._agent_classes[agent_type] = getattr(module, class_name)
+            else:
+                # Find the class that inherits from BaseAgent
                 for name, obj in inspect.getmembers(module):
                     if (
                         inspect.isclass(obj)
                         and issubclass(obj, BaseAgent)
                         and obj != BaseAgent
+                        and _agent_type(name) == agent_type
                     ):
-                        # Convert class name to agent type (e.g., RAGAgent -> rag)
-                        agent_type = name.lower().replace("agent", "")
                         cls._agent_classes[agent_type] = obj
+        return cls._agent_classes.get(agent_type)
 
     @classmethod
-    def create(cls, agent_type: str, llm: ChatOpenAI=ChatOpenAI(model="gpt-4o-mini"), **kwargs) -> BaseAgent:
-        """Create an agent instance of the specified type."""
-        cls._load_agents()
+    def _load_agents(cls):
+        """Import every agent class, e.g. to check they all load."""
+        cls._discover_agents()
+        for agent_type in cls._agent_specs:
+            cls._load_agent(agent_type)
 
-        if agent_type not in cls._agent_classes:
-            raise ValueError(f"Unsupported agent type: {agent_type}")
+    @classmethod
+    def create(
+        cls, agent_type: str, llm: Optional[BaseChatModel] = None, **kwargs
+    ) -> BaseAgent:
+        """Create an agent instance of the specified type.
 
-        agent_class = cls._agent_classes[agent_type]
+        ``llm`` replaces the agent's main chat model. Without it, agents use
+        their default model from the shared client pool.
+        """
+        agent_class = cls._load_agent(agent_type)
+        if agent_class is None:
+            raise ValueError(f"Unsupported agent type: {agent_type}")
 
         return agent_class(llm, **kwargs)
 
     @classmethod
     def get_available_agents(cls) -> list[str]:
         """Get a list of available agent types."""
-        cls._load_agents()
-        return list(cls._agent_classes.keys())
+        cls._discover_agents()
+        return list(cls._agent_specs.keys())
 
     @classmethod
     def get_agent_list(cls) -> list[str]:
         """Get a list of available agent types."""
-        cls._load_agents()
-        return list(cls._agent_classes.keys())
+        cls._discover_agents()
+        return list(cls._agent_specs.keys())
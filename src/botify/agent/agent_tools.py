@@ -1,7 +1,8 @@
-from langchain_core.tools import tool
+from functools import lru_cache
+from typing import List
+from langchain_core.tools import BaseTool, tool
 from botify.logging.logger import logger
 from langgraph.prebuilt import ToolNode
-from langchain_community.tools import TavilySearchResults
 # from botify.agent.rag import retriever
 
 """
@@ -26,8 +27,6 @@ def get_coolest_cities():
     return "nyc, sf"
 
 
-search_tool = TavilySearchResults(max_results=5, search_depth="advanced")
-
 # retriever_tool = create_retriever_tool(
 #     retriever,
 #     "retrieve_blog_posts",
@@ -36,5 +35,20 @@ search_tool = TavilySearchResults(max_results=5, search_depth="advanced")
 # retriever_tools = [retriever_tool]
 # retriever_tool_node = ToolNode([retriever_tool])
 
-tools = [search_tool]
-tool_node = ToolNode(tools)
+@lru_cache(maxsize=None)
+def get_tools() -> List[BaseTool]:
+    """Tools of the chat agent, built on first use.
+
+    langchain_community is slow to import, so it is only imported once an
+    agent needs its tools rather than when the bot starts.
+    """
+    from langchain_community.tools import TavilySearchResults
+
+    search_tool = TavilySearchResults(max_results=5, search_depth="advanced")
+    return [search_tool]
+
+
+@lru_cache(maxsize=None)
+def get_tool_node() -> ToolNode:
+    """Graph node running the chat agent's tools, shared by all agents."""
+    return ToolNode(get_tools())
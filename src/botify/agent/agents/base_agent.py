@@ -1,17 +1,42 @@
 # src/botify/agent/agent_base.py
+import asyncio
 from abc import ABC, abstractmethod
-from typing import TypedDict
-from langchain_core.messages import BaseMessage
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import AsyncIterator, Callable, Optional, Tuple
+from langchain_core.chat_history import BaseChatMessageHistory
+from langchain_core.language_models import BaseChatModel
 from langchain_core.runnables import RunnableConfig
-from langchain_openai import ChatOpenAI
 from langgraph.graph import Graph
+from botify.config import settings
 
 
+_executor: Optional[ThreadPoolExecutor] = None
+
+
+def get_agent_executor() -> ThreadPoolExecutor:
+    """Bounded thread pool shared by agents that only implement a sync ``run``."""
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.agent_executor_workers,
+            thread_name_prefix="botify-agent",
+        )
+    return _executor
+
 
 class BaseAgent(ABC):
     """Abstract base class for all agents."""
 
-    def __init__(self, llm: ChatOpenAI):
+    # Builds the chat history for a session id. Set by the agent service so
+    # agents that keep history persist it in the session store.
+    history_factory: Optional[Callable[[str], BaseChatMessageHistory]] = None
+
+    # Graph nodes whose chat model output is the answer shown to the user,
+    # as opposed to tool calls, rewritten questions or relevance grades
+    stream_nodes: Tuple[str, ...] = ()
+
+    def __init__(self, llm: Optional[BaseChatModel]):
         self.llm = llm
 
     @abstractmethod
@@ -23,3 +48,81 @@ class BaseAgent(ABC):
     def run(self, inputs: dict, config: RunnableConfig):
         """Run the agent workflow."""
         pass
+
+    def close(self) -> None:
+        """Release resources held by the agent. Safe to call more than once."""
+        pass
+
+    def resource_weight(self) -> int:
+        """Rough memory cost of keeping this agent alive, used by session eviction."""
+        return 1
+
+    def cache_scope(self, session_id: str) -> Optional[str]:
+        """Hash of what this agent's answers depend on besides the question.
+
+        Answers are only reused between runs with the same scope. None, the
+        default, means answers are never cached.
+        """
+        return None
+
+    def cacheable(self, answer: str) -> bool:
+        """Whether an answer may be reused for similar questions."""
+        return bool(answer.strip())
+
+    def remember(self, session_id: str, question: str, answer: str) -> None:
+        """Record a turn answered from the cache, without running the agent."""
+        pass
+
+    async def arun(self, inputs: dict, config: RunnableConfig):
+        """Run the agent workflow without blocking the event loop.
+
+        Agents exposing a compiled graph as ``self.flow`` are driven through
+        ``ainvoke``. Anything else falls back to ``run`` on the shared,
+        bounded agent executor.
+        """
+        flow = getattr(self, "flow", None)
+        if flow is not None:
+            return await flow.ainvoke(inputs, config)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            get_agent_executor(), partial(self.run, inputs, config)
+        )
+
+    async def astream(self, inputs: dict, config: RunnableConfig) -> AsyncIterator[str]:
+        """Run the agent, yielding the answer text generated so far.
+
+        Tokens streamed by chat models inside ``stream_nodes`` are yielded as
+        they arrive, each item being the full text of the current model call.
+        The final answer is always yielded last, so agents that cannot
+        stream still produce one item.
+        """
+        flow = getattr(self, "flow", None)
+        if flow is None:
+            result = await self.arun(inputs, config)
+            yield result["messages"][-1].content
+            return
+
+        text = ""
+        run_id = None
+        output = None
+        async for event in flow.astream_events(inputs, config, version="v2"):
+            kind = event["event"]
+            if (
+                kind == "on_chat_model_stream"
+                and event["metadata"].get("langgraph_node") in self.stream_nodes
+            ):
+                chunk = event["data"]["chunk"].content
+                if not isinstance(chunk, str) or not chunk:
+                    continue
+                if event["run_id"] != run_id:
+                    # A later model call (e.g. after a tool call) starts over
+                    run_id = event["run_id"]
+                    text = ""
+                text += chunk
+                yield text
+            elif kind == "on_chain_end" and not event["parent_ids"]:
+                output = event["data"].get("output")
+
+        answer = output["messages"][-1].content if output else text
+        if answer != text or not text:
+            yield answer
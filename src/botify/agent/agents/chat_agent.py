@@ -1,14 +1,22 @@
-from typing import TypedDict, Dict
+from typing import TypedDict, Dict, Optional
 from langchain_core.messages import BaseMessage
-from langchain_core.chat_history import InMemoryChatMessageHistory
-from langchain_core.runnables import RunnableConfig
-from langchain_openai import ChatOpenAI
+from langchain_core.output_parsers import StrOutputParser
+from langchain_core.language_models import BaseChatModel
+from langchain_core.chat_history import (
+    BaseChatMessageHistory,
+    InMemoryChatMessageHistory,
+)
+from langchain_core.runnables import RunnableConfig, RunnableLambda
 from langgraph.graph import MessagesState, END
 from langgraph.graph import StateGraph, START
 from langgraph.graph import Graph
-from botify.logging.logger import logger
-from botify.agent.agent_tools import tools, tool_node
+from botify.config import settings
+from botify.logging.logger import log_payload, logger
+from botify.agent.agent_tools import get_tool_node, get_tools
 from botify.agent.agents.base_agent import BaseAgent
+from botify.agent.history import HistoryWindow
+from botify.agent.llm_pool import get_chat_model
+from botify.agent.prompts import SUMMARY_PROMPT
 
 
 class AgentState(TypedDict):
@@ -21,43 +29,94 @@ class AgentState(TypedDict):
 class ChatAgent(BaseAgent):
     """Wrapper class for LLM that manages chat history."""
 
-    def __init__(self, llm: ChatOpenAI):
-        self.llm = ChatOpenAI(model="gpt-4").bind_tools(tools)
-        self._chat_histories: Dict[str, InMemoryChatMessageHistory] = {}
+    stream_nodes = ("agent",)
+
+    def __init__(
+        self,
+        llm: Optional[BaseChatModel] = None,
+        max_history_tokens: int = settings.history_max_tokens,
+        summarize_history: bool = settings.history_summarize,
+    ):
+        if llm is None:
+            llm = get_chat_model("gpt-4")
+        self.llm = llm.bind_tools(get_tools())
+        self.max_history_tokens = max_history_tokens
+        self.summarizer = (
+            SUMMARY_PROMPT | llm | StrOutputParser() if summarize_history else None
+        )
+        self._chat_histories: Dict[str, BaseChatMessageHistory] = {}
+        self._windows: Dict[str, HistoryWindow] = {}
         self.flow = self.generate_flow()
 
-    def get_chat_history(self, session_id: str) -> InMemoryChatMessageHistory:
+    def get_chat_history(self, session_id: str) -> BaseChatMessageHistory:
         """Get or create chat history for a session."""
         if session_id not in self._chat_histories:
-            self._chat_histories[session_id] = InMemoryChatMessageHistory()
+            if self.history_factory is not None:
+                history = self.history_factory(session_id)
+            else:
+                history = InMemoryChatMessageHistory()
+            self._chat_histories[session_id] = history
         return self._chat_histories[session_id]
 
+    def resource_weight(self) -> int:
+        return 1 + sum(len(h.messages) for h in self._chat_histories.values())
+
+    def cache_scope(self, session_id: str) -> Optional[str]:
+        # Never cached: answers may come from live web searches, and questions
+        # differing in one entity ("weather in Paris" and "in Rome") can still
+        # be above the similarity threshold, serving one user's answer to others
+        return None
+
+    def get_history_window(self, session_id: str) -> HistoryWindow:
+        """Get or create the token-budgeted history window for a session."""
+        if session_id not in self._windows:
+            self._windows[session_id] = HistoryWindow(
+                self.get_chat_history(session_id),
+                max_tokens=self.max_history_tokens,
+                summarizer=self.summarizer,
+            )
+        return self._windows[session_id]
+
+    def _window_for(self, config: RunnableConfig) -> HistoryWindow:
+        if "configurable" not in config or "session_id" not in config["configurable"]:
+            raise ValueError(
+                "Make sure that the config includes the following information: {'configurable': {'session_id': 'some_value'}}"
+            )
+        return self.get_history_window(config["configurable"]["session_id"])
+
     def call_llm(
         self, state: MessagesState, config: RunnableConfig
     ) -> list[BaseMessage]:
-        logger.info(f"call_llm State: {state}")
+        log_payload("chat.call_llm", "call_llm state: {}", lambda: state)
         try:
-            if (
-                "configurable" not in config
-                or "session_id" not in config["configurable"]
-            ):
-                raise ValueError(
-                    "Make sure that the config includes the following information: {'configurable': {'session_id': 'some_value'}}"
-                )
-            chat_history = self.get_chat_history(config["configurable"]["session_id"])
-            messages = list(chat_history.messages) + state["messages"]
+            window = self._window_for(config)
+            messages = window.prompt(state["messages"])
             ai_message = self.llm.invoke(messages)
-            chat_history.add_messages(state["messages"] + [ai_message])
+            window.history.add_messages(state["messages"] + [ai_message])
         except Exception as e:
             logger.error(f"Error in call_llm: {e}")
+            raise
+        return {"messages": [ai_message]}
+
+    async def acall_llm(
+        self, state: MessagesState, config: RunnableConfig
+    ) -> list[BaseMessage]:
+        log_payload("chat.acall_llm", "acall_llm state: {}", lambda: state)
+        try:
+            window = self._window_for(config)
+            messages = await window.aprompt(state["messages"])
+            ai_message = await self.llm.ainvoke(messages)
+            window.history.add_messages(state["messages"] + [ai_message])
+        except Exception as e:
+            logger.error(f"Error in acall_llm: {e}")
+            raise
         return {"messages": [ai_message]}
 
     def should_continue(self, state: MessagesState, config: RunnableConfig) -> bool:
         try:
             aiMessage = state["messages"][-1]
-            logger.info(f"Type of aiMessage: {type(aiMessage)}")
-            logger.info(f"AiMessage: {aiMessage}")
-            logger.info(f"AiMessage tool_calls: {aiMessage.tool_calls}")
+            log_payload("chat.should_continue", "AiMessage: {}", lambda: aiMessage)
+            logger.debug("AiMessage tool_calls: {}", aiMessage.tool_calls)
             if aiMessage.tool_calls:
                 return "tools"
         except Exception as e:
@@ -67,8 +126,8 @@ class ChatAgent(BaseAgent):
     def generate_flow(self) -> Graph:
         workflow = StateGraph(AgentState)
 
-        workflow.add_node("agent", self.call_llm)
-        workflow.add_node("tools", tool_node)
+        workflow.add_node("agent", RunnableLambda(self.call_llm, afunc=self.acall_llm))
+        workflow.add_node("tools", get_tool_node())
 
         workflow.add_edge(START, "agent")
         workflow.add_conditional_edges("agent", self.should_continue, ["tools", END])
@@ -1,124 +1,304 @@
-from typing import Annotated, Sequence, Literal, List
+import hashlib
+from functools import lru_cache
+from typing import Annotated, Dict, Iterable, Sequence, Literal, List, Optional, Tuple
 from typing_extensions import TypedDict
-from langchain_core.messages import BaseMessage, HumanMessage
-from langchain_openai import ChatOpenAI, OpenAIEmbeddings
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage
+from langchain_core.language_models import BaseChatModel
 from pydantic import BaseModel, Field
 from langgraph.graph.message import add_messages
 from botify.logging.logger import logger
-from langchain_community.vectorstores import Chroma
-from langchain_text_splitters import RecursiveCharacterTextSplitter
 from langchain_core.documents import Document
 from langchain_core.output_parsers import StrOutputParser
-from langchain.prompts import PromptTemplate
-from langchain import hub
 from langgraph.graph import Graph, StateGraph, START, END
 from langgraph.prebuilt import tools_condition
 from langgraph.prebuilt import ToolNode
 from langchain_core.runnables import RunnableConfig
-import tempfile
-import shutil
-from langchain.tools.retriever import create_retriever_tool
-from botify.scraper.scraper import Scraper
+from botify.config import settings
+from botify.scraper.scraper import Scraper, SpooledDocuments
 from botify.agent.agents.base_agent import BaseAgent
+from botify.agent.llm_pool import get_chat_model
+from botify.agent.prompts import CHUNK_GRADE_PROMPT, RAG_PROMPT, REWRITE_PROMPT
+from botify.rag.bm25 import tokenize
+from botify.rag.chunking import Chunker, ChunkingConfig
+from botify.rag.document_index import (
+    DocumentIndex,
+    IndexEntry,
+    IngestionProgress,
+    get_document_index,
+)
+from botify.rag.retriever import (
+    MultiSourceRetriever,
+    create_retriever_tool,
+    format_retrieved,
+    get_reranker,
+    split_retrieved,
+)
 
 
 class RagAgentState(TypedDict):
     messages: Annotated[Sequence[BaseMessage], add_messages]
+    # Query rewrites done so far in this run
+    rewrites: int
+    # Retrieved chunks graded relevant, which the answer is generated from
+    context: str
+
+
+# Reply when every rewrite of the question retrieved nothing relevant
+FALLBACK_ANSWER = (
+    "I could not find anything about that in the pages I read. "
+    "Try rephrasing the question, or send me a page that covers it."
+)
+
+
+class ChunkGrades(BaseModel):
+    """Relevance check of each retrieved chunk."""
+
+    relevant_chunks: List[int] = Field(
+        description="Numbers of the chunks relevant to the question"
+    )
+
+
+# Chains are built once per process from the shared models and used by
+# every agent, instead of being rebuilt inside the graph nodes on every call.
+
+
+@lru_cache(maxsize=None)
+def _grade_chain(model: str):
+    return CHUNK_GRADE_PROMPT | get_chat_model(
+        model, temperature=0, streaming=True
+    ).with_structured_output(ChunkGrades)
+
+
+@lru_cache(maxsize=None)
+def _rag_chain(model: str):
+    return (
+        RAG_PROMPT
+        | get_chat_model(model, temperature=0, streaming=True)
+        | StrOutputParser()
+    )
+
+
+def _term_coverage(question: str, context: str) -> float:
+    """Share of the question's distinct terms that occur in the context."""
+    terms = set(tokenize(question))
+    if not terms:
+        return 0.0
+    return len(terms.intersection(tokenize(context))) / len(terms)
+
+
+def _number_chunks(chunks: List[str]) -> str:
+    return "\n\n".join(
+        f"Chunk {number}:\n{chunk}" for number, chunk in enumerate(chunks, start=1)
+    )
+
+
+def _by_source(documents: List[Document]) -> Dict[str, List[Document]]:
+    by_source: Dict[str, List[Document]] = {}
+    for document in documents:
+        source = str(document.metadata.get("source", ""))
+        by_source.setdefault(source, []).append(document)
+    return by_source
 
 
 class ReaderAgent(BaseAgent):
     """Agent that handles RAG (Retrieval Augmented Generation) operations."""
 
-    def __init__(self, llm: ChatOpenAI, url: str):
+    # Direct answers come from "agent", answers from retrieved context from
+    # "generate"; the grader and query rewriter are never shown
+    stream_nodes = ("agent", "generate")
+
+    def __init__(
+        self,
+        llm: Optional[BaseChatModel],
+        url: Optional[str] = None,
+        index: Optional[DocumentIndex] = None,
+        chunking: Optional[ChunkingConfig] = None,
+        urls: Optional[List[str]] = None,
+    ):
         # Initialize LLM models
-        self.chat_model = ChatOpenAI(temperature=0, model="gpt-4-turbo")
-        self.grading_model = ChatOpenAI(
-            temperature=0, model="gpt-4-0125-preview", streaming=True
+        # ``llm`` replaces the tool-calling model; grading and generation
+        # keep their dedicated models
+        self.chat_model = (
+            llm if llm is not None else get_chat_model("gpt-4-turbo", temperature=0)
         )
-        self.generation_model = ChatOpenAI(
-            model_name="gpt-3.5-turbo", temperature=0, streaming=True
+        self.grading_model = get_chat_model(
+            "gpt-4-0125-preview", temperature=0, streaming=True
+        )
+        self.generation_model = get_chat_model(
+            "gpt-3.5-turbo", temperature=0, streaming=True
+        )
+        self.grade_chain = _grade_chain("gpt-4-0125-preview")
+        self.rag_chain = _rag_chain("gpt-3.5-turbo")
+
+        # Rewrites allowed before falling back, and the fused score and term
+        # coverage a chunk needs to be kept without asking the grader
+        self.max_rewrites = settings.reader_max_rewrites
+        self.pregrade_thresholds: Optional[Tuple[float, float]] = (
+            (settings.reader_pregrade_score, settings.reader_pregrade_coverage)
+            if settings.reader_pregrade
+            else None
         )
 
         # Initialize components for later use
-        self.embeddings = OpenAIEmbeddings()
-        self.text_splitter = RecursiveCharacterTextSplitter.from_tiktoken_encoder(
-            chunk_size=100, chunk_overlap=50
-        )
+        self.index = index if index is not None else get_document_index()
+        if isinstance(chunking, dict):
+            # Rehydrated sessions carry the config as persisted JSON
+            chunking = ChunkingConfig(**chunking)
+        self.chunker = Chunker(chunking)
 
         # Initialize as None
-        self.vectorstore = None
+        # One shared index entry per source URL, in the order they were read
+        self.index_entries: Dict[str, IndexEntry] = {}
         self.retriever = None
-        self.persist_dir = None
         self.retriever_tool = None
         self.chat_model_with_tools = None
-        print(f"Debug - URL: {url}")
-        if url:
-            documents = self.scrape_url(url)
-            self.set_context_documents(documents)
-        self.flow = self.generate_flow()
+        self.flow = None
+        urls = ([url] if url else []) + list(urls or [])
+        logger.debug("Reader URLs: {}", urls)
+        if urls and len(self.add_urls(urls)) == len(urls):
+            raise ValueError(f"Could not read any of {', '.join(urls)}")
+
+    @property
+    def sources(self) -> List[str]:
+        """URLs of the pages this agent has read."""
+        return list(self.index_entries)
 
     def scrape_url(self, url: str) -> List[Document]:
         """Scrape the url and return the documents."""
         logger.info(f"Scraping URL: {url}")
-        print(f"Debug - Scraping URL: {url}")
         scraper = Scraper([url])
 
         documents = scraper.run()
         return documents
 
-    def set_context_documents(self, documents: List[Document]) -> None:
-        """Sets new documents as the context for the next interaction.
-        Creates a new vector store for each request.
+    def add_urls(
+        self, urls: List[str], progress: Optional[IngestionProgress] = None
+    ) -> List[str]:
+        """Read more pages into the context, next to those already read.
+
+        Pages are fetched concurrently, and each one is chunked and embedded
+        as soon as it arrives while the others are still downloading.
+        Re-reading a URL updates its chunks incrementally.
 
         Args:
-            documents: List of Document objects to use as context
+            urls: Pages to read
+            progress: Updated as pages are fetched and chunks embedded
+
+        Returns:
+            The URLs that could not be read
         """
-        # Cleanup previous temporary directory if it exists
-        if self.persist_dir:
+        logger.info(f"Scraping {len(urls)} URLs")
+        progress = progress if progress is not None else IngestionProgress()
+        progress.pages += len(urls)
+        failed = []
+        for url, future in Scraper(urls).iter_completed():
             try:
-                shutil.rmtree(self.persist_dir)
+                documents = future.result()
             except Exception as e:
-                logger.warning(f"Failed to cleanup temporary directory: {e}")
+                logger.warning(f"Could not read {url}: {e}")
+                failed.append(url)
+                progress.failed += 1
+                continue
+            if not documents:
+                logger.warning(f"No text found at {url}")
+                failed.append(url)
+                progress.failed += 1
+                continue
+            progress.fetched += 1
+            try:
+                self._index_source(url, documents, progress)
+            finally:
+                if isinstance(documents, SpooledDocuments):
+                    # The index has its chunks; drop the spooled pages now
+                    # rather than once the scraper's futures are collected
+                    documents.close()
+        self._bind_tools()
+        return failed
+
+    def add_documents(self, documents: List[Document]) -> None:
+        """Add documents to the context, grouped by their ``source`` metadata."""
+        for source, group in _by_source(documents).items():
+            self._index_source(source, group)
+        self._bind_tools()
 
-        # Create new temporary directory
-        self.persist_dir = tempfile.mkdtemp()
+    def set_context_documents(self, documents: List[Document]) -> None:
+        """Sets new documents as the context for the next interaction.
+        The vector stores come from the shared document index, so sessions
+        reading the same documents reuse the same embeddings, and re-reading
+        a changed page only embeds its changed chunks.
 
-        # Create new vector store
-        self.vectorstore = Chroma(
-            collection_name="rag-chroma",
-            embedding_function=self.embeddings,
-            persist_directory=self.persist_dir,
+        Args:
+            documents: List of Document objects to use as context
+        """
+        by_source = _by_source(documents)
+        for source in [s for s in self.index_entries if s not in by_source]:
+            self.index.release(self.index_entries.pop(source))
+        self.add_documents(documents)
+
+    def _index_source(
+        self,
+        source: str,
+        documents: Iterable[Document],
+        progress: Optional[IngestionProgress] = None,
+    ) -> None:
+        # The index takes over the old reference, so re-reading the same
+        # page cannot evict its entry in between
+        self.index_entries[source] = self.index.acquire(
+            documents,
+            self.chunker,
+            previous=self.index_entries.get(source),
+            progress=progress,
         )
 
-        # Split and add new documents
-        doc_splits = self.text_splitter.split_documents(documents)
-        self.vectorstore.add_documents(doc_splits)
-        logger.info(f"Added {len(doc_splits)} new document chunks to the vector store")
-
+    def _bind_tools(self) -> None:
+        if not self.index_entries:
+            return
         # Update retriever and tools
-        self.retriever = self.vectorstore.as_retriever()
+        self.retriever = MultiSourceRetriever(
+            entries=self.index_entries,
+            embeddings=self.index.embeddings,
+            reranker=get_reranker(),
+        )
 
         # Create new retriever tool
         self.retriever_tool = create_retriever_tool(
             self.retriever,
             name="retrieve_web_content",
-            description="Search and return information about web content",
+            description="Search and return information about the web pages read",
         )
 
         # Bind the new tool to the chat model
         self.chat_model_with_tools = self.chat_model.bind_tools([self.retriever_tool])
+        self.flow = self.generate_flow()
 
-    def __del__(self):
-        """Cleanup temporary directory when the agent is destroyed."""
-        if self.persist_dir:
-            try:
-                shutil.rmtree(self.persist_dir)
-            except Exception as e:
-                logger.warning(f"Failed to cleanup temporary directory: {e}")
+    def resource_weight(self) -> int:
+        return 1 + sum(entry.chunk_count for entry in self.index_entries.values())
+
+    def cache_scope(self, session_id: str) -> Optional[str]:
+        # Answers depend on the documents read and how they were chunked,
+        # which the index keys capture
+        if not self.index_entries:
+            return None
+        digest = hashlib.sha256()
+        for sources, content_hash in sorted(
+            entry.key for entry in self.index_entries.values()
+        ):
+            digest.update(f"{sources}\0{content_hash}\0".encode("utf-8"))
+        return digest.hexdigest()
+
+    def cacheable(self, answer: str) -> bool:
+        # Users are told to rephrase, so a rephrasing must not hit it again
+        return super().cacheable(answer) and answer != FALLBACK_ANSWER
+
+    def close(self) -> None:
+        """Release this agent's references to the shared document index."""
+        for entry in self.index_entries.values():
+            self.index.release(entry)
+        self.index_entries.clear()
 
     def agent(self, state):
         """Invokes the agent model to generate a response."""
-        print("---CALL AGENT---")
+        logger.debug("Reader step: call agent")
         if not self.chat_model_with_tools:
             raise ValueError(
                 "No documents have been set. Call set_context_documents first."
@@ -129,82 +309,104 @@ class ReaderAgent(BaseAgent):
 
     def rewrite(self, state):
         """Transform the query to produce a better question."""
-        print("---TRANSFORM QUERY---")
+        logger.debug("Reader step: transform query")
         messages = state["messages"]
         question = messages[0].content
 
-        msg = [
-            HumanMessage(
-                content=f""" \n 
-        Look at the input and try to reason about the underlying semantic intent / meaning. \n 
-        Here is the initial question:
-        \n ------- \n
-        {question} 
-        \n ------- \n
-        Formulate an improved question: """,
-            )
-        ]
+        msg = [HumanMessage(content=REWRITE_PROMPT.format(question=question))]
 
         response = self.grading_model.invoke(msg)
-        return {"messages": [response]}
+        return {"messages": [response], "rewrites": state.get("rewrites", 0) + 1}
+
+    def pregrade(
+        self, question: str, documents: List[Document]
+    ) -> Optional[List[str]]:
+        """Keep clearly relevant chunks without the grading model.
+
+        A chunk is clearly relevant when its fused retrieval score and the
+        share of the question's terms in its text both reach their marks.
+        Returns those chunks, or None when there are none: a retrieval is
+        never judged irrelevant here, since relevant chunks may share no
+        words with the question.
+        """
+        if self.pregrade_thresholds is None:
+            return None
+        min_score, min_coverage = self.pregrade_thresholds
+        relevant = [
+            document
+            for document in documents
+            if document.metadata.get("score", 0.0) >= min_score
+            and _term_coverage(question, document.page_content) >= min_coverage
+        ]
+        return split_retrieved(format_retrieved(relevant)) if relevant else None
 
-    def grade_documents(self, state) -> Literal["generate", "rewrite"]:
+    def grade(self, state):
         """
-        Determines whether the retrieved documents are relevant to the question.
+        Grades each retrieved chunk and keeps the relevant ones as context.
+
+        Unless ``pregrade`` settles it, all chunks are graded together in a
+        single structured call to the grading model, so one off-topic chunk
+        neither sinks nor passes the whole retrieval.
 
         Args:
             state (messages): The current state
 
         Returns:
-            str: A decision for whether the documents are relevant or not
+            dict: The updated state with the relevant chunks as context
         """
 
-        print("---CHECK RELEVANCE---")
-
-        # Data model
-        class grade(BaseModel):
-            """Binary score for relevance check."""
-
-            binary_score: str = Field(description="Relevance score 'yes' or 'no'")
-
-        # LLM
-        model = ChatOpenAI(temperature=0, model="gpt-4-0125-preview", streaming=True)
-
-        # LLM with tool and validation
-        llm_with_tool = model.with_structured_output(grade)
-
-        # Prompt
-        prompt = PromptTemplate(
-            template="""You are a grader assessing relevance of a retrieved document to a user question. \n 
-            Here is the retrieved document: \n\n {context} \n\n
-            Here is the user question: {question} \n
-            If the document contains keyword(s) or semantic meaning related to the user question, grade it as relevant. \n
-            Give a binary score 'yes' or 'no' score to indicate whether the document is relevant to the question.""",
-            input_variables=["context", "question"],
-        )
-
-        # Chain
-        chain = prompt | llm_with_tool
+        logger.debug("Reader step: check relevance")
 
         messages = state["messages"]
-        last_message = messages[-1]
-
         question = messages[0].content
-        docs = last_message.content
+        chunks = split_retrieved(messages[-1].content)
+        # The retriever tool attaches the scored chunks to its message
+        documents = getattr(messages[-1], "artifact", None)
+
+        context = self.pregrade(question, documents) if documents else None
+        if context is None:
+            grades = self.grade_chain.invoke(
+                {"question": question, "chunks": _number_chunks(chunks)}
+            )
+            relevant = set(grades.relevant_chunks)
+            context = [
+                chunk
+                for number, chunk in enumerate(chunks, start=1)
+                if number in relevant
+            ]
 
-        scored_result = chain.invoke({"question": question, "context": docs})
+        logger.debug("{} of {} chunks relevant", len(context), len(chunks))
+        return {"context": "\n\n".join(context)}
 
-        score = scored_result.binary_score
+    def grade_documents(self, state) -> Literal["generate", "rewrite", "fallback"]:
+        """
+        Determines whether any retrieved chunk was graded relevant.
 
-        if score == "yes":
-            print("---DECISION: DOCS RELEVANT---")
+        Args:
+            state (messages): The current state
+
+        Returns:
+            str: A decision for whether the documents are relevant or not, or
+            "fallback" when they are not and the rewrite budget is spent
+        """
+
+        if state.get("context"):
+            logger.debug("Reader decision: docs relevant")
             return "generate"
 
+        elif state.get("rewrites", 0) >= self.max_rewrites:
+            logger.debug("Reader decision: docs not relevant, no rewrites left")
+            return "fallback"
+
         else:
-            print("---DECISION: DOCS NOT RELEVANT---")
-            print(score)
+            logger.debug("Reader decision: docs not relevant")
             return "rewrite"
 
+    def fallback(self, state):
+        """Reply that nothing relevant was found, without another LLM call."""
+        logger.debug("Reader step: fallback")
+        return {"messages": [AIMessage(content=FALLBACK_ANSWER)]}
+
     def generate(self, state):
         """
         Generate answer
@@ -215,28 +417,16 @@ class ReaderAgent(BaseAgent):
         Returns:
             dict: The updated state with re-phrased question
         """
-        print("---GENERATE---")
+        logger.debug("Reader step: generate")
         messages = state["messages"]
         question = messages[0].content
         last_message = messages[-1]
 
-        docs = last_message.content
-
-        # Prompt
-        prompt = hub.pull("rlm/rag-prompt")
-
-        # LLM
-        llm = ChatOpenAI(model_name="gpt-3.5-turbo", temperature=0, streaming=True)
-
-        # Post-processing
-        def format_docs(docs):
-            return "\n\n".join(doc.page_content for doc in docs)
-
-        # Chain
-        rag_chain = prompt | llm | StrOutputParser()
+        # Only the chunks graded relevant, when the retrieval was graded
+        docs = state.get("context") or last_message.content
 
         # Run
-        response = rag_chain.invoke({"context": docs, "question": question})
+        response = self.rag_chain.invoke({"context": docs, "question": question})
         return {"messages": [response]}
 
     def generate_flow(self) -> Graph:
@@ -245,8 +435,10 @@ class ReaderAgent(BaseAgent):
         # Define the nodes we will cycle between
         workflow.add_node("agent", self.agent)  # Agent decision node
         workflow.add_node("retrieve", ToolNode([self.retriever_tool]))  # Retrieval node
+        workflow.add_node("grade", self.grade)  # Relevance grading node
         workflow.add_node("rewrite", self.rewrite)  # Query rewriting node
         workflow.add_node("generate", self.generate)  # Response generation node
+        workflow.add_node("fallback", self.fallback)  # Nothing found reply node
 
         # Initial edge: Start -> Agent
         workflow.add_edge(START, "agent")
@@ -262,17 +454,20 @@ class ReaderAgent(BaseAgent):
         )
 
         # Retrieval result edges
+        workflow.add_edge("retrieve", "grade")
         workflow.add_conditional_edges(
-            "retrieve",
+            "grade",
             self.grade_documents,
             {
                 "generate": "generate",  # If documents relevant, generate response
                 "rewrite": "rewrite",  # If documents not relevant, rewrite query
+                "fallback": "fallback",  # If no rewrites are left, give up
             },
         )
 
         # Final edges
         workflow.add_edge("generate", END)  # Generation complete -> End
+        workflow.add_edge("fallback", END)  # Fallback reply -> End
         workflow.add_edge("rewrite", "agent")  # After rewrite -> Back to agent
 
         return workflow.compile()
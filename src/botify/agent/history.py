@@ -0,0 +1,158 @@
+import json
+from typing import List, Optional, Sequence
+from langchain_core.chat_history import BaseChatMessageHistory
+from langchain_core.messages import (
+    AIMessage,
+    BaseMessage,
+    HumanMessage,
+    SystemMessage,
+    get_buffer_string,
+)
+from langchain_core.runnables import Runnable
+from botify.config import settings
+from botify.logging.logger import logger
+from botify.rag.chunking import token_length
+
+
+# Per-message overhead of the chat format (role, separators)
+MESSAGE_OVERHEAD_TOKENS = 4
+
+
+def message_tokens(message: BaseMessage) -> int:
+    """Approximate prompt tokens taken by one message."""
+    content = message.content
+    if not isinstance(content, str):
+        content = json.dumps(content)
+    tokens = MESSAGE_OVERHEAD_TOKENS + token_length(content)
+    if isinstance(message, AIMessage) and message.tool_calls:
+        tokens += token_length(json.dumps(message.tool_calls))
+    return tokens
+
+
+class HistoryWindow:
+    """Token-budgeted view over one session's chat history.
+
+    The prompt holds the newest turns that fit in ``max_tokens`` together
+    with the incoming messages. Once the window overflows, its start jumps
+    forward to the first turn that fits in half the budget, so it only moves
+    every few turns. In between, the prompt prefix stays stable. The window
+    always starts at a human message, so a tool result never appears without
+    the call that produced it.
+
+    With a ``summarizer`` (a runnable taking ``summary`` and ``conversation``
+    and returning text), turns that leave the window are folded into a
+    rolling summary sent as a system message ahead of the window.
+
+    Token counts are cached per message, so each turn only counts the new
+    messages.
+    """
+
+    def __init__(
+        self,
+        history: BaseChatMessageHistory,
+        max_tokens: int = settings.history_max_tokens,
+        summarizer: Optional[Runnable] = None,
+    ):
+        self.history = history
+        self.max_tokens = max_tokens
+        self.summarizer = summarizer
+        self.summary = ""
+        self.start = 0
+        self._counts: List[int] = []
+        self._summary_count = 0
+
+    def prompt(self, incoming: Sequence[BaseMessage]) -> List[BaseMessage]:
+        """Messages to send to the LLM for this turn."""
+        messages = self.history.messages
+        dropped = self._advance(messages, incoming)
+        if dropped and self.summarizer is not None:
+            self._set_summary(
+                self.summarizer.invoke(self._summary_input(messages, dropped))
+            )
+        return self._assemble(messages, incoming)
+
+    async def aprompt(self, incoming: Sequence[BaseMessage]) -> List[BaseMessage]:
+        messages = self.history.messages
+        dropped = self._advance(messages, incoming)
+        if dropped and self.summarizer is not None:
+            self._set_summary(
+                await self.summarizer.ainvoke(self._summary_input(messages, dropped))
+            )
+        return self._assemble(messages, incoming)
+
+    def prompt_tokens(self, incoming: Sequence[BaseMessage]) -> int:
+        """Tokens of the prompt ``prompt`` would build right now."""
+        counts = self._token_counts(self.history.messages)
+        return (
+            self._summary_count
+            + sum(counts[self.start :])
+            + sum(message_tokens(m) for m in incoming)
+        )
+
+    def _token_counts(self, messages: Sequence[BaseMessage]) -> List[int]:
+        if len(messages) < len(self._counts):
+            # The history was cleared, start over
+            self._counts = []
+            self.start = 0
+            self._set_summary("")
+        for message in messages[len(self._counts) :]:
+            self._counts.append(message_tokens(message))
+        return self._counts
+
+    def _advance(
+        self, messages: Sequence[BaseMessage], incoming: Sequence[BaseMessage]
+    ) -> range:
+        """Move the window start forward if over budget, returning dropped indices."""
+        counts = self._token_counts(messages)
+        budget = (
+            self.max_tokens
+            - self._summary_count
+            - sum(message_tokens(m) for m in incoming)
+        )
+        if sum(counts[self.start :]) <= budget:
+            return range(0)
+
+        target = budget // 2
+        new_start = len(messages)
+        kept = 0
+        for i in range(len(messages) - 1, self.start - 1, -1):
+            kept += counts[i]
+            if kept > target:
+                break
+            if isinstance(messages[i], HumanMessage):
+                new_start = i
+
+        dropped = range(self.start, new_start)
+        logger.debug(f"History window moved from message {self.start} to {new_start}")
+        self.start = new_start
+        return dropped
+
+    def _summary_input(self, messages: Sequence[BaseMessage], dropped: range) -> dict:
+        # Bound the summarizer's input too, e.g. when a long history is
+        # rehydrated and the window starts from scratch
+        first = dropped.stop
+        tokens = 0
+        while first > dropped.start and tokens + self._counts[first - 1] <= self.max_tokens:
+            first -= 1
+            tokens += self._counts[first]
+        return {
+            "summary": self.summary or "(none)",
+            "conversation": get_buffer_string(messages[first : dropped.stop]),
+        }
+
+    def _set_summary(self, summary) -> None:
+        self.summary = getattr(summary, "content", summary).strip()
+        self._summary_count = (
+            message_tokens(self._summary_message()) if self.summary else 0
+        )
+
+    def _summary_message(self) -> SystemMessage:
+        return SystemMessage(
+            content=f"Summary of the earlier conversation: {self.summary}"
+        )
+
+    def _assemble(
+        self, messages: Sequence[BaseMessage], incoming: Sequence[BaseMessage]
+    ) -> List[BaseMessage]:
+        prefix = [self._summary_message()] if self.summary else []
+        return prefix + list(messages[self.start :]) + list(incoming)
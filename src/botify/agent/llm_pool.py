@@ -0,0 +1,95 @@
+from functools import lru_cache
+from typing import Optional
+import httpx
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models import BaseChatModel
+from botify.config import settings
+
+
+# Every ChatOpenAI/OpenAIEmbeddings otherwise creates its own OpenAI client
+# and, with it, its own httpx connection pool. Sharing one sync and one async
+# pool keeps connections alive across agents and sessions, so a new session
+# does not pay for fresh TLS handshakes.
+
+_http_client: Optional[httpx.Client] = None
+_http_async_client: Optional[httpx.AsyncClient] = None
+
+
+def _limits() -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=settings.llm_max_connections,
+        max_keepalive_connections=settings.llm_max_keepalive_connections,
+    )
+
+
+def get_http_client() -> httpx.Client:
+    """Process-wide httpx client used for sync LLM calls."""
+    global _http_client
+    if _http_client is None:
+        _http_client = httpx.Client(limits=_limits())
+    return _http_client
+
+
+def get_http_async_client() -> httpx.AsyncClient:
+    """Process-wide httpx client used for async LLM calls."""
+    global _http_async_client
+    if _http_async_client is None:
+        _http_async_client = httpx.AsyncClient(limits=_limits())
+    return _http_async_client
+
+
+def _base_url() -> dict:
+    # Only when set, so the clients still honour OPENAI_API_BASE otherwise
+    return {"base_url": settings.llm_base_url} if settings.llm_base_url else {}
+
+
+@lru_cache(maxsize=None)
+def get_chat_model(
+    model: str,
+    temperature: float = 0.7,
+    streaming: bool = False,
+) -> BaseChatModel:
+    """Shared chat model for a given configuration.
+
+    Chat models are stateless, so one instance per configuration serves
+    every agent; use ``bind_tools`` or ``bind`` for per-agent variations.
+    langchain_openai is imported on first use, as it is slow to import.
+    """
+    from langchain_openai import ChatOpenAI
+
+    return ChatOpenAI(
+        model=model,
+        temperature=temperature,
+        streaming=streaming,
+        **_base_url(),
+        http_client=get_http_client(),
+        http_async_client=get_http_async_client(),
+    )
+
+
+@lru_cache(maxsize=None)
+def get_embeddings(model: str = settings.embedding_model) -> Embeddings:
+    """Shared embeddings client for a given model."""
+    from langchain_openai import OpenAIEmbeddings
+
+    return OpenAIEmbeddings(
+        model=model,
+        **_base_url(),
+        http_client=get_http_client(),
+        http_async_client=get_http_async_client(),
+    )
+
+
+async def aclose_clients() -> None:
+    """Close the shared connection pools, at shutdown.
+
+    Models, chains and indexes built before keep referring to the closed
+    pools, so no agent may run afterwards.
+    """
+    global _http_client, _http_async_client
+    if _http_client is not None:
+        _http_client.close()
+        _http_client = None
+    if _http_async_client is not None:
+        await _http_async_client.aclose()
+        _http_async_client = None
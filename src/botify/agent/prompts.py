@@ -0,0 +1,50 @@
+from langchain_core.prompts import ChatPromptTemplate, PromptTemplate
+
+
+# Vendored copy of the "rlm/rag-prompt" hub prompt, so generation needs no
+# network round-trip to the LangChain hub and the bot can start offline.
+RAG_PROMPT = ChatPromptTemplate.from_messages(
+    [
+        (
+            "human",
+            "You are an assistant for question-answering tasks. Use the following "
+            "pieces of retrieved context to answer the question. If you don't know "
+            "the answer, just say that you don't know. Use three sentences maximum "
+            "and keep the answer concise.\n"
+            "Question: {question} \n"
+            "Context: {context} \n"
+            "Answer:",
+        )
+    ]
+)
+
+CHUNK_GRADE_PROMPT = PromptTemplate(
+    template="""You are a grader assessing which retrieved chunks are relevant to a user question. \n
+    Here are the retrieved chunks, each headed by its number: \n\n {chunks} \n\n
+    Here is the user question: {question} \n
+    A chunk is relevant if it contains keyword(s) or semantic meaning related to the user question. \n
+    List the numbers of the relevant chunks, or no numbers if none of them is relevant.""",
+    input_variables=["chunks", "question"],
+)
+
+REWRITE_PROMPT = """ \n
+    Look at the input and try to reason about the underlying semantic intent / meaning. \n
+    Here is the initial question:
+    \n ------- \n
+    {question}
+    \n ------- \n
+    Formulate an improved question: """
+
+SUMMARY_PROMPT = ChatPromptTemplate.from_messages(
+    [
+        (
+            "human",
+            "Progressively summarize the conversation below, adding onto the "
+            "previous summary. Keep names, facts, decisions and open questions, "
+            "and use at most 150 words.\n"
+            "Previous summary: {summary}\n"
+            "New lines of conversation:\n{conversation}\n"
+            "New summary:",
+        )
+    ]
+)
@@ -0,0 +1,52 @@
+from typing import List, Optional
+from fastapi import APIRouter, Request, Response
+from botify.services.agent_service import AgentService
+from botify.services.metrics import (
+    CONTENT_TYPE,
+    graph_metrics,
+    render_gauge,
+    render_stats,
+)
+
+
+router = APIRouter(tags=["metrics"])
+
+
+def _service_metrics(service: AgentService) -> List[str]:
+    scheduler = service.scheduler
+    sessions = len(service.sessions)
+    lines = render_gauge("botify_sessions", "Live agent sessions", sessions)
+    lines += render_stats("botify_scheduler", "Agent runs by outcome", scheduler.stats)
+    lines += render_gauge(
+        "botify_scheduler_running", "Agent runs executing", scheduler.running
+    )
+    lines += render_gauge(
+        "botify_scheduler_queued", "Agent runs waiting for a slot", scheduler.queued
+    )
+    if service.answer_cache is not None:
+        lines += render_stats(
+            "botify_answer_cache", "Answer cache events", service.answer_cache.stats
+        )
+        lines += render_gauge(
+            "botify_answer_cache_entries",
+            "Answers in the answer cache",
+            len(service.answer_cache),
+        )
+    return lines
+
+
+@router.get("/metrics")
+async def metrics(request: Request) -> Response:
+    """Agent graph, scheduler and cache metrics in the Prometheus text format."""
+    lines = graph_metrics.render()
+    service: Optional[AgentService] = getattr(request.app.state, "agent_service", None)
+    if service is not None:
+        lines += _service_metrics(service)
+    limit = getattr(request.app.state, "chat_limit", None)
+    if limit is not None:
+        lines += render_gauge(
+            "botify_api_inflight_requests",
+            "Chat API requests in flight",
+            limit.inflight,
+        )
+    return Response("\n".join(lines) + "\n", media_type=CONTENT_TYPE)
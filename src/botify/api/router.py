@@ -1,6 +1,12 @@
 from fastapi import APIRouter
+from . import metrics, telegram
 from .v1 import chat
 
-router = APIRouter(prefix="/api/v1")
+router = APIRouter()
 
-router.include_router(chat.router)
+v1_router = APIRouter(prefix="/api/v1")
+v1_router.include_router(chat.router)
+
+router.include_router(v1_router)
+router.include_router(telegram.router)
+router.include_router(metrics.router)
@@ -0,0 +1,45 @@
+import hmac
+from typing import Optional
+from fastapi import APIRouter, Header, HTTPException, Request, Response
+from telegram import Update
+from telegram.ext import Application
+from botify.config import settings
+from botify.logging.logger import logger
+
+
+router = APIRouter(tags=["telegram"])
+
+WEBHOOK_PATH = "/telegram/webhook"
+
+
+@router.post(WEBHOOK_PATH)
+async def telegram_webhook(
+    request: Request,
+    x_telegram_bot_api_secret_token: Optional[str] = Header(None),
+) -> Response:
+    """Queue an update posted by Telegram for the bot application.
+
+    Telegram sends the secret given to ``set_webhook`` with every update;
+    requests without it are rejected, and so is every request while no
+    secret is configured. The update is handled after the reply, so
+    Telegram is not kept waiting for agent runs.
+    """
+    secret = settings.telegram_webhook_secret
+    token = x_telegram_bot_api_secret_token or ""
+    if not secret or not hmac.compare_digest(token, secret):
+        raise HTTPException(status_code=403, detail="Invalid secret token")
+
+    try:
+        data = await request.json()
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid JSON")
+    if not isinstance(data, dict):
+        raise HTTPException(status_code=400, detail="Expected an update object")
+
+    bot_app: Optional[Application] = request.app.state.bot_app
+    if bot_app is None:
+        raise HTTPException(status_code=503, detail="Bot is not running")
+    update = Update.de_json(data, bot_app.bot)
+    logger.debug(f"Received webhook update {update.update_id}")
+    await bot_app.update_queue.put(update)
+    return Response(status_code=200)
@@ -1,10 +1,229 @@
-from fastapi import APIRouter
+import hmac
+import json
+import math
+from datetime import datetime
+from typing import AsyncIterator, List, Optional
+from fastapi import APIRouter, Depends, Header, HTTPException, Request
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field
+from botify.config import settings
+from botify.logging.logger import logger
+from botify.models.agent_session import AgentSession
+from botify.services.agent_service import AgentService
+from botify.services.scheduler import RunRejected
 
 
-router = APIRouter(tags=["chat"])
+def require_api_key(
+    request: Request, authorization: Optional[str] = Header(None)
+) -> None:
+    """Reject requests without the API key as a bearer token, when one is set.
 
+    Without a key the chat API is open to anyone who can reach the server,
+    so it must then only be served on a private interface.
+    """
+    api_key = request.app.state.api_key
+    if not api_key:
+        return
+    scheme, _, token = (authorization or "").partition(" ")
+    if scheme.lower() != "bearer" or not hmac.compare_digest(token, api_key):
+        raise HTTPException(
+            status_code=401,
+            detail="Invalid API key",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
 
-@router.post("/chat")
-# TODO  return http response with status code 200
-async def chat() -> None:
-    pass
+
+router = APIRouter(tags=["chat"], dependencies=[Depends(require_api_key)])
+
+# Longest message accepted, as for Telegram messages
+MAX_MESSAGE_CHARS = 4096
+
+
+class InflightLimit:
+    """Counts chat requests in flight, refusing new ones past ``limit``."""
+
+    def __init__(self, limit: int = settings.api_max_inflight_requests):
+        self.limit = limit
+        self.inflight = 0
+
+    def try_acquire(self) -> bool:
+        if self.inflight >= self.limit:
+            return False
+        self.inflight += 1
+        return True
+
+    def release(self) -> None:
+        self.inflight -= 1
+
+
+class SessionRequest(BaseModel):
+    agent_type: str = Field(min_length=1)
+    # Pages a reader session reads in the background before it can answer
+    urls: List[str] = Field(default_factory=list)
+
+
+class SessionResponse(BaseModel):
+    session_id: str
+    agent_type: str
+    status: str
+    created_at: datetime
+
+
+class ChatRequest(BaseModel):
+    session_id: str = Field(min_length=1)
+    message: str = Field(min_length=1, max_length=MAX_MESSAGE_CHARS)
+    # Reply with server-sent events as the answer is generated
+    stream: bool = False
+    # Allow an answer to an earlier, similar question
+    use_cache: bool = True
+    # Rate limit the message, and share run slots fairly, by this user; taken
+    # on trust from the client, which the API key vouches for
+    user_id: Optional[str] = Field(default=None, min_length=1)
+
+
+class ChatResponse(BaseModel):
+    session_id: str
+    answer: str
+
+
+def get_agent_service(request: Request) -> AgentService:
+    service = getattr(request.app.state, "agent_service", None)
+    if service is None:
+        raise HTTPException(status_code=503, detail="Chat API is not enabled")
+    return service
+
+
+def get_inflight_limit(request: Request) -> InflightLimit:
+    return request.app.state.chat_limit
+
+
+def _session_response(session: AgentSession) -> SessionResponse:
+    return SessionResponse(
+        session_id=session.session_id,
+        agent_type=session.agent_type,
+        status=session.status,
+        created_at=session.created_at,
+    )
+
+
+def _too_many_requests(
+    detail: str, retry_after: float = settings.api_retry_after_seconds
+) -> HTTPException:
+    return HTTPException(
+        status_code=429,
+        detail=detail,
+        headers={"Retry-After": str(math.ceil(retry_after))},
+    )
+
+
+def _event(name: str, data: dict) -> str:
+    return f"event: {name}\ndata: {json.dumps(data)}\n\n"
+
+
+@router.post("/sessions", response_model=SessionResponse, status_code=201)
+async def create_session(
+    body: SessionRequest, service: AgentService = Depends(get_agent_service)
+) -> SessionResponse:
+    """Create a session; a reader session with URLs reads them in the background."""
+    if body.agent_type not in service.get_available_agents():
+        raise HTTPException(
+            status_code=422, detail=f"Unknown agent type: {body.agent_type}"
+        )
+    if body.urls and body.agent_type != "reader":
+        raise HTTPException(status_code=422, detail="Only readers read URLs")
+
+    if body.urls:
+        job = await service.create_reader_session(body.urls)
+        session = await service.aget_session(job.session_id)
+    else:
+        session = service.create_agent(body.agent_type)
+    return _session_response(session)
+
+
+@router.get("/sessions/{session_id}", response_model=SessionResponse)
+async def get_session(
+    session_id: str, service: AgentService = Depends(get_agent_service)
+) -> SessionResponse:
+    """Resume a session, rebuilding it from the session store if needed."""
+    session = await service.aget_session(session_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail="Session not found")
+    return _session_response(session)
+
+
+@router.post("/chat", response_model=ChatResponse)
+async def chat(
+    body: ChatRequest,
+    service: AgentService = Depends(get_agent_service),
+    limit: InflightLimit = Depends(get_inflight_limit),
+):
+    """Send a message to a session and reply with the agent's answer.
+
+    With ``stream`` set, the answer comes as server-sent events: ``delta``
+    events carry new text, ``reset`` events replace all text sent so far
+    when the agent starts its answer over, and a final ``done`` event
+    carries the whole answer, or an ``error`` event if the run failed. Requests beyond the API's
+    concurrency limit, to a session still answering an earlier message, or
+    from a ``user_id`` sending too fast get 429 Too Many Requests.
+    """
+    session = await service.aget_session(body.session_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail="Session not found")
+    if session.status == "ingesting":
+        raise HTTPException(status_code=409, detail="Session is still reading pages")
+    if session.status == "failed":
+        raise HTTPException(status_code=409, detail="Session could not read any pages")
+    if service.session_busy(body.session_id):
+        raise _too_many_requests("Session is answering another message")
+    if not limit.try_acquire():
+        raise _too_many_requests("Too many requests in flight")
+
+    if body.stream:
+        return StreamingResponse(
+            _stream_answer(body, service, limit),
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        )
+
+    try:
+        answer = await service.process_message(
+            body.message,
+            body.session_id,
+            use_cache=body.use_cache,
+            user_id=body.user_id,
+        )
+    except RunRejected as e:
+        raise _too_many_requests(str(e), e.retry_after)
+    except Exception:
+        raise HTTPException(status_code=500, detail="Error processing message")
+    finally:
+        limit.release()
+    return ChatResponse(session_id=body.session_id, answer=answer)
+
+
+async def _stream_answer(
+    body: ChatRequest, service: AgentService, limit: InflightLimit
+) -> AsyncIterator[str]:
+    answer = ""
+    try:
+        async for text in service.stream_message(
+            body.message,
+            body.session_id,
+            use_cache=body.use_cache,
+            user_id=body.user_id,
+        ):
+            # Every item is the answer so far, so send what is new; a new
+            # model run in the agent starts the answer over
+            if not text.startswith(answer):
+                yield _event("reset", {"text": text})
+            elif len(text) > len(answer):
+                yield _event("delta", {"text": text[len(answer) :]})
+            answer = text
+        yield _event("done", {"session_id": body.session_id, "answer": answer})
+    except RunRejected as e:
+        yield _event("error", {"detail": str(e), "retry_after": e.retry_after})
+    except Exception as e:
+        logger.error(f"Error streaming chat answer: {e}")
+        yield _event("error", {"detail": "Error processing message"})
+    finally:
+        limit.release()
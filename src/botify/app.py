@@ -15,6 +15,8 @@ Press Ctrl-C on the command line or send a signal to the process to stop the
 bot.
 """
 
+from typing import Optional
+from fastapi import FastAPI
 from telegram.ext import (
     Application,
     CommandHandler,
@@ -22,22 +24,39 @@ from telegram.ext import (
     filters,
     CallbackQueryHandler,
 )
+from telegram.request import BaseRequest
 
+from botify.api.router import router
+from botify.api.v1.chat import InflightLimit
+from botify.config import settings
 from botify.handlers.bot_handler import BotHandler
+from botify.handlers.persistence import SessionStorePersistence
+from botify.services.agent_service import AgentService
 from botify.logging.logger import logger
 import os
 
 
 
-def create_app() -> Application:
+def create_app(
+    bot_handler: Optional[BotHandler] = None,
+    request: Optional[BaseRequest] = None,
+) -> Application:
+    """Build the bot application; ``request`` replaces its Bot API client."""
     TELE_BOT_TOKEN = os.getenv("TELE_BOT_TOKEN")
     logger.info("Creating app")
-    bot_handler = BotHandler()
-    app = (
+    if bot_handler is None:
+        bot_handler = BotHandler()
+    builder = (
         Application.builder()
         .token(TELE_BOT_TOKEN).post_init(bot_handler.post_init)
-        .build()
+        .post_shutdown(bot_handler.post_shutdown)
+        .persistence(SessionStorePersistence(bot_handler.agent_service.store))
+        # Sessions serialize their own runs, so updates need not wait in line
+        .concurrent_updates(settings.telegram_concurrent_updates)
     )
+    if request is not None:
+        builder = builder.request(request)
+    app = builder.build()
 
     # Create a single instance of BotHandler
     
@@ -46,6 +65,7 @@ def create_app() -> Application:
     # app.add_handler(CommandHandler("help", bot_handler.help_command))
     app.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, bot_handler.echo))
     app.add_handler(CommandHandler("agents", bot_handler.agents))
+    app.add_handler(CommandHandler("fresh", bot_handler.fresh))
     app.add_handler(
         CallbackQueryHandler(
             bot_handler.agent_selection_callback, pattern="^select_agent:"
@@ -53,3 +73,21 @@ def create_app() -> Application:
     )
 
     return app
+
+
+def create_api(
+    bot_app: Optional[Application] = None,
+    agent_service: Optional[AgentService] = None,
+) -> FastAPI:
+    """Build the API server.
+
+    It receives ``bot_app``'s webhook updates, and serves the chat API with
+    ``agent_service``; either is disabled when not given.
+    """
+    api = FastAPI()
+    api.state.bot_app = bot_app
+    api.state.agent_service = agent_service
+    api.state.chat_limit = InflightLimit()
+    api.state.api_key = settings.api_key
+    api.include_router(router)
+    return api
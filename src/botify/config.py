@@ -0,0 +1,173 @@
+import os
+from dataclasses import dataclass, fields
+
+
+def _parse(value: str, default):
+    if isinstance(default, bool):
+        return value.lower() in ("1", "true", "yes", "on")
+    return type(default)(value)
+
+
+@dataclass(frozen=True)
+class Settings:
+    """Runtime settings.
+
+    Every field can be overridden by the matching upper-cased environment
+    variable with a ``BOTIFY_`` prefix, e.g. ``BOTIFY_MAX_CONCURRENT_RUNS``.
+    """
+
+    # Maximum number of agent runs executing at once across all sessions
+    max_concurrent_runs: int = 8
+    # Maximum number of agent runs executing at once within one session
+    max_runs_per_session: int = 1
+    # Agent runs waiting for a slot across all sessions; more are refused
+    scheduler_max_queued: int = 256
+    # Messages a user may send per second on average, and in a burst
+    user_rate_per_second: float = 0.5
+    user_burst: int = 5
+    # Worker threads used to run agents that only implement a sync ``run``
+    agent_executor_workers: int = 8
+
+    # Embedding model used by the shared document index
+    embedding_model: str = "text-embedding-ada-002"
+    # OpenAI-compatible API the LLM clients talk to; empty for OpenAI's own
+    llm_base_url: str = ""
+    # Connection limits of the HTTP pool shared by all LLM clients
+    llm_max_connections: int = 100
+    llm_max_keepalive_connections: int = 20
+
+    # Maximum number of live agent sessions
+    session_max_count: int = 1000
+    # Seconds a session may sit idle before the reaper evicts it
+    session_idle_ttl_seconds: int = 24 * 3600
+    # Budget for the summed resource_weight() of live sessions
+    session_max_weight: int = 500_000
+    # Seconds between reaper passes
+    session_reaper_interval_seconds: int = 60
+
+    # Token budget for the chat history sent with each ChatAgent prompt
+    history_max_tokens: int = 3000
+    # Fold turns that leave the history window into a rolling summary
+    history_summarize: bool = False
+
+    # Stream answers to Telegram by editing a placeholder message
+    stream_responses: bool = True
+    # Minimum seconds between edits of a streamed Telegram message
+    stream_edit_interval_seconds: float = 1.0
+
+    # How the bot receives updates: "polling", or "webhook" served by the API
+    telegram_mode: str = "polling"
+    # Public base URL Telegram posts webhook updates to, e.g. https://bot.example.com
+    telegram_webhook_url: str = ""
+    # Secret Telegram sends with every webhook update; required in webhook mode
+    telegram_webhook_secret: str = ""
+    # Updates handled at once; agent runs stay bounded by max_concurrent_runs
+    telegram_concurrent_updates: int = 32
+
+    # Address the API server listens on. Only this machine can reach it by
+    # default; put a reverse proxy in front to receive webhook updates
+    api_host: str = "127.0.0.1"
+    api_port: int = 8000
+    # Bearer token chat API clients must send; empty leaves the API open, for
+    # servers only reachable from trusted hosts
+    api_key: str = ""
+    # Chat API requests handled at once; more get 429 Too Many Requests
+    api_max_inflight_requests: int = 64
+    # Seconds chat API clients are told to wait before retrying after a 429
+    api_retry_after_seconds: int = 1
+
+    # SQLite file persisting sessions across restarts; empty keeps them in memory
+    session_store_path: str = ".cache/botify/sessions.sqlite3"
+    # Buffered session store writes committed together in one transaction
+    session_store_batch_size: int = 100
+    # Seconds buffered session store writes may wait before being committed
+    session_store_flush_interval_seconds: float = 1.0
+    # Days a persisted session is kept after its last message
+    session_retention_days: int = 30
+
+    # Unreferenced document index entries kept around for reuse
+    index_max_entries: int = 32
+    # Seconds an unreferenced document index entry is kept before eviction
+    index_ttl_seconds: int = 3600
+    # Chunks embedded and written to a vector store per call while indexing
+    index_batch_size: int = 64
+    # Background tasks reading submitted URLs into reader sessions
+    ingestion_workers: int = 2
+    # Seconds between ingestion progress reports
+    ingestion_progress_interval_seconds: float = 1.0
+
+    # Chunks a reader retrieves per query, and candidates fetched per ranking
+    retrieval_k: int = 4
+    retrieval_fetch_k: int = 20
+    # Fuse BM25 keyword matches with vector similarity; off for vectors only
+    retrieval_hybrid: bool = True
+    # Reranking of fused candidates: "none", "lexical" or "cross-encoder", which
+    # needs the "rerank" extra
+    retrieval_reranker: str = "lexical"
+    # Local sentence-transformers model used by the "cross-encoder" reranker
+    retrieval_cross_encoder_model: str = "cross-encoder/ms-marco-MiniLM-L-6-v2"
+
+    # Query rewrites a reader tries before replying that it found nothing
+    reader_max_rewrites: int = 2
+    # Skip the grading model when retrieved chunks are clearly relevant: their
+    # fused rank score reaches the score mark, which takes a top rank in both
+    # the vector and BM25 rankings, and their text holds at least the coverage
+    # share of the question's terms. Retrievals are never rejected unread
+    reader_pregrade: bool = True
+    reader_pregrade_score: float = 0.03
+    reader_pregrade_coverage: float = 0.8
+
+    # Reuse answers to near-identical questions asked of the same agent type
+    # about the same documents
+    answer_cache_enabled: bool = True
+    # Cosine similarity at which an earlier question with the same terms counts
+    # as the same question
+    answer_cache_threshold: float = 0.98
+    # Seconds a cached answer is reused, and answers kept across all scopes
+    answer_cache_ttl_seconds: int = 3600
+    answer_cache_max_entries: int = 10000
+
+    # SQLite file backing the embedding cache; empty for a memory-only cache
+    embedding_cache_path: str = ".cache/botify/embeddings.sqlite3"
+    # Embedding vectors kept in the in-memory LRU tier
+    embedding_cache_memory_entries: int = 10000
+
+    # Directory caching scraped pages for conditional re-fetching; empty disables it
+    scraper_cache_dir: str = ".cache/botify/pages"
+    # Bytes and pages the page cache holds before evicting least recently used pages
+    scraper_cache_max_bytes: int = 512 * 1024 * 1024
+    scraper_cache_max_entries: int = 2000
+    # Connections the scraper keeps open in total and requests it sends per host
+    scraper_max_connections: int = 20
+    scraper_max_per_host: int = 4
+    # Seconds before a page fetch times out
+    scraper_timeout_seconds: float = 20.0
+
+    # Minimum level logged, e.g. "DEBUG" to include agent states
+    log_level: str = "INFO"
+    # Log JSON lines instead of text, for log collectors
+    log_json: bool = False
+    # Write logs from a background thread, so a slow disk never blocks agent runs
+    log_enqueue: bool = False
+    # Log heavy payloads, like whole agent states, once in this many calls
+    log_sample_every: int = 10
+
+    # Default reader chunking: "token", "sentence" or "html"
+    chunk_strategy: str = "token"
+    # Chunk size and overlap, in tokens
+    chunk_size: int = 300
+    chunk_overlap: int = 30
+
+    @classmethod
+    def from_env(cls) -> "Settings":
+        overrides = {}
+        for f in fields(cls):
+            value = os.getenv(f"BOTIFY_{f.name.upper()}")
+            if value:
+                overrides[f.name] = _parse(value, f.default)
+        return cls(**overrides)
+
+
+settings = Settings.from_env()
+
+__all__ = ["Settings", "settings"]
@@ -2,7 +2,7 @@ from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes
 from langchain_core.messages import HumanMessage
 from langchain_core.chat_history import InMemoryChatMessageHistory
-from botify.logging.logger import logger
+from botify.logging.logger import log_payload, logger
 from botify.agent.agent_factory import AgentFactory
 import uuid
 
@@ -67,7 +67,7 @@ async def echo(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
             {"messages": [HumanMessage(content=update.message.text)]},
             config={"configurable": {"session_id": session_id}},
         )
-        logger.info(f"Agent result: {result}")
+        log_payload("base.echo", "Agent result: {}", lambda: result)
         await update.message.reply_text(result["messages"][-1].content)
     except Exception as e:
         logger.error(f"Error processing message: {str(e)}")
@@ -1,13 +1,62 @@
 # src/botify/handlers/base.py
+import re
+from typing import List, Optional
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes
+from botify.agent.llm_pool import aclose_clients
+from botify.config import settings
+from botify.handlers.streaming import TelegramMessageStreamer
 from botify.services.agent_service import AgentService
+from botify.services.answer_cache import AnswerCache
+from botify.services.ingestion import IngestionJob
+from botify.services.scheduler import RateLimited, RunRejected
+from botify.services.session_store import SessionStore, create_session_store
 from botify.logging.logger import logger
 
 
+_URL = re.compile(r"https?://\S+")
+
+
+def _only_urls(text: str) -> List[str]:
+    """The URLs in a message made of nothing but URLs, else an empty list."""
+    urls = _URL.findall(text or "")
+    if urls and not _URL.sub("", text).strip(" \t\n,;"):
+        return urls
+    return []
+
+
+def _ingestion_summary(job: IngestionJob) -> str:
+    if job.status == "failed":
+        return "Could not read the page(s). Please send other URLs."
+    lines = [
+        f"Reader ready: read {job.progress.fetched} page(s) "
+        f"({job.progress.chunks} chunks)."
+    ]
+    if job.failed_urls:
+        lines.append("Could not read: " + ", ".join(job.failed_urls))
+    lines.append("Send more URLs at any time to add them to this reader.")
+    return "\n".join(lines)
+
+
+def _rejection_reply(error: RunRejected) -> str:
+    wait = max(1, round(error.retry_after))
+    if isinstance(error, RateLimited):
+        return f"You are sending messages too fast, please wait {wait} second(s)."
+    return f"I'm busy with other chats, please try again in {wait} second(s)."
+
+
+def _user_id(update: Update) -> Optional[str]:
+    user = update.effective_user
+    return str(user.id) if user is not None else None
+
+
 class BotHandler:
-    def __init__(self):
-        self.agent_service = AgentService()
+    def __init__(self, store: Optional[SessionStore] = None):
+        # Sessions persist to the configured store unless one is given
+        self.agent_service = AgentService(
+            store=store if store is not None else create_session_store(),
+            answer_cache=AnswerCache() if settings.answer_cache_enabled else None,
+        )
 
     async def echo(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
         """Process the user message using the selected agent."""
@@ -23,10 +72,13 @@ class BotHandler:
                 )
                 return
 
-            response = await self.agent_service.process_message(
-                update.message.text, session_id
-            )
-            await update.message.reply_text(response)
+            session = await self.agent_service.aget_session(session_id)
+            urls = _only_urls(update.message.text)
+            if urls and session is not None and session.agent_type == "reader":
+                await self._read_urls(update, urls, session_id)
+                return
+
+            await self._answer(update, session_id, update.message.text)
 
         except Exception as e:
             logger.error(f"Error in echo handler: {str(e)}")
@@ -34,17 +86,117 @@ class BotHandler:
                 "Sorry, there was an error processing your message."
             )
 
+    async def fresh(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+        """Handle /fresh <question>: answer without reusing a cached answer."""
+        try:
+            session_id = context.user_data.get("session_id")
+            if not session_id:
+                await update.message.reply_text(
+                    "Please select an agent first using /agents command"
+                )
+                return
+            question = " ".join(context.args or [])
+            if not question:
+                await update.message.reply_text("Usage: /fresh <your question>")
+                return
+
+            await self._answer(update, session_id, question, use_cache=False)
+
+        except Exception as e:
+            logger.error(f"Error in fresh handler: {str(e)}")
+            await update.message.reply_text(
+                "Sorry, there was an error processing your message."
+            )
+
+    async def _answer(
+        self, update: Update, session_id: str, text: str, use_cache: bool = True
+    ) -> None:
+        """Reply to a question with the session's agent."""
+        session = await self.agent_service.aget_session(session_id)
+        if session is not None and session.status == "ingesting":
+            await update.message.reply_text(
+                "Still reading your pages, I will let you know when I'm ready."
+            )
+            return
+        if session is not None and session.status == "failed":
+            await update.message.reply_text(
+                "I could not read any of your pages. Please send other URLs."
+            )
+            return
+
+        if settings.stream_responses:
+            await self._stream_reply(update, session_id, text, use_cache)
+            return
+
+        try:
+            response = await self.agent_service.process_message(
+                text, session_id, use_cache=use_cache, user_id=_user_id(update)
+            )
+        except RunRejected as e:
+            response = _rejection_reply(e)
+        await update.message.reply_text(response)
+
+    async def _stream_reply(
+        self, update: Update, session_id: str, question: str, use_cache: bool = True
+    ) -> None:
+        """Reply with a placeholder and edit it as the answer streams in.
+
+        The placeholder is only sent once the run is admitted, so a rejected
+        message gets a single reply saying when to try again.
+        """
+        streamer = TelegramMessageStreamer(update.message)
+        text = ""
+        try:
+            async for text in self.agent_service.stream_message(
+                question, session_id, use_cache=use_cache, user_id=_user_id(update)
+            ):
+                if streamer.message is None:
+                    await streamer.start()
+                await streamer.update(text)
+        except RunRejected as e:
+            await update.message.reply_text(_rejection_reply(e))
+            return
+        except Exception as e:
+            logger.error(f"Error streaming reply: {str(e)}")
+            text = "Sorry, there was an error processing your message."
+        if streamer.message is None:
+            await update.message.reply_text(text)
+        else:
+            await streamer.finish(text)
+
+    async def _read_urls(
+        self, update: Update, urls: List[str], session_id: Optional[str] = None
+    ) -> IngestionJob:
+        """Queue reading pages into a reader session, new unless ``session_id``.
+
+        Replies at once and edits that reply as the pages are fetched,
+        chunked and embedded in the background.
+        """
+        streamer = TelegramMessageStreamer(
+            update.message, placeholder=f"Reading {len(urls)} page(s)…"
+        )
+        await streamer.start()
+
+        async def report(job: IngestionJob) -> None:
+            if job.status in ("done", "failed"):
+                await streamer.finish(_ingestion_summary(job))
+            else:
+                await streamer.update(job.progress.describe())
+
+        if session_id is None:
+            return await self.agent_service.create_reader_session(urls, report)
+        return await self.agent_service.ingest_reader_urls(session_id, urls, report)
+
     async def _handle_url_input(
         self, update: Update, context: ContextTypes.DEFAULT_TYPE
     ) -> None:
-        """Handle URL input for reader agent"""
-        url = update.message.text
+        """Handle URL input for reader agent, one or several URLs per message"""
+        urls = _only_urls(update.message.text) or [update.message.text.strip()]
         try:
-            session = self.agent_service.create_reader_agent(url)
+            job = await self._read_urls(update, urls)
             context.user_data.update(
-                {"session_id": session.session_id, "waiting_for_url": False}
+                {"session_id": job.session_id, "waiting_for_url": False}
             )
-            await update.message.reply_text(f"Reader agent created with URL: {url}")
         except Exception:
             await update.message.reply_text(
                 "Invalid URL or error creating reader agent. Please try again."
@@ -54,6 +206,13 @@ class BotHandler:
         available_agents = self.agent_service.get_available_agents()
         commands =[(agent_name,"") for agent_name in available_agents]
         await application.bot.set_my_commands(commands)
+        self.agent_service.start_reaper()
+
+    async def post_shutdown(self, application) -> None:
+        await self.agent_service.stop_reaper()
+        await self.agent_service.ingestion.stop()
+        self.agent_service.close()
+        await aclose_clients()
 
     async def agents(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
         """Handle the /agents command"""
@@ -85,7 +244,7 @@ class BotHandler:
 
         if agent_name == "reader":
             context.user_data["waiting_for_url"] = True
-            await query.edit_message_text("Please send the web URL you want to read")
+            await query.edit_message_text("Please send the web URL(s) you want to read")
             return
 
         try:
@@ -0,0 +1,70 @@
+from typing import Dict, Optional
+from telegram.ext import BasePersistence, PersistenceInput
+from botify.services.session_store import SessionStore
+
+
+class SessionStorePersistence(BasePersistence):
+    """Keeps ``context.user_data`` in the session store.
+
+    Only user data is persisted; it holds the user's current session id, so
+    after a restart the user's next message reaches the same session.
+    """
+
+    def __init__(self, store: SessionStore, update_interval: float = 60):
+        super().__init__(
+            store_data=PersistenceInput(
+                bot_data=False, chat_data=False, user_data=True, callback_data=False
+            ),
+            update_interval=update_interval,
+        )
+        self.store = store
+
+    async def get_user_data(self) -> Dict[int, dict]:
+        return self.store.load_user_data()
+
+    async def update_user_data(self, user_id: int, data: dict) -> None:
+        self.store.save_user_data(user_id, data)
+
+    async def refresh_user_data(self, user_id: int, user_data: dict) -> None:
+        pass
+
+    async def drop_user_data(self, user_id: int) -> None:
+        self.store.delete_user_data(user_id)
+
+    async def flush(self) -> None:
+        self.store.flush()
+
+    # Chat data, bot data, callback data and conversations are not persisted
+
+    async def get_chat_data(self) -> Dict[int, dict]:
+        return {}
+
+    async def update_chat_data(self, chat_id: int, data: dict) -> None:
+        pass
+
+    async def refresh_chat_data(self, chat_id: int, chat_data: dict) -> None:
+        pass
+
+    async def drop_chat_data(self, chat_id: int) -> None:
+        pass
+
+    async def get_bot_data(self) -> dict:
+        return {}
+
+    async def update_bot_data(self, data: dict) -> None:
+        pass
+
+    async def refresh_bot_data(self, bot_data: dict) -> None:
+        pass
+
+    async def get_callback_data(self) -> Optional[tuple]:
+        return None
+
+    async def update_callback_data(self, data: tuple) -> None:
+        pass
+
+    async def get_conversations(self, name: str) -> dict:
+        return {}
+
+    async def update_conversation(self, name: str, key: tuple, new_state) -> None:
+        pass
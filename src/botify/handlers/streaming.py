@@ -0,0 +1,87 @@
+import asyncio
+import time
+from typing import Optional
+from telegram import Message
+from telegram.error import BadRequest, RetryAfter
+from botify.config import settings
+from botify.logging.logger import logger
+
+
+# Telegram rejects messages longer than this
+MAX_MESSAGE_LENGTH = 4096
+
+
+class TelegramMessageStreamer:
+    """Shows a streamed answer by editing one placeholder message.
+
+    Telegram allows roughly one edit per second per chat, so intermediate
+    updates are dropped unless ``min_edit_interval`` has passed since the
+    last edit, and a ``RetryAfter`` pushes the next edit back by the delay
+    Telegram asks for. ``finish`` always writes the complete answer,
+    splitting it over several messages if it is too long for one.
+    """
+
+    def __init__(
+        self,
+        reply_to: Message,
+        placeholder: str = "…",
+        min_edit_interval: float = settings.stream_edit_interval_seconds,
+    ):
+        self.reply_to = reply_to
+        self.placeholder = placeholder
+        self.min_edit_interval = min_edit_interval
+        self.message: Optional[Message] = None
+        self.edits = 0
+        self._shown = ""
+        self._next_edit = 0.0
+
+    async def start(self) -> None:
+        """Send the placeholder message that later updates edit."""
+        self.message = await self.reply_to.reply_text(self.placeholder)
+        self._shown = self.placeholder
+
+    async def update(self, text: str) -> None:
+        """Show ``text`` if the edit rate allows it, otherwise skip it."""
+        text = text[:MAX_MESSAGE_LENGTH]
+        if not text.strip() or text == self._shown:
+            return
+        if time.monotonic() < self._next_edit:
+            return
+        try:
+            await self._edit(text)
+        except RetryAfter as e:
+            logger.warning(f"Telegram asked to slow down edits by {e.retry_after}s")
+            self._next_edit = time.monotonic() + _seconds(e.retry_after)
+
+    async def finish(self, text: str) -> None:
+        """Show the complete answer, waiting out any rate limit."""
+        head, rest = text[:MAX_MESSAGE_LENGTH], text[MAX_MESSAGE_LENGTH:]
+        if head != self._shown:
+            await self._with_retry(self._edit, head or self.placeholder)
+        while rest:
+            part, rest = rest[:MAX_MESSAGE_LENGTH], rest[MAX_MESSAGE_LENGTH:]
+            await self._with_retry(self.reply_to.reply_text, part)
+
+    async def _edit(self, text: str) -> None:
+        try:
+            await self.message.edit_text(text)
+        except BadRequest as e:
+            if "not modified" not in str(e).lower():
+                raise
+        self._shown = text
+        self.edits += 1
+        self._next_edit = time.monotonic() + self.min_edit_interval
+
+    async def _with_retry(self, send, text: str, attempts: int = 3) -> None:
+        for attempt in range(attempts):
+            try:
+                await send(text)
+                return
+            except RetryAfter as e:
+                if attempt == attempts - 1:
+                    raise
+                await asyncio.sleep(_seconds(e.retry_after))
+
+
+def _seconds(retry_after) -> float:
+    return getattr(retry_after, "total_seconds", lambda: retry_after)()
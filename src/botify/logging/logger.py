@@ -1,27 +1,73 @@
+from collections import Counter
+from typing import Any, Callable
 from loguru import logger
 import sys
+from botify.config import settings
 
-# Remove any existing handlers
-logger.remove()
+TEXT_FORMAT = "{time:YYYY-MM-DD HH:mm:ss} | {level: <8} | {name}:{function}:{line} - {message}"
+COLOR_FORMAT = "<green>{time:YYYY-MM-DD HH:mm:ss}</green> | <level>{level: <8}</level> | <cyan>{name}</cyan>:<cyan>{function}</cyan>:<cyan>{line}</cyan> - <level>{message}</level>"
 
-# Add a handler to stdout with a custom format
-logger.add(
-    sys.stdout,
-    format="<green>{time:YYYY-MM-DD HH:mm:ss}</green> | <level>{level: <8}</level> | <cyan>{name}</cyan>:<cyan>{function}</cyan>:<cyan>{line}</cyan> - <level>{message}</level>",
-    colorize=True,
-)
+# Calls so far of each payload logging site
+_payload_calls: Counter = Counter()
 
-# Add a file handler for persistent logging
-logger.add(
-    "logs/botify.log",
-    rotation="10 MB",  # Rotate file when it reaches 10MB
-    retention="1 week",  # Keep logs for 1 week
-    compression="zip",  # Compress rotated logs
-    format="{time:YYYY-MM-DD HH:mm:ss} | {level: <8} | {name}:{function}:{line} - {message}",
-)
 
-# Set minimum logging level
-logger.level("INFO")
+def configure_logging(
+    level: str = settings.log_level,
+    json_logs: bool = settings.log_json,
+    enqueue: bool = settings.log_enqueue,
+    log_file: str = "logs/botify.log",
+) -> None:
+    """Log to stdout and to a rotating file, replacing any earlier handlers.
+
+    With ``json_logs``, every record is written as one JSON object per line.
+    With ``enqueue``, records are written by a background thread, so a slow
+    disk or terminal does not block the event loop; call
+    ``await logger.complete()`` before exiting to flush them.
+    """
+    # Remove any existing handlers
+    logger.remove()
+
+    # Add a handler to stdout with a custom format
+    logger.add(
+        sys.stdout,
+        level=level,
+        format=TEXT_FORMAT if json_logs else COLOR_FORMAT,
+        colorize=not json_logs,
+        serialize=json_logs,
+        enqueue=enqueue,
+    )
+
+    # Add a file handler for persistent logging
+    if log_file:
+        logger.add(
+            log_file,
+            level=level,
+            rotation="10 MB",  # Rotate file when it reaches 10MB
+            retention="1 week",  # Keep logs for 1 week
+            compression="zip",  # Compress rotated logs
+            format=TEXT_FORMAT,
+            serialize=json_logs,
+            enqueue=enqueue,
+        )
+
+
+def log_payload(
+    site: str,
+    message: str,
+    payload: Callable[[], Any],
+    every: int = settings.log_sample_every,
+) -> None:
+    """Log a heavy payload at DEBUG, for one in ``every`` calls from ``site``.
+
+    ``message`` holds a ``{}`` for the payload, which is only built by
+    calling ``payload`` when the record is sampled and DEBUG is enabled.
+    """
+    _payload_calls[site] += 1
+    if (_payload_calls[site] - 1) % max(every, 1) == 0:
+        logger.opt(lazy=True, depth=1).debug(message, payload)
+
+
+configure_logging()
 
 # Export logger instance
-__all__ = ["logger"]
+__all__ = ["configure_logging", "log_payload", "logger"]
@@ -1,26 +1,50 @@
-from .app import create_app
+from typing import Tuple
 from fastapi import FastAPI
+from telegram.ext import Application
+from .app import create_api, create_app
+from botify.api.telegram import WEBHOOK_PATH
+from botify.config import settings
+from botify.handlers.bot_handler import BotHandler
+from botify.logging.logger import logger
+from telegram import Update
 import uvicorn
 import asyncio
 import signal
 
-# Create the FastAPI app
-fastapi_app = FastAPI()
 
-
-@fastapi_app.get("/test")
 async def root():
     return {"message": "Hello World"}
 
 
-# Create the Telegram bot application
-bot_app = create_app()
+def build_apps() -> Tuple[Application, FastAPI]:
+    """Build the bot application and the API server sharing its sessions.
+
+    Done when the bot starts rather than on import, so importing this module
+    has no side effects.
+    """
+    # Create the Telegram bot application
+    bot_handler = BotHandler()
+    bot_app = create_app(bot_handler)
+
+    # Create the FastAPI app, which receives the bot's updates in webhook mode
+    # and serves the chat API from the bot's sessions
+    fastapi_app = create_api(bot_app, bot_handler.agent_service)
+    fastapi_app.add_api_route("/test", root, methods=["GET"])
+    return bot_app, fastapi_app
 
 
-async def main(start_server: bool = False):
+async def main(start_api: bool = False):
+    webhook = settings.telegram_mode == "webhook"
+    if webhook and not settings.telegram_webhook_secret:
+        raise ValueError("Webhook mode needs BOTIFY_TELEGRAM_WEBHOOK_SECRET to be set")
+    # Webhook updates arrive through the API server, so it always runs then
+    start_server = start_api or webhook
+    bot_app, fastapi_app = build_apps()
     if start_server:
         # Create uvicorn config and server
-        config = uvicorn.Config(fastapi_app, host="0.0.0.0", port=8000, loop="asyncio")
+        config = uvicorn.Config(
+            fastapi_app, host=settings.api_host, port=settings.api_port, loop="asyncio"
+        )
         server = uvicorn.Server(config)
 
         # Signal handler for graceful shutdown
@@ -32,8 +56,21 @@ async def main(start_server: bool = False):
             loop.add_signal_handler(sig, signal_handler)
 
     async with bot_app:
+        # post_init/post_shutdown are only run automatically by run_polling
+        # and run_webhook, so call them around the manual lifecycle here
+        if bot_app.post_init:
+            await bot_app.post_init(bot_app)
         await bot_app.start()
-        await bot_app.updater.start_polling()
+        if webhook:
+            await bot_app.bot.set_webhook(
+                url=settings.telegram_webhook_url.rstrip("/") + WEBHOOK_PATH,
+                secret_token=settings.telegram_webhook_secret,
+                allowed_updates=Update.ALL_TYPES,
+                # Telegram allows at most 100 connections per webhook
+                max_connections=min(settings.telegram_concurrent_updates, 100),
+            )
+        else:
+            await bot_app.updater.start_polling()
 
         # Run the server only if requested
         if start_server:
@@ -46,9 +83,16 @@ async def main(start_server: bool = False):
                 pass
 
         # When server stops, cleanup the bot
-        await bot_app.updater.stop()
+        if not webhook:
+            await bot_app.updater.stop()
         await bot_app.stop()
 
+    # Like run_polling, run post_shutdown after shutdown has flushed persistence
+    if bot_app.post_shutdown:
+        await bot_app.post_shutdown(bot_app)
+    # Flush records still queued for the background writer
+    await logger.complete()
+
 
 if __name__ == "__main__":
     asyncio.run(main())
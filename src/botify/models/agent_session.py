@@ -10,3 +10,6 @@ class AgentSession:
     last_used: datetime
     metadata: dict
     agent: BaseAgent  # The actual agent instance
+    # "ready", "ingesting" while pages are read into it in the background, or
+    # "failed" when a reader has not read a single page
+    status: str = "ready"
@@ -0,0 +1,89 @@
+import math
+import re
+import threading
+from collections import Counter
+from typing import Dict, List, Tuple
+from langchain_core.documents import Document
+
+
+_WORD = re.compile(r"\w+")
+
+STOPWORDS = frozenset(
+    """a an and are as at be by can do does for from has have how in is it its
+    of on or that the their them they this to was what when where which who why
+    will with you your""".split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    """Lower-cased words of ``text``, without stopwords."""
+    return [word for word in _WORD.findall(text.lower()) if word not in STOPWORDS]
+
+
+class BM25Index:
+    """In-process BM25 inverted index over chunks, keyed by chunk id.
+
+    Chunks can be added and removed one by one, so the index follows
+    incremental re-ingestion. Document frequencies and lengths are kept up
+    to date on every change, and a search only visits the postings of the
+    query's terms.
+    """
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self._postings: Dict[str, Dict[str, int]] = {}
+        self._lengths: Dict[str, int] = {}
+        self._documents: Dict[str, Document] = {}
+        self._total_length = 0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._documents)
+
+    def add(self, chunk_id: str, document: Document) -> None:
+        terms = Counter(tokenize(document.page_content))
+        with self._lock:
+            if chunk_id in self._documents:
+                return
+            self._documents[chunk_id] = document
+            self._lengths[chunk_id] = sum(terms.values())
+            self._total_length += self._lengths[chunk_id]
+            for term, count in terms.items():
+                self._postings.setdefault(term, {})[chunk_id] = count
+
+    def remove(self, chunk_id: str) -> None:
+        with self._lock:
+            document = self._documents.pop(chunk_id, None)
+            if document is None:
+                return
+            self._total_length -= self._lengths.pop(chunk_id)
+            for term in set(tokenize(document.page_content)):
+                postings = self._postings.get(term)
+                if postings is not None:
+                    postings.pop(chunk_id, None)
+                    if not postings:
+                        del self._postings[term]
+
+    def search(self, query: str, k: int = 4) -> List[Tuple[Document, float]]:
+        """The ``k`` best chunks for ``query`` with their BM25 scores."""
+        with self._lock:
+            count = len(self._documents)
+            if not count:
+                return []
+            average_length = self._total_length / count
+            scores: Dict[str, float] = {}
+            for term in set(tokenize(query)):
+                postings = self._postings.get(term)
+                if not postings:
+                    continue
+                matches = len(postings)
+                idf = math.log(1 + (count - matches + 0.5) / (matches + 0.5))
+                for chunk_id, frequency in postings.items():
+                    length = self._lengths[chunk_id] / average_length
+                    norm = self.k1 * (1 - self.b + self.b * length)
+                    scores[chunk_id] = scores.get(chunk_id, 0.0) + idf * (
+                        frequency * (self.k1 + 1) / (frequency + norm)
+                    )
+            best = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+            return [(self._documents[chunk_id], score) for chunk_id, score in best]
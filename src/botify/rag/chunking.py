@@ -0,0 +1,267 @@
+import re
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
+from langchain_core.documents import Document
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+from botify.config import settings
+from botify.logging.logger import logger
+
+
+STRATEGIES = ("token", "sentence", "html")
+
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+(?=[\"'(\[]?[A-Z0-9])")
+_BLOCK_BREAK = re.compile(r"\n\s*\n")
+_MARKUP = re.compile(r"<(html|body|div|p|h[1-6]|section|article)\b", re.IGNORECASE)
+_HEADING_TAGS = ("h1", "h2", "h3", "h4", "h5", "h6")
+_BLOCK_TAGS = _HEADING_TAGS + ("p", "li", "pre", "blockquote", "td", "th", "dt", "dd")
+
+
+@lru_cache(maxsize=1)
+def _encoding():
+    try:
+        import tiktoken
+
+        return tiktoken.get_encoding("cl100k_base")
+    except Exception as e:
+        logger.warning(f"tiktoken encoding unavailable, approximating tokens: {e}")
+        return None
+
+
+def token_length(text: str) -> int:
+    """Count tokens with tiktoken, or approximate at four characters per token."""
+    encoding = _encoding()
+    if encoding is None:
+        return (len(text) + 3) // 4
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+@dataclass(frozen=True)
+class ChunkingConfig:
+    """How a reader agent splits documents before embedding them.
+
+    ``chunk_size`` and ``chunk_overlap`` are measured in tokens. Chunks whose
+    word shingles overlap an earlier chunk by at least ``dedupe_threshold``
+    (Jaccard similarity) are dropped; set it above 1 to disable deduplication.
+    """
+
+    strategy: str = settings.chunk_strategy
+    chunk_size: int = settings.chunk_size
+    chunk_overlap: int = settings.chunk_overlap
+    dedupe_threshold: float = 0.9
+
+    def __post_init__(self):
+        if self.strategy not in STRATEGIES:
+            raise ValueError(
+                f"Unsupported chunking strategy: {self.strategy}. "
+                f"Expected one of {', '.join(STRATEGIES)}"
+            )
+        if not 0 <= self.chunk_overlap < self.chunk_size:
+            raise ValueError("chunk_overlap must be smaller than chunk_size")
+
+    @property
+    def namespace(self) -> str:
+        """Identifies chunks produced by this configuration in shared indexes."""
+        return (
+            f"{self.strategy}:{self.chunk_size}:{self.chunk_overlap}"
+            f":{self.dedupe_threshold}"
+        )
+
+
+class Chunker:
+    """Splits documents into chunks according to a ``ChunkingConfig``."""
+
+    def __init__(self, config: Optional[ChunkingConfig] = None):
+        self.config = config or ChunkingConfig()
+        self._token_splitter = RecursiveCharacterTextSplitter(
+            chunk_size=self.config.chunk_size,
+            chunk_overlap=self.config.chunk_overlap,
+            length_function=token_length,
+        )
+
+    @property
+    def namespace(self) -> str:
+        return self.config.namespace
+
+    def split_documents(self, documents: Iterable[Document]) -> List[Document]:
+        """Split and deduplicate documents. Accepts any iterable, including generators."""
+        return list(self.iter_chunks(documents))
+
+    def iter_chunks(self, documents: Iterable[Document]) -> Iterator[Document]:
+        deduplicator = ChunkDeduplicator(self.config.dedupe_threshold)
+        for document in documents:
+            for chunk in self._split(document):
+                if deduplicator.is_new(chunk.page_content):
+                    yield chunk
+        if deduplicator.dropped:
+            logger.info(f"Dropped {deduplicator.dropped} near-duplicate chunks")
+
+    def _split(self, document: Document) -> List[Document]:
+        if self.config.strategy == "token":
+            return self._token_splitter.split_documents([document])
+        if self.config.strategy == "sentence":
+            units = [
+                (sentence, None)
+                for block in _BLOCK_BREAK.split(document.page_content)
+                for sentence in _SENTENCE_END.split(block.strip())
+                if sentence.strip()
+            ]
+        else:
+            units = _structure_blocks(document.page_content)
+        return [
+            Document(
+                page_content=text,
+                metadata={
+                    **document.metadata,
+                    **({"section": section} if section else {}),
+                },
+            )
+            for text, section in self._pack(units)
+        ]
+
+    def _pack(
+        self, units: List[Tuple[str, Optional[str]]]
+    ) -> Iterator[Tuple[str, Optional[str]]]:
+        """Greedily pack text units into chunks of at most ``chunk_size`` tokens.
+
+        Chunks never span two sections. The trailing units of a chunk, up to
+        ``chunk_overlap`` tokens, are repeated at the start of the next one.
+        """
+        size, overlap = self.config.chunk_size, self.config.chunk_overlap
+        current: List[Tuple[str, int]] = []
+        current_tokens = 0
+        current_section: Optional[str] = None
+
+        def flush() -> Optional[Tuple[str, Optional[str]]]:
+            if not current:
+                return None
+            return " ".join(text for text, _ in current), current_section
+
+        for text, section in units:
+            tokens = token_length(text)
+            if section != current_section:
+                if chunk := flush():
+                    yield chunk
+                current, current_tokens, current_section = [], 0, section
+            if tokens > size:
+                # A single oversized unit falls back to token splitting
+                if chunk := flush():
+                    yield chunk
+                for piece in self._token_splitter.split_text(text):
+                    yield piece, section
+                current, current_tokens = [], 0
+                continue
+            if current_tokens + tokens > size:
+                yield flush()
+                kept: List[Tuple[str, int]] = []
+                kept_tokens = 0
+                for unit in reversed(current):
+                    if kept_tokens + unit[1] > overlap:
+                        break
+                    kept.insert(0, unit)
+                    kept_tokens += unit[1]
+                while kept and kept_tokens + tokens > size:
+                    kept_tokens -= kept.pop(0)[1]
+                current, current_tokens = kept, kept_tokens
+            current.append((text, tokens))
+            current_tokens += tokens
+        if chunk := flush():
+            yield chunk
+
+
+def _structure_blocks(text: str) -> List[Tuple[str, Optional[str]]]:
+    """Split a page into (block, section heading) pairs.
+
+    HTML is walked element by element, with headings opening new sections.
+    Plain text, such as the output of ``WebBaseLoader``, is split on line
+    breaks, treating a short unpunctuated line followed by a paragraph as a
+    heading.
+    """
+    if _MARKUP.search(text):
+        from bs4 import BeautifulSoup
+
+        soup = BeautifulSoup(text, "html.parser")
+        for tag in soup(["script", "style", "nav", "footer", "header", "aside"]):
+            tag.decompose()
+        blocks: List[Tuple[str, Optional[str]]] = []
+        section = None
+        for element in soup.find_all(_BLOCK_TAGS):
+            # Nested block elements are visited on their own
+            if element.find(_BLOCK_TAGS):
+                continue
+            content = element.get_text(" ", strip=True)
+            if not content:
+                continue
+            if element.name in _HEADING_TAGS:
+                section = content
+            blocks.append((content, section))
+        return blocks
+
+    lines = [" ".join(line.split()) for line in text.splitlines()]
+    lines = [line for line in lines if line]
+    blocks = []
+    section = None
+    # Consecutive short lines, such as navigation menus, form a single block
+    run: List[str] = []
+    for i, line in enumerate(lines):
+        next_line = lines[i + 1] if i + 1 < len(lines) else None
+        if not _is_short(line):
+            if run:
+                blocks.append((" ".join(run), section))
+                run = []
+            blocks.append((line, section))
+        elif next_line is not None and not _is_short(next_line):
+            if run:
+                blocks.append((" ".join(run), section))
+                run = []
+            section = line
+            blocks.append((line, section))
+        else:
+            run.append(line)
+    if run:
+        blocks.append((" ".join(run), section))
+    return blocks
+
+
+def _is_short(line: str) -> bool:
+    return len(line) < 80 and line[-1] not in ".!?:;,"
+
+
+def _shingles(text: str, size: int = 3) -> Set[int]:
+    words = re.findall(r"\w+", text.lower())
+    if len(words) < size:
+        return {hash(" ".join(words))}
+    return {hash(" ".join(words[i : i + size])) for i in range(len(words) - size + 1)}
+
+
+class ChunkDeduplicator:
+    """Detects chunks that are near-identical to one already seen.
+
+    Candidates are found through an inverted index of word shingles, so each
+    chunk is only compared against chunks it actually shares text with.
+    """
+
+    def __init__(self, threshold: float = 0.9):
+        self.threshold = threshold
+        self.dropped = 0
+        self._kept: List[Set[int]] = []
+        self._by_shingle: Dict[int, List[int]] = {}
+
+    def is_new(self, text: str) -> bool:
+        if self.threshold > 1:
+            return True
+        shingles = _shingles(text)
+        shared: Dict[int, int] = {}
+        for shingle in shingles:
+            for kept_id in self._by_shingle.get(shingle, ()):
+                shared[kept_id] = shared.get(kept_id, 0) + 1
+        for kept_id, count in shared.items():
+            union = len(shingles) + len(self._kept[kept_id]) - count
+            if count / union >= self.threshold:
+                self.dropped += 1
+                return False
+        chunk_id = len(self._kept)
+        self._kept.append(shingles)
+        for shingle in shingles:
+            self._by_shingle.setdefault(shingle, []).append(chunk_id)
+        return True
@@ -0,0 +1,376 @@
+import hashlib
+import json
+import shutil
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import VectorStore
+from botify.config import settings
+from botify.rag.bm25 import BM25Index
+from botify.rag.chunking import Chunker
+from botify.logging.logger import logger
+
+
+# (sources, content hash)
+IndexKey = Tuple[str, str]
+VectorStoreFactory = Callable[[str, Embeddings, str], VectorStore]
+
+
+def chunk_id(chunk: Document, namespace: str = "") -> str:
+    """Content hash identifying a chunk in a vector store.
+
+    Metadata is part of the hash, so a chunk whose text is unchanged but
+    whose page or section moved is replaced too.
+    """
+    digest = hashlib.sha256(namespace.encode("utf-8"))
+    digest.update(b"\0" + chunk.page_content.encode("utf-8") + b"\0")
+    digest.update(json.dumps(chunk.metadata, sort_keys=True, default=str).encode())
+    return digest.hexdigest()
+
+
+def chroma_factory(
+    collection_name: str, embeddings: Embeddings, persist_dir: str
+) -> VectorStore:
+    """Default vector store factory: one Chroma collection per index entry."""
+    from langchain_community.vectorstores import Chroma
+
+    return Chroma(
+        collection_name=collection_name,
+        embedding_function=embeddings,
+        persist_directory=persist_dir,
+    )
+
+
+@dataclass
+class IngestionProgress:
+    """Counters of a running ingestion, updated as pages and chunks are done.
+
+    Written by the ingesting thread and read by whoever reports progress.
+    """
+
+    pages: int = 0
+    fetched: int = 0
+    failed: int = 0
+    chunks: int = 0
+    embedded: int = 0
+
+    def describe(self) -> str:
+        text = (
+            f"Fetched {self.fetched}/{self.pages} pages, chunked {self.chunks}, "
+            f"embedded {self.embedded}/{self.chunks}"
+        )
+        if self.failed:
+            text += f", {self.failed} failed"
+        return text
+
+
+@dataclass
+class IndexEntry:
+    """A vector store shared by every session reading the same documents.
+
+    ``lexical`` is a BM25 index over the same chunks, kept in step with the
+    vector store for hybrid retrieval.
+    """
+
+    key: IndexKey
+    vectorstore: VectorStore
+    persist_dir: str
+    chunk_count: int
+    namespace: str = ""
+    chunk_ids: Set[str] = field(default_factory=set)
+    lexical: BM25Index = field(default_factory=BM25Index)
+    refcount: int = 0
+    last_used: float = field(default_factory=time.monotonic)
+
+
+class DocumentIndex:
+    """Process-wide registry of vector stores keyed by source URL and content hash.
+
+    Sessions reading the same source share one collection, so its chunks are
+    only embedded once. Entries are reference counted; unreferenced entries
+    are evicted least-recently-used first once there are more than
+    ``max_entries`` of them, or once they have been idle for ``ttl_seconds``.
+
+    When a source changes, its new version is indexed incrementally: an
+    entry for the old version that nobody else uses is updated in place,
+    embedding only the chunks that are new and deleting the stale ones.
+    """
+
+    def __init__(
+        self,
+        embeddings: Embeddings,
+        vectorstore_factory: VectorStoreFactory = chroma_factory,
+        max_entries: int = settings.index_max_entries,
+        ttl_seconds: int = settings.index_ttl_seconds,
+        batch_size: int = settings.index_batch_size,
+    ):
+        self.embeddings = embeddings
+        self.vectorstore_factory = vectorstore_factory
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.batch_size = batch_size
+        self._entries: "OrderedDict[IndexKey, IndexEntry]" = OrderedDict()
+        self._build_locks: Dict[IndexKey, threading.Lock] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(documents: Iterable[Document], namespace: str = "") -> IndexKey:
+        """Key documents by their sources and a hash of their content.
+
+        ``namespace`` identifies how the documents are chunked, so sessions
+        with different chunking settings never share an entry.
+        """
+        sources = set()
+        digest = hashlib.sha256(namespace.encode("utf-8"))
+        for doc in documents:
+            sources.add(str(doc.metadata.get("source", "")))
+            digest.update(doc.page_content.encode("utf-8"))
+            digest.update(b"\0")
+        return ",".join(sorted(sources)), digest.hexdigest()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: IndexKey) -> bool:
+        return key in self._entries
+
+    def acquire(
+        self,
+        documents: Iterable[Document],
+        chunker: Chunker,
+        previous: Optional[IndexEntry] = None,
+        progress: Optional[IngestionProgress] = None,
+    ) -> IndexEntry:
+        """Return the entry for ``documents``, building it on first use.
+
+        ``documents`` is iterated twice, to key and then to chunk it, so it
+        can be a re-iterable stream such as ``SpooledDocuments``.
+
+        The caller holds a reference until it calls ``release``. ``previous``
+        is a reference the caller holds on the documents it is replacing,
+        such as an earlier version of the same page; it is handed over, and
+        updated in place when no one else holds it. ``progress`` counts the
+        chunks as they are produced and embedded.
+        """
+        progress = progress if progress is not None else IngestionProgress()
+        key = self.make_key(documents, chunker.namespace)
+        with self._lock:
+            build_lock = self._build_locks.setdefault(key, threading.Lock())
+
+        # Concurrent acquires of the same documents wait for a single build
+        with build_lock:
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None:
+                    self._touch(entry)
+                    entry.refcount += 1
+                    if previous is not None:
+                        self._release(previous)
+                    progress.chunks += entry.chunk_count
+                    progress.embedded += entry.chunk_count
+                    logger.info(f"Reusing index entry for {key[0]}")
+                    return entry
+                claimed = self._claim(key[0], chunker.namespace, previous)
+
+            entry = claimed or self._create(key, chunker.namespace)
+            try:
+                self._update(entry, key, documents, chunker, progress)
+            except Exception:
+                with self._lock:
+                    self._build_locks.pop(key, None)
+                    if claimed is not None:
+                        # The failed update was rolled back
+                        self._entries[claimed.key] = claimed
+                if claimed is None:
+                    self._evict(entry)
+                raise
+
+            with self._lock:
+                if entry is not previous:
+                    entry.refcount = 1
+                    if previous is not None:
+                        self._release(previous)
+                entry.key = key
+                entry.last_used = time.monotonic()
+                self._entries[key] = entry
+                self._build_locks.pop(key, None)
+                self._evict_over_capacity()
+        return entry
+
+    def release(self, entry: IndexEntry) -> None:
+        """Drop a reference taken by ``acquire``."""
+        with self._lock:
+            self._release(entry)
+
+    def _release(self, entry: IndexEntry) -> None:
+        entry.refcount = max(0, entry.refcount - 1)
+        entry.last_used = time.monotonic()
+        self._evict_over_capacity()
+
+    def evict_expired(self) -> int:
+        """Evict unreferenced entries idle for longer than the TTL."""
+        cutoff = time.monotonic() - self.ttl_seconds
+        with self._lock:
+            expired = [
+                entry
+                for entry in self._entries.values()
+                if entry.refcount == 0 and entry.last_used < cutoff
+            ]
+            for entry in expired:
+                self._evict(entry)
+        return len(expired)
+
+    def clear(self) -> None:
+        """Evict every entry regardless of references."""
+        with self._lock:
+            for entry in list(self._entries.values()):
+                self._evict(entry)
+
+    def _touch(self, entry: IndexEntry) -> None:
+        entry.last_used = time.monotonic()
+        self._entries.move_to_end(entry.key)
+
+    def _claim(
+        self, sources: str, namespace: str, previous: Optional[IndexEntry]
+    ) -> Optional[IndexEntry]:
+        """Take an entry for the same sources out of the index to update it.
+
+        Only the caller's own ``previous`` entry, when it holds the only
+        reference, or an unreferenced entry can be claimed; entries other
+        sessions are reading are left untouched.
+        """
+        candidates = [previous] if previous is not None else []
+        # Most recently used first
+        candidates += reversed(self._entries.values())
+        for entry in candidates:
+            if (
+                entry.key[0] == sources
+                and entry.namespace == namespace
+                and entry.refcount == (1 if entry is previous else 0)
+                and self._entries.get(entry.key) is entry
+            ):
+                self._entries.pop(entry.key)
+                return entry
+        return None
+
+    def _create(self, key: IndexKey, namespace: str) -> IndexEntry:
+        persist_dir = tempfile.mkdtemp(prefix="botify-index-")
+        vectorstore = self.vectorstore_factory(
+            f"rag-{key[1][:16]}", self.embeddings, persist_dir
+        )
+        return IndexEntry(
+            key=key,
+            vectorstore=vectorstore,
+            persist_dir=persist_dir,
+            chunk_count=0,
+            namespace=namespace,
+        )
+
+    def _update(
+        self,
+        entry: IndexEntry,
+        key: IndexKey,
+        documents: Iterable[Document],
+        chunker: Chunker,
+        progress: IngestionProgress,
+    ) -> None:
+        """Make ``entry`` hold the chunks of ``documents``, diffing by chunk id.
+
+        Chunks are produced lazily and embedded ``batch_size`` at a time, so
+        only one batch of chunks is held in memory. If a batch fails, the
+        chunks added so far are deleted again and the entry is unchanged.
+        """
+        seen: Set[str] = set()
+        added: List[str] = []
+        batch: Dict[str, Document] = {}
+
+        def flush() -> None:
+            ids = list(batch)
+            entry.vectorstore.add_documents(list(batch.values()), ids=ids)
+            added.extend(ids)
+            for id_, chunk in batch.items():
+                entry.lexical.add(id_, chunk)
+            progress.embedded += len(ids)
+            batch.clear()
+
+        try:
+            for chunk in chunker.iter_chunks(documents):
+                id_ = chunk_id(chunk, chunker.namespace)
+                if id_ in seen:
+                    continue
+                seen.add(id_)
+                progress.chunks += 1
+                if id_ in entry.chunk_ids:
+                    progress.embedded += 1
+                    continue
+                batch[id_] = chunk
+                if len(batch) >= self.batch_size:
+                    flush()
+            if batch:
+                flush()
+        except Exception:
+            if added:
+                entry.vectorstore.delete(ids=added)
+                for id_ in added:
+                    entry.lexical.remove(id_)
+            raise
+
+        stale = [id_ for id_ in entry.chunk_ids if id_ not in seen]
+        if stale:
+            entry.vectorstore.delete(ids=stale)
+            for id_ in stale:
+                entry.lexical.remove(id_)
+        entry.chunk_ids = seen
+        entry.chunk_count = len(seen)
+        logger.info(
+            f"Indexed {key[0]}: {len(added)} chunks added, {len(stale)} removed, "
+            f"{len(seen) - len(added)} unchanged"
+        )
+
+    def _evict_over_capacity(self) -> None:
+        excess = len(self._entries) - self.max_entries
+        if excess <= 0:
+            return
+        # OrderedDict iterates least recently used first
+        idle = [entry for entry in self._entries.values() if entry.refcount == 0]
+        for entry in idle[:excess]:
+            self._evict(entry)
+
+    def _evict(self, entry: IndexEntry) -> None:
+        self._entries.pop(entry.key, None)
+        delete_collection = getattr(entry.vectorstore, "delete_collection", None)
+        if delete_collection is not None:
+            try:
+                delete_collection()
+            except Exception as e:
+                logger.warning(f"Failed to delete collection for {entry.key[0]}: {e}")
+        shutil.rmtree(entry.persist_dir, ignore_errors=True)
+        logger.info(f"Evicted index entry for {entry.key[0]}")
+
+
+_document_index: Optional[DocumentIndex] = None
+
+
+def get_document_index() -> DocumentIndex:
+    """Return the process-wide document index."""
+    global _document_index
+    if _document_index is None:
+        from botify.agent.llm_pool import get_embeddings
+        from botify.rag.embedding_cache import CachedEmbeddings, EmbeddingCache
+
+        _document_index = DocumentIndex(
+            CachedEmbeddings(get_embeddings(), EmbeddingCache())
+        )
+    return _document_index
+
+
+def evict_expired_index_entries() -> int:
+    """Evict expired entries from the process-wide index, if it exists."""
+    if _document_index is None:
+        return 0
+    return _document_index.evict_expired()
@@ -0,0 +1,194 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from array import array
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+from langchain_core.embeddings import Embeddings
+from botify.config import settings
+from botify.logging.logger import logger
+
+
+# (model, sha256 of the text)
+CacheKey = Tuple[str, str]
+
+# SQLite's default limit on host parameters is 999
+_SQL_BATCH = 500
+
+
+def text_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+@dataclass
+class EmbeddingCacheStats:
+    memory_hits: int = 0
+    disk_hits: int = 0
+    misses: int = 0
+    provider_calls: int = 0
+    provider_seconds: float = 0.0
+
+    @property
+    def hits(self) -> int:
+        return self.memory_hits + self.disk_hits
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+
+class EmbeddingCache:
+    """Content-addressed embedding store with an LRU memory tier and a SQLite tier.
+
+    Vectors are keyed by ``(model, sha256(text))`` and stored on disk as
+    packed float32 blobs. Pass ``path=None`` for a memory-only cache.
+    """
+
+    def __init__(
+        self,
+        path: Optional[str] = settings.embedding_cache_path,
+        max_memory_entries: int = settings.embedding_cache_memory_entries,
+    ):
+        self.path = path
+        self.max_memory_entries = max_memory_entries
+        self._memory: "OrderedDict[CacheKey, List[float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        if path:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            self._conn = sqlite3.connect(path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                " model TEXT NOT NULL,"
+                " text_hash TEXT NOT NULL,"
+                " vector BLOB NOT NULL,"
+                " PRIMARY KEY (model, text_hash))"
+            )
+            self._conn.commit()
+
+    def get_many(
+        self, model: str, hashes: List[str], stats: Optional[EmbeddingCacheStats] = None
+    ) -> Dict[str, List[float]]:
+        """Look up many text hashes at once, returning only the ones found."""
+        found: Dict[str, List[float]] = {}
+        with self._lock:
+            for h in hashes:
+                vector = self._memory.get((model, h))
+                if vector is not None:
+                    self._memory.move_to_end((model, h))
+                    found[h] = vector
+            if stats is not None:
+                stats.memory_hits += len(found)
+
+            missing = [h for h in dict.fromkeys(hashes) if h not in found]
+            if self._conn is not None and missing:
+                disk_hits = 0
+                for i in range(0, len(missing), _SQL_BATCH):
+                    batch = missing[i : i + _SQL_BATCH]
+                    rows = self._conn.execute(
+                        "SELECT text_hash, vector FROM embeddings"
+                        f" WHERE model = ? AND text_hash IN ({','.join('?' * len(batch))})",
+                        [model, *batch],
+                    ).fetchall()
+                    for h, blob in rows:
+                        vector = array("f", blob).tolist()
+                        found[h] = vector
+                        self._remember((model, h), vector)
+                        disk_hits += 1
+                if stats is not None:
+                    stats.disk_hits += disk_hits
+        return found
+
+    def put_many(self, model: str, items: Dict[str, List[float]]) -> None:
+        """Store vectors for many text hashes in both tiers."""
+        with self._lock:
+            for h, vector in items.items():
+                self._remember((model, h), vector)
+            if self._conn is not None and items:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO embeddings (model, text_hash, vector)"
+                    " VALUES (?, ?, ?)",
+                    [
+                        (model, h, array("f", vector).tobytes())
+                        for h, vector in items.items()
+                    ],
+                )
+                self._conn.commit()
+
+    def _remember(self, key: CacheKey, vector: List[float]) -> None:
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+
+    def close(self) -> None:
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+
+class CachedEmbeddings(Embeddings):
+    """Embeddings wrapper that only sends cache misses to the provider.
+
+    Documents go through ``cache``. Queries are user input, and some
+    providers embed them differently from documents, so they are embedded
+    with the provider's ``embed_query`` and only remembered in memory.
+    """
+
+    def __init__(
+        self,
+        embeddings: Embeddings,
+        cache: EmbeddingCache,
+        model: Optional[str] = None,
+        max_query_entries: int = 1000,
+    ):
+        self.embeddings = embeddings
+        self.cache = cache
+        self.model = model or getattr(embeddings, "model", type(embeddings).__name__)
+        self.stats = EmbeddingCacheStats()
+        self.query_cache = EmbeddingCache(None, max_memory_entries=max_query_entries)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        hashes = [text_hash(text) for text in texts]
+        found = self.cache.get_many(self.model, hashes, self.stats)
+
+        # Identical texts within one batch are only embedded once
+        misses: Dict[str, str] = {}
+        for h, text in zip(hashes, texts):
+            if h not in found and h not in misses:
+                misses[h] = text
+        self.stats.misses += len(misses)
+
+        if misses:
+            start = time.perf_counter()
+            vectors = self.embeddings.embed_documents(list(misses.values()))
+            self.stats.provider_calls += 1
+            self.stats.provider_seconds += time.perf_counter() - start
+            computed = dict(zip(misses.keys(), vectors))
+            self.cache.put_many(self.model, computed)
+            found.update(computed)
+
+        logger.debug(
+            f"Embedding cache: {len(texts) - len(misses)}/{len(texts)} hits "
+            f"(hit rate {self.stats.hit_rate:.0%})"
+        )
+        return [found[h] for h in hashes]
+
+    def embed_query(self, text: str) -> List[float]:
+        # The answer cache and the retriever often embed the same question
+        h = text_hash(text)
+        found = self.query_cache.get_many(self.model, [h], self.stats)
+        if h in found:
+            return found[h]
+        self.stats.misses += 1
+        start = time.perf_counter()
+        vector = self.embeddings.embed_query(text)
+        self.stats.provider_calls += 1
+        self.stats.provider_seconds += time.perf_counter() - start
+        self.query_cache.put_many(self.model, {h: vector})
+        return vector
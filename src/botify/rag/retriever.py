@@ -0,0 +1,245 @@
+import math
+import re
+from functools import lru_cache
+from importlib.util import find_spec
+from typing import Callable, Dict, List, Optional, Tuple
+from langchain_core.callbacks import CallbackManagerForRetrieverRun, Callbacks
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.prompts import PromptTemplate, format_document
+from langchain_core.retrievers import BaseRetriever
+from langchain_core.tools import Tool
+from langchain_core.tools.retriever import RetrieverInput
+from pydantic import ConfigDict
+from botify.config import settings
+from botify.rag.bm25 import tokenize
+from botify.rag.document_index import IndexEntry
+
+
+# How each retrieved chunk is shown to the model, naming the page it came from
+PROVENANCE_PROMPT = PromptTemplate.from_template("[source: {source}]\n{page_content}")
+
+# Where one chunk ends and the next begins in the retriever tool's output
+_CHUNK_BOUNDARY = re.compile(r"\n\n(?=\[source: )")
+
+# Reorders candidate chunks for a query, best first
+Reranker = Callable[[str, List[Document]], List[Document]]
+
+# Damping constant of reciprocal rank fusion, as in the original paper
+RRF_K = 60
+
+
+def cosine_similarity(a: List[float], b: List[float]) -> float:
+    dot = sum(x * y for x, y in zip(a, b))
+    norm = math.sqrt(sum(x * x for x in a)) * math.sqrt(sum(y * y for y in b))
+    return dot / norm if norm else 0.0
+
+
+def _key(document: Document) -> Tuple[str, str]:
+    return str(document.metadata.get("source", "")), document.page_content
+
+
+def split_retrieved(content: str) -> List[str]:
+    """Split the retriever tool's output back into its chunks."""
+    return [chunk for chunk in _CHUNK_BOUNDARY.split(content) if chunk.strip()]
+
+
+def format_retrieved(documents: List[Document]) -> str:
+    """The retriever tool's output: every chunk with the page it came from."""
+    return "\n\n".join(
+        format_document(document, PROVENANCE_PROMPT) for document in documents
+    )
+
+
+def create_retriever_tool(retriever: BaseRetriever, name: str, description: str) -> Tool:
+    """Like langchain's ``create_retriever_tool``, keeping the chunks.
+
+    The model sees the chunks as text, formatted by ``format_retrieved``;
+    the tool message also carries them as its ``artifact``, so graph nodes
+    can read their ``score`` metadata.
+    """
+
+    def retrieve(query: str, callbacks: Callbacks = None):
+        documents = retriever.invoke(query, config={"callbacks": callbacks})
+        return format_retrieved(documents), documents
+
+    async def aretrieve(query: str, callbacks: Callbacks = None):
+        documents = await retriever.ainvoke(query, config={"callbacks": callbacks})
+        return format_retrieved(documents), documents
+
+    return Tool(
+        name=name,
+        description=description,
+        func=retrieve,
+        coroutine=aretrieve,
+        args_schema=RetrieverInput,
+        response_format="content_and_artifact",
+    )
+
+
+def fuse_rankings(
+    rankings: List[List[Document]], k: int = RRF_K
+) -> List[Tuple[Document, float]]:
+    """Reciprocal rank fusion, returning each chunk with its fused score."""
+    scores: Dict[Tuple[str, str], float] = {}
+    documents: Dict[Tuple[str, str], Document] = {}
+    for ranking in rankings:
+        for rank, document in enumerate(ranking, start=1):
+            key = _key(document)
+            documents.setdefault(key, document)
+            scores[key] = scores.get(key, 0.0) + 1 / (k + rank)
+    ranked = sorted(scores, key=scores.get, reverse=True)
+    return [(documents[key], scores[key]) for key in ranked]
+
+
+def reciprocal_rank_fusion(
+    rankings: List[List[Document]], k: int = RRF_K
+) -> List[Document]:
+    """Merge rankings by summing ``1 / (k + rank)`` for each chunk.
+
+    Only ranks are used, so rankings whose scores are on different scales,
+    like BM25 and cosine similarity, can be fused.
+    """
+    return [document for document, _ in fuse_rankings(rankings, k)]
+
+
+def lexical_rerank(query: str, documents: List[Document]) -> List[Document]:
+    """Order chunks by how many of the query's distinct terms they contain.
+
+    Ties keep their fused order. Cheap enough to run on every query, and
+    it favours chunks answering the whole question over chunks that repeat
+    one of its words.
+    """
+    terms = set(tokenize(query))
+    if not terms:
+        return documents
+
+    def coverage(document: Document) -> int:
+        return len(terms.intersection(tokenize(document.page_content)))
+
+    return sorted(documents, key=coverage, reverse=True)
+
+
+class CrossEncoderReranker:
+    """Scores query and chunk pairs with a local cross-encoder model.
+
+    Needs the optional ``sentence-transformers`` package, installed with
+    the ``rerank`` extra; the model is loaded on first use.
+    """
+
+    def __init__(self, model_name: str = settings.retrieval_cross_encoder_model):
+        # Checked here, when readers are set up, rather than on the first query
+        if find_spec("sentence_transformers") is None:
+            raise ImportError(
+                "The cross-encoder reranker needs sentence-transformers; "
+                "install it with `pip install 'botify[rerank]'` or set "
+                "BOTIFY_RETRIEVAL_RERANKER to another reranker"
+            )
+        self.model_name = model_name
+        self._model = None
+
+    def __call__(self, query: str, documents: List[Document]) -> List[Document]:
+        if not documents:
+            return documents
+        if self._model is None:
+            from sentence_transformers import CrossEncoder
+
+            self._model = CrossEncoder(self.model_name)
+        scores = self._model.predict(
+            [(query, document.page_content) for document in documents]
+        )
+        ranked = sorted(zip(documents, scores), key=lambda pair: pair[1], reverse=True)
+        return [document for document, _ in ranked]
+
+
+@lru_cache(maxsize=None)
+def get_reranker(name: str = settings.retrieval_reranker) -> Optional[Reranker]:
+    """Return the reranker called ``name``, shared by every reader."""
+    if name == "none":
+        return None
+    if name == "lexical":
+        return lexical_rerank
+    if name == "cross-encoder":
+        return CrossEncoderReranker()
+    raise ValueError(f"Unknown reranker: {name}")
+
+
+class MultiSourceRetriever(BaseRetriever):
+    """Retrieves the best chunks across the index entries of several sources.
+
+    Every source has its own index entry. The query is embedded once and
+    each store returns its top ``fetch_k`` chunks, which are re-ranked
+    together by cosine similarity; vector stores do not agree on what their
+    scores mean, so those are not compared across stores. Re-embedding the
+    candidates hits the embedding cache.
+
+    With ``hybrid`` set, the BM25 matches of every entry form a second
+    ranking, fused with the vector ranking by reciprocal rank fusion, so
+    chunks sharing rare keywords with the query are found even when their
+    embeddings are not the closest. The fused candidates then go through
+    ``reranker``, if any, before the top ``k`` are returned. Retrieved
+    chunks carry the URL they came from in their ``source`` metadata, and
+    their fused rank score in their ``score`` metadata.
+    """
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    entries: Dict[str, IndexEntry]
+    embeddings: Embeddings
+    k: int = settings.retrieval_k
+    fetch_k: int = settings.retrieval_fetch_k
+    hybrid: bool = settings.retrieval_hybrid
+    reranker: Optional[Reranker] = None
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        rankings = [self._vector_ranking(query)]
+        if self.hybrid:
+            rankings.append(self._lexical_ranking(query))
+        candidates = []
+        for document, score in fuse_rankings(rankings)[: self.fetch_k]:
+            # Rankings hold copies of the indexed chunks, so this is safe
+            document.metadata["score"] = score
+            candidates.append(document)
+        if self.reranker is not None:
+            candidates = self.reranker(query, candidates)
+        return candidates[: self.k]
+
+    def _vector_ranking(self, query: str) -> List[Document]:
+        query_vector = self.embeddings.embed_query(query)
+        candidates = []
+        for source, entry in self.entries.items():
+            for document in entry.vectorstore.similarity_search_by_vector(
+                query_vector, k=self.fetch_k
+            ):
+                candidates.append(_with_source(document, source))
+        if len(self.entries) <= 1:
+            return candidates
+
+        vectors = self.embeddings.embed_documents(
+            [document.page_content for document in candidates]
+        )
+        ranked = sorted(
+            zip(candidates, vectors),
+            key=lambda pair: cosine_similarity(query_vector, pair[1]),
+            reverse=True,
+        )
+        return [document for document, _ in ranked[: self.fetch_k]]
+
+    def _lexical_ranking(self, query: str) -> List[Document]:
+        matches = [
+            (_with_source(document, source), score)
+            for source, entry in self.entries.items()
+            for document, score in entry.lexical.search(query, k=self.fetch_k)
+        ]
+        matches.sort(key=lambda pair: pair[1], reverse=True)
+        return [document for document, _ in matches[: self.fetch_k]]
+
+
+def _with_source(document: Document, source: str) -> Document:
+    # Chunks in the BM25 index are shared between sessions, so copy them
+    return Document(
+        page_content=document.page_content,
+        metadata={"source": source} | document.metadata,
+    )
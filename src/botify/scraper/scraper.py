@@ -1,34 +1,429 @@
-from typing import List
+import asyncio
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import weakref
+from concurrent.futures import Future, as_completed
+from dataclasses import dataclass
+from typing import IO, Coroutine, Dict, Iterable, Iterator, List, Optional, Tuple
+from urllib.parse import urlsplit
+import httpx
 from langchain_core.documents import Document
-from concurrent.futures import ThreadPoolExecutor
+from botify.config import settings
+from botify.logging.logger import logger
+
+
+DEFAULT_HEADERS = {
+    "User-Agent": "botify/0.1 (+https://github.com/niuguy/botify)",
+    "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
+}
+
+# Content types servers use for PDFs without saying so
+_GENERIC_CONTENT_TYPES = ("", "application/octet-stream", "binary/octet-stream")
+
+
+def is_pdf(content_type: str, url: str) -> bool:
+    """Whether a response is a PDF, going by its Content-Type first."""
+    content_type = content_type.split(";")[0].strip().lower()
+    if content_type == "application/pdf":
+        return True
+    return content_type in _GENERIC_CONTENT_TYPES and (
+        urlsplit(url).path.lower().endswith(".pdf")
+    )
+
+
+def iter_pdf_pages(path: str, url: str) -> Iterator[Document]:
+    """Yield one document per PDF page, reading the file page by page."""
+    from pypdf import PdfReader
+
+    # Given a path, pypdf reads the whole file into memory; given an open
+    # file it seeks to the objects each page needs
+    with open(path, "rb") as f:
+        reader = PdfReader(f)
+        total = len(reader.pages)
+        for number in range(1, total + 1):
+            text = reader.pages[number - 1].extract_text() or ""
+            # Drop the objects parsed for this page (images, fonts, content
+            # streams) rather than keeping every page's objects until the end
+            reader.resolved_objects.clear()
+            if text.strip():
+                yield Document(
+                    page_content=text,
+                    metadata={"source": url, "page": number, "total_pages": total},
+                )
+
+
+class SpooledDocuments:
+    """Documents spooled to a temporary JSON lines file, one per line.
+
+    Iterating reads them back one at a time, so a large PDF reaches the
+    index and the chunker page by page, as often as they iterate over it.
+    The file is deleted once the object is garbage collected.
+    """
+
+    def __init__(self, documents: Iterable[Document]):
+        fd, self.path = tempfile.mkstemp(suffix=".jsonl", prefix="botify-")
+        self._cleanup = weakref.finalize(self, os.unlink, self.path)
+        self._count = 0
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            for doc in documents:
+                f.write(json.dumps(_document_dict(doc)) + "\n")
+                self._count += 1
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __iter__(self) -> Iterator[Document]:
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                yield Document(**json.loads(line))
+
+    def close(self) -> None:
+        """Delete the file now rather than on garbage collection."""
+        self._cleanup()
+
+
+def _document_dict(doc: Document) -> dict:
+    return {"page_content": doc.page_content, "metadata": doc.metadata}
+
+
+def parse_html(html: str, url: str) -> List[Document]:
+    """Extract the text and metadata of an HTML page, like ``WebBaseLoader``."""
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(html, "html.parser")
+    metadata = {"source": url}
+    if title := soup.find("title"):
+        metadata["title"] = title.get_text()
+    if description := soup.find("meta", attrs={"name": "description"}):
+        metadata["description"] = description.get("content", "No description found.")
+    if root := soup.find("html"):
+        metadata["language"] = root.get("lang", "No language found.")
+    return [Document(page_content=soup.get_text(), metadata=metadata)]
+
+
+@dataclass
+class CachedPage:
+    url: str
+    etag: Optional[str]
+    last_modified: Optional[str]
+    documents: Iterable[Document]
+
+
+class _CachedDocuments:
+    """The documents of an open page cache file, read once as iterated."""
+
+    def __init__(self, f: IO[str]):
+        self._file = f
+
+    def __iter__(self) -> Iterator[Document]:
+        for line in self._file:
+            yield Document(**json.loads(line))
+
+    def close(self) -> None:
+        self._file.close()
+
+
+class PageCache:
+    """Parsed pages on disk, with the validators needed to revalidate them.
+
+    Each page is a JSON lines file: its URL and validators, then one
+    document per line, so a large PDF is never read into memory whole.
+    Once the files hold more than ``max_bytes`` or ``max_entries``, the
+    least recently used pages are evicted.
+    """
+
+    def __init__(
+        self,
+        directory: str = settings.scraper_cache_dir,
+        max_bytes: int = settings.scraper_cache_max_bytes,
+        max_entries: int = settings.scraper_cache_max_entries,
+    ):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, url: str) -> str:
+        return os.path.join(
+            self.directory, hashlib.sha256(url.encode("utf-8")).hexdigest() + ".jsonl"
+        )
+
+    def get(self, url: str) -> Optional[CachedPage]:
+        """Read a page's validators; its documents are read as they are iterated.
+
+        Blocks on disk, so call it from a thread in async code.
+        """
+        path = self._path(url)
+        try:
+            f = open(path, encoding="utf-8")
+        except FileNotFoundError:
+            return None
+        except OSError as e:
+            logger.warning(f"Ignoring unreadable page cache entry for {url}: {e}")
+            return None
+        try:
+            header = json.loads(f.readline())
+            # Recently revalidated pages are the last to be evicted
+            os.utime(path)
+        except (OSError, ValueError) as e:
+            f.close()
+            logger.warning(f"Ignoring unreadable page cache entry for {url}: {e}")
+            return None
+        # The open file keeps the documents readable even if the entry is
+        # replaced or evicted meanwhile
+        return CachedPage(
+            url=header["url"],
+            etag=header.get("etag"),
+            last_modified=header.get("last_modified"),
+            documents=_CachedDocuments(f),
+        )
+
+    def put(self, page: CachedPage) -> None:
+        path = self._path(page.url)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        header = {"url": page.url, "etag": page.etag, "last_modified": page.last_modified}
+        with open(tmp, "w", encoding="utf-8") as f:
+            # Written document by document, so spooled PDF pages are never
+            # all in memory at once
+            f.write(json.dumps(header) + "\n")
+            for doc in page.documents:
+                f.write(json.dumps(_document_dict(doc)) + "\n")
+        os.replace(tmp, path)
+        self.evict()
+
+    def evict(self) -> None:
+        """Delete the least recently used pages until within the limits."""
+        entries = []
+        with os.scandir(self.directory) as scan:
+            for entry in scan:
+                if entry.name.endswith(".tmp") or not entry.is_file():
+                    continue
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        total = sum(size for _, size, _ in entries)
+        count = len(entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes and count <= self.max_entries:
+                break
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                # Evicted by another writer
+                pass
+            total -= size
+            count -= 1
+
+
+@dataclass
+class ScraperStats:
+    downloads: int = 0
+    revalidated: int = 0
+    errors: int = 0
+
+
+class ScraperEngine:
+    """Event loop, connection pool and per-host limits shared by all scrapes.
+
+    The engine runs its own event loop in a daemon thread, so one
+    ``httpx.AsyncClient`` and its keep-alive connections serve every scrape,
+    whether it is started from sync code through ``Scraper.run`` or from a
+    coroutine through ``Scraper.arun``.
+    """
+
+    def __init__(
+        self,
+        cache: Optional[PageCache] = None,
+        max_connections: int = settings.scraper_max_connections,
+        max_per_host: int = settings.scraper_max_per_host,
+        timeout_seconds: float = settings.scraper_timeout_seconds,
+    ):
+        self.cache = cache
+        self.max_connections = max_connections
+        self.max_per_host = max_per_host
+        self.timeout_seconds = timeout_seconds
+        self.stats = ScraperStats()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._client: Optional[httpx.AsyncClient] = None
+        self._host_slots: Dict[str, asyncio.Semaphore] = {}
+        self._lock = threading.Lock()
+
+    def submit(self, coro: Coroutine) -> Future:
+        """Schedule a coroutine on the engine's loop."""
+        with self._lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                self._thread = threading.Thread(
+                    target=self._loop.run_forever, name="botify-scraper", daemon=True
+                )
+                self._thread.start()
+        return asyncio.run_coroutine_threadsafe(coro, self._loop)
+
+    def _http(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                headers=DEFAULT_HEADERS,
+                follow_redirects=True,
+                timeout=httpx.Timeout(self.timeout_seconds),
+                limits=httpx.Limits(max_connections=self.max_connections),
+            )
+        return self._client
+
+    def _host_slot(self, url: str) -> asyncio.Semaphore:
+        host = urlsplit(url).netloc
+        if host not in self._host_slots:
+            self._host_slots[host] = asyncio.Semaphore(self.max_per_host)
+        return self._host_slots[host]
+
+    async def scrape_many(self, urls: List[str]) -> List[Document]:
+        results = await asyncio.gather(*(self.scrape(url) for url in urls))
+        return [doc for docs in results for doc in docs]
+
+    async def scrape(self, url: str) -> Iterable[Document]:
+        """Fetch and parse a page, revalidating a cached copy if there is one.
+
+        Downloaded HTML pages come back as a list; PDFs, and pages read
+        back from the cache, as ``SpooledDocuments``, which hold one page
+        in memory at a time.
+        """
+        cached = None
+        if self.cache is not None:
+            cached = await asyncio.to_thread(self.cache.get, url)
+        headers = {}
+        if cached is not None:
+            if cached.etag:
+                headers["If-None-Match"] = cached.etag
+            if cached.last_modified:
+                headers["If-Modified-Since"] = cached.last_modified
+
+        try:
+            async with self._host_slot(url):
+                async with self._http().stream("GET", url, headers=headers) as response:
+                    if response.status_code == 304 and cached is not None:
+                        self.stats.revalidated += 1
+                        return await asyncio.to_thread(
+                            SpooledDocuments, cached.documents
+                        )
+                    response.raise_for_status()
+                    if is_pdf(response.headers.get("content-type", ""), url):
+                        documents = await self._read_pdf(response, url)
+                    else:
+                        await response.aread()
+                        # Parsing is CPU-bound, keep it off the engine loop
+                        documents = await asyncio.to_thread(
+                            parse_html, response.text, url
+                        )
+        except httpx.HTTPError as e:
+            self.stats.errors += 1
+            logger.error(f"Failed to fetch {url}: {e}")
+            raise
+        finally:
+            if cached is not None:
+                cached.documents.close()
+
+        self.stats.downloads += 1
+        if self.cache is not None and (
+            "etag" in response.headers or "last-modified" in response.headers
+        ):
+            await asyncio.to_thread(
+                self.cache.put,
+                CachedPage(
+                    url=url,
+                    etag=response.headers.get("etag"),
+                    last_modified=response.headers.get("last-modified"),
+                    documents=documents,
+                ),
+            )
+        return documents
+
+    async def _read_pdf(
+        self, response: httpx.Response, url: str
+    ) -> SpooledDocuments:
+        """Stream a PDF to a temporary file and extract it page by page.
+
+        Each page's text is spooled to disk as it is extracted, so neither
+        the PDF bytes nor its full text are ever held in memory as a whole,
+        and the chunker later reads the pages back one by one.
+        """
+        fd, path = tempfile.mkstemp(suffix=".pdf", prefix="botify-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                async for chunk in response.aiter_bytes(64 * 1024):
+                    f.write(chunk)
+            return await asyncio.to_thread(
+                SpooledDocuments, iter_pdf_pages(path, url)
+            )
+        finally:
+            os.unlink(path)
+
+    async def _aclose(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def close(self) -> None:
+        """Close the connection pool and stop the engine's loop."""
+        with self._lock:
+            loop, self._loop = self._loop, None
+        if loop is None:
+            return
+        asyncio.run_coroutine_threadsafe(self._aclose(), loop).result()
+        loop.call_soon_threadsafe(loop.stop)
+        self._thread.join()
+        loop.close()
+        self._host_slots.clear()
+
+
+_engine: Optional[ScraperEngine] = None
+
+
+def get_scraper_engine() -> ScraperEngine:
+    """Return the process-wide scraper engine."""
+    global _engine
+    if _engine is None:
+        cache_dir = settings.scraper_cache_dir
+        _engine = ScraperEngine(PageCache(cache_dir) if cache_dir else None)
+    return _engine
 
 
 class Scraper:
-    def __init__(self, urls):
+    def __init__(self, urls, engine: Optional[ScraperEngine] = None):
         self.urls = urls
+        self.engine = engine if engine is not None else get_scraper_engine()
 
     def run(self) -> List[Document]:
-        with ThreadPoolExecutor(max_workers=10) as executor:
-            futures = [executor.submit(self.scrape_url, url) for url in self.urls]
-            results = []
-            for future in futures:
-                results.extend(future.result())
-            return results
+        return self.engine.submit(self.engine.scrape_many(self.urls)).result()
+
+    async def arun(self) -> List[Document]:
+        return await asyncio.wrap_future(
+            self.engine.submit(self.engine.scrape_many(self.urls))
+        )
+
+    def iter_completed(self) -> Iterator[Tuple[str, Future]]:
+        """Scrape all URLs concurrently, yielding each one as it finishes.
+
+        The futures are done when yielded; ``result()`` returns the page's
+        documents, as ``ScraperEngine.scrape`` does, or raises the error that
+        fetching it failed with.
+        """
+        futures = {
+            self.engine.submit(self.engine.scrape(url)): url for url in self.urls
+        }
+        for future in as_completed(futures):
+            yield futures[future], future
 
     def scrape_url(self, url: str) -> List[Document]:
-        if url.endswith(".pdf"):
-            return self.scrape_pdf(url)
-        else:
-            return self.scrape_html(url)
+        """Scrape one URL, as HTML or PDF depending on its Content-Type."""
+        return self.engine.submit(self.engine.scrape(url)).result()
 
     def scrape_pdf(self, url: str) -> List[Document]:
-        # from langchain_community.document_loaders import OnlinePDFLoader
-        # loader = OnlinePDFLoader(url)
-        # return loader.load()
-        pass
+        return self.scrape_url(url)
 
     def scrape_html(self, url: str) -> List[Document]:
-        from langchain_community.document_loaders import WebBaseLoader
-
-        loader = WebBaseLoader(url)
-        return loader.load()
+        return self.scrape_url(url)
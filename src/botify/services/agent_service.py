@@ -1,20 +1,80 @@
-from datetime import datetime
-from typing import Optional, Dict
+import asyncio
+import os
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta
+from typing import AsyncIterator, List, Optional, Dict, Set, Union
 from langchain_core.messages import HumanMessage
-from langfuse.callback import CallbackHandler
 from botify.agent.agent_factory import AgentFactory
 from botify.models.agent_session import AgentSession
 from botify.logging.logger import logger
+from botify.config import settings
+from botify.rag.document_index import evict_expired_index_entries
+from botify.rag.document_index import IngestionProgress
+from botify.services.answer_cache import AnswerCache, CacheScope
+from botify.services.ingestion import IngestionJob, IngestionQueue, ProgressFn
+from botify.services.metrics import GraphMetricsHandler
+from botify.services.scheduler import FairScheduler, RunRejected
+from botify.services.session_cache import SessionCache
+from botify.services.session_store import (
+    InMemorySessionStore,
+    SessionRecord,
+    SessionStore,
+)
 import uuid
 
+
+def _tracing_callbacks() -> list:
+    """Langfuse tracing callbacks, if Langfuse is configured.
+
+    langfuse is slow to import, so it is only imported when it is used.
+    """
+    if not (os.getenv("LANGFUSE_PUBLIC_KEY") and os.getenv("LANGFUSE_SECRET_KEY")):
+        return []
+    from langfuse.callback import CallbackHandler
+
+    return [CallbackHandler()]
+
+
 class AgentService:
-    def __init__(self):
-        self.sessions: Dict[str, AgentSession] = {}
-        self.langfuse_callback = CallbackHandler()
+    def __init__(
+        self,
+        max_concurrent_runs: int = settings.max_concurrent_runs,
+        max_runs_per_session: int = settings.max_runs_per_session,
+        sessions: Optional[SessionCache] = None,
+        store: Optional[SessionStore] = None,
+        answer_cache: Optional[AnswerCache] = None,
+        scheduler: Optional[FairScheduler] = None,
+    ):
+        self.sessions = sessions if sessions is not None else SessionCache()
+        self.sessions.on_evict = self._release_session
+        # Sessions only outlive the process with a store given, as the bot
+        # handler gives it the configured SQLite store
+        self.store = store if store is not None else InMemorySessionStore()
+        # In-flight rehydrations, so concurrent messages rebuild an agent once
+        self._rehydrations: Dict[str, asyncio.Future] = {}
+        self._reaper: Optional[asyncio.Task] = None
+        self.ingestion = IngestionQueue(self._ingest)
+        # Ingestion jobs queued or running per session
+        self._ingesting: Dict[str, int] = {}
+        # Off unless given, as the bot handler does when it is enabled
+        self.answer_cache = answer_cache
+        # Answers being written to the cache after their reply went out, one
+        # at a time so embedding them competes less with agent runs
+        self._cache_writes: Set[asyncio.Task] = set()
+        self._cache_write_lock = asyncio.Lock()
+        # Per-node metrics of every run, and Langfuse traces if configured
+        self.callbacks = [GraphMetricsHandler(), *_tracing_callbacks()]
+        # Limits agent runs across and within sessions, and messages per user
+        self.scheduler = (
+            scheduler
+            if scheduler is not None
+            else FairScheduler(max_concurrent_runs, max_runs_per_session)
+        )
 
     def create_agent(self, agent_type: str, **kwargs) -> AgentSession:
         """Create a new agent and return AgentSession"""  
         agent = AgentFactory.create(agent_type, **kwargs)
+        agent.history_factory = self.store.chat_history
         session_id = str(uuid.uuid4())
         
         # Create new agent session
@@ -28,40 +88,332 @@ class AgentService:
         )
         
         # Store session
-        self.sessions[session_id] = session
+        self.sessions.put(session)
+        self._save_record(session)
         return session
 
+    def _save_record(self, session: AgentSession) -> None:
+        self.store.save_session(
+            SessionRecord(
+                session_id=session.session_id,
+                agent_type=session.agent_type,
+                created_at=session.created_at,
+                last_used=session.last_used,
+                metadata=session.metadata,
+            )
+        )
+
     def get_session(self, session_id: str) -> Optional[AgentSession]:
-        """Retrieve an agent session"""
-        return self.sessions.get(session_id)
+        """Retrieve an agent session, rehydrating it from the store if needed"""
+        session = self.sessions.get(session_id)
+        if session is None:
+            session = self._load_session(session_id)
+            if session is not None:
+                self.sessions.put(session)
+        return session
+
+    async def aget_session(self, session_id: str) -> Optional[AgentSession]:
+        """Like ``get_session``, but rebuilds agents off the event loop."""
+        session = self.sessions.get(session_id)
+        if session is not None:
+            return session
+        future = self._rehydrations.get(session_id)
+        if future is None:
+            future = asyncio.ensure_future(self._rehydrate(session_id))
+            self._rehydrations[session_id] = future
+        # Shielded so one cancelled caller does not abort it for the others
+        return await asyncio.shield(future)
+
+    async def _rehydrate(self, session_id: str) -> Optional[AgentSession]:
+        try:
+            session = await asyncio.to_thread(self._load_session, session_id)
+            if session is not None:
+                self.sessions.put(session)
+            return session
+        finally:
+            self._rehydrations.pop(session_id, None)
+
+    def _load_session(self, session_id: str) -> Optional[AgentSession]:
+        """Rebuild a session and its agent from the store."""
+        record = self.store.load_session(session_id)
+        if record is None:
+            return None
+        logger.info(f"Rehydrating {record.agent_type} session {session_id}")
+        agent = AgentFactory.create(record.agent_type, **record.metadata)
+        agent.history_factory = self.store.chat_history
+        return AgentSession(
+            session_id=record.session_id,
+            agent_type=record.agent_type,
+            created_at=record.created_at,
+            last_used=record.last_used,
+            metadata=record.metadata,
+            agent=agent,
+            # Stored before any of its pages were read
+            status="failed" if getattr(agent, "sources", None) == [] else "ready",
+        )
 
     def update_session_timestamp(self, session_id: str) -> None:
         """Update last_used timestamp of a session"""
-        if session := self.sessions.get(session_id):
-            session.last_used = datetime.now()
+        session = self.sessions.get(session_id)
+        if session is not None:
+            self.store.touch_session(session_id, session.last_used)
+
+    def session_busy(self, session_id: str) -> bool:
+        """Whether a new run of the session would have to wait for another."""
+        return self.scheduler.session_busy(session_id)
 
-    async def process_message(self, message: str, session_id: str) -> str:
-        """Process a message using the specified agent session"""
-        session = self.get_session(session_id)
+    @asynccontextmanager
+    async def _running(
+        self, session_id: str, user_id: Optional[str] = None
+    ) -> AsyncIterator[AgentSession]:
+        """Hold a scheduler slot for one agent run of the session.
+
+        Raises ``RunRejected`` if ``user_id`` sent too many messages, or too
+        many runs are waiting already.
+        """
+        session = await self.aget_session(session_id)
         if not session:
             raise ValueError(f"No active session found for ID: {session_id}")
 
+        # Looking the session up marked it used; store that once per message
+        self.store.touch_session(session_id, session.last_used)
+
+        self.sessions.pin(session_id)
+        try:
+            async with self.scheduler.slot(session_id, user_id):
+                yield session
+        finally:
+            self.sessions.unpin(session_id)
+            # Re-weigh the session now that the run may have grown it
+            self.sessions.reweigh(session_id)
+
+    def _run_config(self, session: AgentSession) -> dict:
+        return {
+            "configurable": {"session_id": session.session_id},
+            "metadata": {"agent_type": session.agent_type},
+            "callbacks": self.callbacks,
+        }
+
+    async def process_message(
+        self,
+        message: str,
+        session_id: str,
+        use_cache: bool = True,
+        user_id: Optional[str] = None,
+    ) -> str:
+        """Process a message using the specified agent session
+
+        An answer to a similar earlier question about the same context is
+        returned without waiting for a run slot, unless ``use_cache`` is off;
+        the fresh answer then replaces the cached one. Messages are rate
+        limited per ``user_id``, if given.
+        """
         try:
-            # Update last used timestamp
-            self.update_session_timestamp(session_id)
-            
-            result = session.agent.run(
-                {"messages": [HumanMessage(content=message)]},
-                config={"configurable": {"session_id": session_id}, "callbacks": [self.langfuse_callback]},
+            cached = await self._answer_from_cache(
+                message, session_id, use_cache, user_id
             )
-            return result["messages"][-1].content
+            if cached is not None:
+                return cached
+            async with self._running(session_id, user_id) as session:
+                scope = self._cache_scope(session)
+                result = await session.agent.arun(
+                    {"messages": [HumanMessage(content=message)]},
+                    config=self._run_config(session),
+                )
+                answer = result["messages"][-1].content
+                self._cache_answer(session, scope, message, answer)
+            return answer
+        except RunRejected:
+            raise
         except Exception as e:
             logger.error(f"Error processing message in session {session_id}: {str(e)}")
             raise
 
-    def create_reader_agent(self, url: str) -> AgentSession:
-        """Specifically create a reader agent"""
-        return self.create_agent("reader", url=url)
+    async def stream_message(
+        self,
+        message: str,
+        session_id: str,
+        use_cache: bool = True,
+        user_id: Optional[str] = None,
+    ) -> AsyncIterator[str]:
+        """Process a message, yielding the answer text generated so far.
+
+        Every item is the full answer up to that point, not a delta, and the
+        last item is always the complete answer. The first item is empty and
+        comes once the run holds a scheduler slot; ``RunRejected`` is only
+        ever raised before it. A cached answer is yielded as the only item,
+        without taking a slot, as in ``process_message``.
+        """
+        try:
+            cached = await self._answer_from_cache(
+                message, session_id, use_cache, user_id
+            )
+            if cached is not None:
+                yield cached
+                return
+            async with self._running(session_id, user_id) as session:
+                yield ""
+                scope = self._cache_scope(session)
+                text = ""
+                async for text in session.agent.astream(
+                    {"messages": [HumanMessage(content=message)]},
+                    config=self._run_config(session),
+                ):
+                    yield text
+                self._cache_answer(session, scope, message, text)
+        except RunRejected:
+            raise
+        except Exception as e:
+            logger.error(f"Error streaming message in session {session_id}: {str(e)}")
+            raise
+
+    async def _answer_from_cache(
+        self,
+        message: str,
+        session_id: str,
+        use_cache: bool,
+        user_id: Optional[str],
+    ) -> Optional[str]:
+        """The cached answer to a message, if any, found before taking a slot.
+
+        A hit still counts towards the user's rate limit.
+        """
+        session = await self.aget_session(session_id)
+        if session is None:
+            return None
+        cached = await self._cached_answer(
+            self._cache_scope(session), message, use_cache
+        )
+        if cached is None:
+            return None
+        if user_id is not None:
+            self.scheduler.admit(user_id)
+        self.store.touch_session(session_id, session.last_used)
+        session.agent.remember(session_id, message, cached)
+        return cached
+
+    def _cache_scope(self, session: AgentSession) -> Optional[CacheScope]:
+        if self.answer_cache is None:
+            return None
+        scope = session.agent.cache_scope(session.session_id)
+        return (session.agent_type, scope) if scope is not None else None
+
+    async def _cached_answer(
+        self, scope: Optional[CacheScope], message: str, use_cache: bool
+    ) -> Optional[str]:
+        if scope is None:
+            return None
+        if not use_cache:
+            self.answer_cache.stats.bypassed += 1
+            return None
+        # The cache is an optimization; failing to use it must not fail a reply
+        try:
+            return await self.answer_cache.lookup(scope, message)
+        except Exception as e:
+            logger.warning(f"Answer cache lookup failed: {e}")
+            return None
+
+    def _cache_answer(
+        self,
+        session: AgentSession,
+        scope: Optional[CacheScope],
+        message: str,
+        answer: str,
+    ) -> None:
+        """Cache an answer in the background, so the reply does not wait."""
+        if scope is None or not session.agent.cacheable(answer):
+            return
+        task = asyncio.create_task(self._store_answer(scope, message, answer))
+        self._cache_writes.add(task)
+        task.add_done_callback(self._cache_writes.discard)
+
+    async def _store_answer(self, scope: CacheScope, message: str, answer: str) -> None:
+        try:
+            async with self._cache_write_lock:
+                await self.answer_cache.store(scope, message, answer)
+        except Exception as e:
+            logger.warning(f"Could not cache answer: {e}")
+
+    def create_reader_agent(self, url: Union[str, List[str]]) -> AgentSession:
+        """Specifically create a reader agent, reading one URL or several"""
+        if isinstance(url, str):
+            return self.create_agent("reader", url=url)
+        return self.create_agent("reader", urls=list(url))
+
+    async def add_reader_urls(
+        self,
+        session_id: str,
+        urls: List[str],
+        progress: Optional[IngestionProgress] = None,
+    ) -> List[str]:
+        """Read more pages into a reader session.
+
+        Waits for the session's in-flight runs, so a run never sees a
+        half-updated context. Returns the URLs that could not be read.
+        """
+        async with self._running(session_id) as session:
+            if session.agent_type != "reader":
+                raise ValueError(f"Session {session_id} is not a reader session")
+            failed = await asyncio.to_thread(session.agent.add_urls, urls, progress)
+            session.metadata.pop("url", None)
+            session.metadata["urls"] = session.agent.sources
+            self._save_record(session)
+        return failed
+
+    async def create_reader_session(
+        self, urls: List[str], on_progress: Optional[ProgressFn] = None
+    ) -> IngestionJob:
+        """Create an empty reader session and read ``urls`` into it in the background.
+
+        Returns as soon as the job is queued; the job carries the session id.
+        """
+        session = self.create_agent("reader")
+        return await self.ingest_reader_urls(session.session_id, urls, on_progress)
+
+    async def ingest_reader_urls(
+        self,
+        session_id: str,
+        urls: List[str],
+        on_progress: Optional[ProgressFn] = None,
+    ) -> IngestionJob:
+        """Queue reading ``urls`` into a reader session and return the job.
+
+        The session is "ingesting" until all its jobs finish. It is then
+        "ready", or "failed" if it has not read a single page.
+        """
+        session = await self.aget_session(session_id)
+        if session is None:
+            raise ValueError(f"No active session found for ID: {session_id}")
+        if session.agent_type != "reader":
+            raise ValueError(f"Session {session_id} is not a reader session")
+        session.status = "ingesting"
+        self._ingesting[session_id] = self._ingesting.get(session_id, 0) + 1
+        try:
+            return await self.ingestion.submit(
+                IngestionJob(session_id=session_id, urls=urls), on_progress
+            )
+        except BaseException:
+            self._ingestion_finished(session_id)
+            raise
+
+    async def _ingest(self, job: IngestionJob) -> None:
+        try:
+            job.failed_urls = await self.add_reader_urls(
+                job.session_id, job.urls, job.progress
+            )
+            if len(job.failed_urls) == len(job.urls):
+                raise ValueError(f"Could not read any of {', '.join(job.urls)}")
+        finally:
+            self._ingestion_finished(job.session_id)
+
+    def _ingestion_finished(self, session_id: str) -> None:
+        pending = self._ingesting.pop(session_id, 1) - 1
+        if pending:
+            self._ingesting[session_id] = pending
+            return
+        session = self.sessions.get(session_id)
+        if session is not None:
+            session.status = "ready" if session.agent.sources else "failed"
 
     def get_available_agents(self) -> list[str]:
         """Get list of available agents"""
@@ -69,13 +421,57 @@ class AgentService:
 
     def cleanup_old_sessions(self, max_age_hours: int = 24) -> None:
         """Clean up sessions older than specified hours"""
-        current_time = datetime.now()
-        sessions_to_remove = []
-        
-        for session_id, session in self.sessions.items():
-            age = (current_time - session.last_used).total_seconds() / 3600
-            if age > max_age_hours:
-                sessions_to_remove.append(session_id)
-        
-        for session_id in sessions_to_remove:
-            del self.sessions[session_id]
+        self.sessions.evict_expired(max_age_hours * 3600)
+
+    def close(self) -> None:
+        """Write out buffered session state and close the store."""
+        self.store.close()
+
+    def _release_session(self, session: AgentSession) -> None:
+        """Free the resources of an evicted session."""
+        session.agent.close()
+
+    def start_reaper(
+        self, interval_seconds: float = settings.session_reaper_interval_seconds
+    ) -> asyncio.Task:
+        """Start a background task that periodically evicts idle sessions."""
+        if self._reaper is None or self._reaper.done():
+            self._reaper = asyncio.create_task(self._reap(interval_seconds))
+        return self._reaper
+
+    async def stop_reaper(self) -> None:
+        if self._reaper is not None:
+            self._reaper.cancel()
+            try:
+                await self._reaper
+            except asyncio.CancelledError:
+                pass
+            self._reaper = None
+
+    async def _reap(self, interval_seconds: float) -> None:
+        while True:
+            await asyncio.sleep(interval_seconds)
+            try:
+                evicted = self.sessions.evict_expired()
+                evicted_entries = evict_expired_index_entries()
+                self.scheduler.evict_idle()
+                if self.answer_cache is not None:
+                    self.answer_cache.evict_expired()
+                    stats = self.answer_cache.stats
+                    if stats.lookups:
+                        logger.info(
+                            f"Answer cache: {stats.hit_rate:.0%} hit rate over "
+                            f"{stats.lookups} lookups, {len(self.answer_cache)} answers"
+                        )
+                purged = self.store.purge_before(
+                    datetime.now() - timedelta(days=settings.session_retention_days)
+                )
+                self.store.flush()
+                if evicted or evicted_entries or purged:
+                    logger.info(
+                        f"Reaper evicted {evicted} sessions and "
+                        f"{evicted_entries} document index entries, "
+                        f"purged {purged} stored sessions"
+                    )
+            except Exception as e:
+                logger.error(f"Error in session reaper: {e}")
@@ -0,0 +1,192 @@
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Dict, FrozenSet, List, Optional, Tuple
+from langchain_core.embeddings import Embeddings
+from botify.config import settings
+from botify.logging.logger import logger
+from botify.rag.bm25 import tokenize
+from botify.rag.retriever import cosine_similarity
+
+
+# (agent type, hash of what the agent's answers depend on besides the question)
+CacheScope = Tuple[str, str]
+
+
+def normalize_question(text: str) -> str:
+    """Lower-case a question and drop whitespace and end punctuation noise."""
+    return " ".join(text.lower().split()).rstrip(" ?!.")
+
+
+@dataclass
+class AnswerCacheStats:
+    lookups: int = 0
+    exact_hits: int = 0
+    semantic_hits: int = 0
+    bypassed: int = 0
+    stores: int = 0
+    evictions: int = 0
+
+    @property
+    def hits(self) -> int:
+        return self.exact_hits + self.semantic_hits
+
+    @property
+    def hit_rate(self) -> float:
+        return self.hits / self.lookups if self.lookups else 0.0
+
+
+def question_terms(text: str) -> FrozenSet[str]:
+    """The words a question is about, without stopwords."""
+    return frozenset(tokenize(text))
+
+
+@dataclass
+class CachedAnswer:
+    question: str
+    terms: FrozenSet[str]
+    vector: List[float]
+    answer: str
+    stored_at: float = field(default_factory=time.monotonic)
+
+
+class AnswerCache:
+    """Answers to earlier questions, found again by question similarity.
+
+    Answers are kept per scope, so a question only hits answers given by
+    the same agent type from the same documents. A question hits when its
+    normalized text was asked before, without embedding it, or when it has
+    the same terms as an earlier question, in any order and with different
+    stopwords, and at least ``threshold`` cosine similarity with it.
+    Embeddings alone are not trusted, as questions differing in one word,
+    like "boiling point" and "freezing point", embed almost alike. Answers
+    expire after ``ttl_seconds``, and the least recently
+    used go once there are more than ``max_entries``.
+    """
+
+    def __init__(
+        self,
+        embeddings: Optional[Embeddings] = None,
+        threshold: float = settings.answer_cache_threshold,
+        ttl_seconds: float = settings.answer_cache_ttl_seconds,
+        max_entries: int = settings.answer_cache_max_entries,
+    ):
+        self._embeddings = embeddings
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.stats = AnswerCacheStats()
+        self._scopes: Dict[CacheScope, Dict[str, CachedAnswer]] = {}
+        # Least recently used first
+        self._order: "OrderedDict[Tuple[CacheScope, str], None]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def embeddings(self) -> Embeddings:
+        """Question embeddings; the document index's cached ones by default."""
+        if self._embeddings is None:
+            from botify.rag.document_index import get_document_index
+
+            self._embeddings = get_document_index().embeddings
+        return self._embeddings
+
+    def __len__(self) -> int:
+        return len(self._order)
+
+    async def lookup(self, scope: CacheScope, question: str) -> Optional[str]:
+        """Return the answer to an earlier, similar question in ``scope``."""
+        key = normalize_question(question)
+        with self._lock:
+            self.stats.lookups += 1
+            entry = self._get(scope, key)
+            if entry is not None:
+                self.stats.exact_hits += 1
+                return entry.answer
+            terms = question_terms(key)
+            if not self._candidates(scope, terms):
+                return None
+
+        vector = await asyncio.to_thread(self._embed, key)
+        with self._lock:
+            best, best_similarity = None, self.threshold
+            for candidate in self._candidates(scope, terms):
+                entry = self._get(scope, candidate, touch=False)
+                if entry is None:
+                    continue
+                similarity = cosine_similarity(vector, entry.vector)
+                if similarity >= best_similarity:
+                    best, best_similarity = candidate, similarity
+            if best is None:
+                return None
+            self.stats.semantic_hits += 1
+            return self._get(scope, best).answer
+
+    async def store(self, scope: CacheScope, question: str, answer: str) -> None:
+        """Remember ``answer`` for ``question``, replacing an earlier one."""
+        key = normalize_question(question)
+        vector = await asyncio.to_thread(self._embed, key)
+        with self._lock:
+            self._scopes.setdefault(scope, {})[key] = CachedAnswer(
+                question=question,
+                terms=question_terms(key),
+                vector=vector,
+                answer=answer,
+            )
+            self._order[(scope, key)] = None
+            self._order.move_to_end((scope, key))
+            self.stats.stores += 1
+            while len(self._order) > self.max_entries:
+                self._remove(*next(iter(self._order)))
+
+    def evict_expired(self) -> int:
+        """Drop answers older than the TTL."""
+        cutoff = time.monotonic() - self.ttl_seconds
+        with self._lock:
+            expired = [
+                (scope, key)
+                for scope, entries in self._scopes.items()
+                for key, entry in entries.items()
+                if entry.stored_at < cutoff
+            ]
+            for scope, key in expired:
+                self._remove(scope, key)
+        if expired:
+            logger.info(f"Evicted {len(expired)} expired cached answers")
+        return len(expired)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._scopes.clear()
+            self._order.clear()
+
+    def _embed(self, question: str) -> List[float]:
+        # In a worker thread, as building the default embeddings blocks too
+        return self.embeddings.embed_query(question)
+
+    def _candidates(self, scope: CacheScope, terms: FrozenSet[str]) -> List[str]:
+        """Keys of the scope's questions with exactly these terms."""
+        entries = self._scopes.get(scope, {})
+        return [key for key, entry in entries.items() if entry.terms == terms]
+
+    def _get(
+        self, scope: CacheScope, key: str, touch: bool = True
+    ) -> Optional[CachedAnswer]:
+        entry = self._scopes.get(scope, {}).get(key)
+        if entry is None:
+            return None
+        if time.monotonic() - entry.stored_at > self.ttl_seconds:
+            self._remove(scope, key)
+            return None
+        if touch:
+            self._order.move_to_end((scope, key))
+        return entry
+
+    def _remove(self, scope: CacheScope, key: str) -> None:
+        entries = self._scopes.get(scope, {})
+        entries.pop(key, None)
+        if not entries:
+            self._scopes.pop(scope, None)
+        self._order.pop((scope, key), None)
+        self.stats.evictions += 1
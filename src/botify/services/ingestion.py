@@ -0,0 +1,127 @@
+import asyncio
+import uuid
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, List, Optional
+from botify.config import settings
+from botify.logging.logger import logger
+from botify.rag.document_index import IngestionProgress
+
+
+@dataclass
+class IngestionJob:
+    """Pages to read into a reader session, and how far reading them got.
+
+    ``status`` goes from "queued" to "running", then to "done" or "failed".
+    """
+
+    session_id: str
+    urls: List[str]
+    job_id: str = field(default_factory=lambda: str(uuid.uuid4()))
+    status: str = "queued"
+    progress: IngestionProgress = field(default_factory=IngestionProgress)
+    failed_urls: List[str] = field(default_factory=list)
+    error: Optional[str] = None
+    done: asyncio.Event = field(default_factory=asyncio.Event)
+
+
+# Runs a job to completion; the worker handles status and reporting
+IngestFn = Callable[[IngestionJob], Awaitable[None]]
+# Called with the job while it runs and once it has finished
+ProgressFn = Callable[[IngestionJob], Awaitable[None]]
+
+
+class IngestionQueue:
+    """Reads pages in worker tasks, off the path of the update that asked.
+
+    ``submit`` only enqueues the job, so the caller can acknowledge at once.
+    ``workers`` jobs run at a time; ``ingest`` is expected to push the
+    blocking work to a thread. While a job runs, ``on_progress`` is called
+    every ``progress_interval`` seconds, and once more when it finishes.
+    """
+
+    def __init__(
+        self,
+        ingest: IngestFn,
+        workers: int = settings.ingestion_workers,
+        progress_interval: float = settings.ingestion_progress_interval_seconds,
+    ):
+        self.ingest = ingest
+        self.workers = workers
+        self.progress_interval = progress_interval
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+
+    @property
+    def pending(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    def start(self) -> None:
+        """Start the worker tasks on the running loop, if not yet started."""
+        if self._tasks:
+            return
+        self._queue = asyncio.Queue()
+        self._tasks = [
+            asyncio.create_task(self._work(), name=f"botify-ingestion-{n}")
+            for n in range(self.workers)
+        ]
+
+    async def join(self) -> None:
+        """Wait until every queued job has finished and been reported."""
+        if self._queue is not None:
+            await self._queue.join()
+
+    async def stop(self) -> None:
+        """Cancel the workers; queued jobs are dropped."""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._queue = None
+
+    async def submit(
+        self, job: IngestionJob, on_progress: Optional[ProgressFn] = None
+    ) -> IngestionJob:
+        """Queue a job and return it without waiting for it to run."""
+        self.start()
+        await self._queue.put((job, on_progress))
+        logger.info(
+            f"Queued ingestion of {len(job.urls)} URLs for session {job.session_id}"
+        )
+        return job
+
+    async def _work(self) -> None:
+        while True:
+            job, on_progress = await self._queue.get()
+            try:
+                await self._run(job, on_progress)
+            finally:
+                self._queue.task_done()
+
+    async def _run(self, job: IngestionJob, on_progress: Optional[ProgressFn]) -> None:
+        job.status = "running"
+        ingestion = asyncio.create_task(self.ingest(job))
+        try:
+            while not ingestion.done():
+                await asyncio.wait({ingestion}, timeout=self.progress_interval)
+                if on_progress is not None and not ingestion.done():
+                    await self._report(job, on_progress)
+            await ingestion
+            job.status = "done"
+        except asyncio.CancelledError:
+            ingestion.cancel()
+            raise
+        except Exception as e:
+            logger.error(f"Ingestion for session {job.session_id} failed: {e}")
+            job.status = "failed"
+            job.error = str(e)
+        finally:
+            job.done.set()
+        if on_progress is not None:
+            await self._report(job, on_progress)
+
+    async def _report(self, job: IngestionJob, on_progress: ProgressFn) -> None:
+        # A failing progress message must not fail the ingestion
+        try:
+            await on_progress(job)
+        except Exception as e:
+            logger.warning(f"Could not report ingestion progress: {e}")
@@ -0,0 +1,294 @@
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter
+from dataclasses import fields
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from uuid import UUID
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.documents import Document
+from langchain_core.outputs import LLMResult
+
+# Content type of the Prometheus text exposition format
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Prometheus' default buckets, in seconds
+SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+TOKEN_BUCKETS = (16, 64, 256, 1024, 4096, 16384, 65536)
+COUNT_BUCKETS = (0, 1, 2, 3, 4, 5, 8, 10, 15, 20, 50)
+SCORE_BUCKETS = (0.005, 0.01, 0.02, 0.03, 0.05, 0.1, 0.25, 0.5, 0.75, 1)
+
+
+def _labels(names: Sequence[str], values: Sequence[str]) -> str:
+    def escape(value: str) -> str:
+        return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+    pairs = [f'{name}="{escape(str(value))}"' for name, value in zip(names, values)]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class Histogram:
+    """Distribution of observed values per label set, aggregated in-process."""
+
+    def __init__(
+        self,
+        name: str,
+        description: str,
+        labels: Sequence[str],
+        buckets: Sequence[float],
+    ):
+        self.name = name
+        self.description = description
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        # Per label values: the count in each bucket, then the sum of values
+        self._series: Dict[Tuple[str, ...], Tuple[List[int], List[float]]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *label_values: str) -> None:
+        with self._lock:
+            counts, total = self._series.setdefault(
+                label_values, ([0] * (len(self.buckets) + 1), [0.0])
+            )
+            counts[bisect_left(self.buckets, value)] += 1
+            total[0] += value
+
+    def count(self, *label_values: str) -> int:
+        counts, _ = self._series.get(label_values, ([], []))
+        return sum(counts)
+
+    def render(self) -> List[str]:
+        lines = [
+            f"# HELP {self.name} {self.description}",
+            f"# TYPE {self.name} histogram",
+        ]
+        with self._lock:
+            series = [(key, list(c), t[0]) for key, (c, t) in self._series.items()]
+        for label_values, counts, total in sorted(series):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else _number(bound)
+                labels = _labels(self.labels + ("le",), label_values + (le,))
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _labels(self.labels, label_values)
+            lines.append(f"{self.name}_sum{labels} {_number(total)}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+def render_stats(prefix: str, description: str, stats: Any) -> List[str]:
+    """Counters for every numeric field of a stats dataclass."""
+    lines = []
+    for field in fields(stats):
+        name = f"{prefix}_{field.name}_total"
+        lines += [
+            f"# HELP {name} {description}: {field.name.replace('_', ' ')}",
+            f"# TYPE {name} counter",
+            f"{name} {_number(getattr(stats, field.name))}",
+        ]
+    return lines
+
+
+def render_gauge(name: str, description: str, value: float) -> List[str]:
+    return [
+        f"# HELP {name} {description}",
+        f"# TYPE {name} gauge",
+        f"{name} {_number(value)}",
+    ]
+
+
+class GraphMetrics:
+    """Histograms describing the runs of agent graphs."""
+
+    def __init__(self):
+        self.node_seconds = Histogram(
+            "botify_node_seconds",
+            "Wall time of agent graph nodes",
+            ("agent", "node"),
+            SECONDS_BUCKETS,
+        )
+        self.llm_tokens = Histogram(
+            "botify_llm_tokens",
+            "Tokens per LLM call, by graph node and direction",
+            ("agent", "node", "direction"),
+            TOKEN_BUCKETS,
+        )
+        self.retrieved_chunks = Histogram(
+            "botify_retrieved_chunks",
+            "Chunks returned per retrieval",
+            ("agent",),
+            COUNT_BUCKETS,
+        )
+        self.retrieval_score = Histogram(
+            "botify_retrieval_score",
+            "Fused rank score of each retrieved chunk",
+            ("agent",),
+            SCORE_BUCKETS,
+        )
+        self.node_visits = Histogram(
+            "botify_node_visits",
+            "Times each node ran per agent run, e.g. rewrite loops",
+            ("agent", "node"),
+            COUNT_BUCKETS,
+        )
+
+    def render(self) -> List[str]:
+        lines = []
+        for histogram in (
+            self.node_seconds,
+            self.llm_tokens,
+            self.retrieved_chunks,
+            self.retrieval_score,
+            self.node_visits,
+        ):
+            lines += histogram.render()
+        return lines
+
+
+# Process-wide metrics of every agent run
+graph_metrics = GraphMetrics()
+
+
+def _agent(metadata: Optional[Dict[str, Any]]) -> str:
+    return str((metadata or {}).get("agent_type", "unknown"))
+
+
+class GraphMetricsHandler(BaseCallbackHandler):
+    """Records per-node timings, token usage and retrievals of graph runs.
+
+    Attach it to a run's ``callbacks``, with the agent type in the run's
+    ``metadata``. A graph run is one without a ``langgraph_node``; its nodes
+    are its children named after the node they run.
+    """
+
+    # Handlers are called inline rather than on a thread pool; this one
+    # only does a few dictionary updates
+    run_inline = True
+
+    def __init__(self, metrics: GraphMetrics = graph_metrics):
+        self.metrics = metrics
+        # Graph runs in progress, with how often each node ran so far
+        self._graphs: Dict[UUID, Tuple[str, Counter]] = {}
+        # Node runs in progress, with their start time
+        self._nodes: Dict[UUID, Tuple[str, str, float]] = {}
+        # LLM and retriever runs in progress, with the node they run in
+        self._children: Dict[UUID, Tuple[str, str]] = {}
+
+    def on_chain_start(
+        self,
+        serialized: Dict[str, Any],
+        inputs: Any,
+        *,
+        run_id: UUID,
+        parent_run_id: Optional[UUID] = None,
+        metadata: Optional[Dict[str, Any]] = None,
+        **kwargs: Any,
+    ) -> None:
+        node = (metadata or {}).get("langgraph_node")
+        if node is None:
+            self._graphs[run_id] = (_agent(metadata), Counter())
+        elif parent_run_id in self._graphs and kwargs.get("name") == node:
+            agent, visits = self._graphs[parent_run_id]
+            visits[node] += 1
+            self._nodes[run_id] = (agent, node, time.perf_counter())
+
+    def _end_chain(self, run_id: UUID) -> None:
+        node_run = self._nodes.pop(run_id, None)
+        if node_run is not None:
+            agent, node, start = node_run
+            self.metrics.node_seconds.observe(time.perf_counter() - start, agent, node)
+            return
+        graph_run = self._graphs.pop(run_id, None)
+        if graph_run is not None:
+            agent, visits = graph_run
+            for node, count in visits.items():
+                if not node.startswith("__"):
+                    self.metrics.node_visits.observe(count, agent, node)
+
+    def on_chain_end(self, outputs: Any, *, run_id: UUID, **kwargs: Any) -> None:
+        self._end_chain(run_id)
+
+    def on_chain_error(
+        self, error: BaseException, *, run_id: UUID, **kwargs: Any
+    ) -> None:
+        self._end_chain(run_id)
+
+    def _start_child(self, run_id: UUID, metadata: Optional[Dict[str, Any]]) -> None:
+        node = (metadata or {}).get("langgraph_node")
+        if node is not None:
+            self._children[run_id] = (_agent(metadata), node)
+
+    def on_chat_model_start(
+        self,
+        serialized: Dict[str, Any],
+        messages: Any,
+        *,
+        run_id: UUID,
+        metadata: Optional[Dict[str, Any]] = None,
+        **kwargs: Any,
+    ) -> None:
+        self._start_child(run_id, metadata)
+
+    def on_llm_start(
+        self,
+        serialized: Dict[str, Any],
+        prompts: List[str],
+        *,
+        run_id: UUID,
+        metadata: Optional[Dict[str, Any]] = None,
+        **kwargs: Any,
+    ) -> None:
+        self._start_child(run_id, metadata)
+
+    def on_llm_end(self, response: LLMResult, *, run_id: UUID, **kwargs: Any) -> None:
+        child = self._children.pop(run_id, None)
+        if child is None:
+            return
+        agent, node = child
+        for generations in response.generations:
+            for generation in generations:
+                message = getattr(generation, "message", None)
+                usage = getattr(message, "usage_metadata", None)
+                if usage:
+                    tokens = self.metrics.llm_tokens
+                    tokens.observe(usage["input_tokens"], agent, node, "input")
+                    tokens.observe(usage["output_tokens"], agent, node, "output")
+
+    def on_llm_error(
+        self, error: BaseException, *, run_id: UUID, **kwargs: Any
+    ) -> None:
+        self._children.pop(run_id, None)
+
+    def on_retriever_start(
+        self,
+        serialized: Dict[str, Any],
+        query: str,
+        *,
+        run_id: UUID,
+        metadata: Optional[Dict[str, Any]] = None,
+        **kwargs: Any,
+    ) -> None:
+        self._start_child(run_id, metadata)
+
+    def on_retriever_end(
+        self, documents: Sequence[Document], *, run_id: UUID, **kwargs: Any
+    ) -> None:
+        child = self._children.pop(run_id, None)
+        if child is None:
+            return
+        agent, _ = child
+        self.metrics.retrieved_chunks.observe(len(documents), agent)
+        for document in documents:
+            score = document.metadata.get("score")
+            if score is not None:
+                self.metrics.retrieval_score.observe(score, agent)
+
+    def on_retriever_error(
+        self, error: BaseException, *, run_id: UUID, **kwargs: Any
+    ) -> None:
+        self._children.pop(run_id, None)
@@ -0,0 +1,216 @@
+import asyncio
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import AsyncIterator, Deque, Dict, Optional, Tuple
+from botify.config import settings
+
+
+class RunRejected(Exception):
+    """An agent run was refused; it may be retried after ``retry_after`` seconds."""
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class RateLimited(RunRejected):
+    """The user sent more messages than their token bucket allows."""
+
+
+class QueueFull(RunRejected):
+    """Too many runs are already waiting for a slot."""
+
+
+class TokenBucket:
+    """Allows ``rate`` takes per second on average and ``capacity`` at once."""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def take(self) -> float:
+        """Take a token, returning 0, or the seconds until one is available."""
+        self._refill()
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    @property
+    def full(self) -> bool:
+        self._refill()
+        return self.tokens >= self.capacity
+
+
+@dataclass
+class SchedulerStats:
+    granted: int = 0
+    rate_limited: int = 0
+    queue_full: int = 0
+
+
+class FairScheduler:
+    """Hands out agent run slots fairly between users and their sessions.
+
+    At most ``max_concurrent`` runs execute at once, and at most
+    ``max_per_session`` within a session, so a session's runs never race on
+    its agent's state. Runs waiting for a slot are served round-robin by
+    user, and round-robin among each user's sessions, so a user with many
+    queued messages or sessions gets no more turns than one asking a single
+    question. Runs without a user count as a user of their own per session.
+
+    A user's messages are admitted by a token bucket of ``user_rate`` per
+    second and ``user_burst`` at once, and at most ``max_queued`` runs wait
+    in total; beyond either, runs are refused with ``RunRejected``.
+    """
+
+    def __init__(
+        self,
+        max_concurrent: int = settings.max_concurrent_runs,
+        max_per_session: int = settings.max_runs_per_session,
+        max_queued: int = settings.scheduler_max_queued,
+        user_rate: float = settings.user_rate_per_second,
+        user_burst: int = settings.user_burst,
+    ):
+        self.max_concurrent = max_concurrent
+        self.max_per_session = max_per_session
+        self.max_queued = max_queued
+        self.user_rate = user_rate
+        self.user_burst = user_burst
+        self.stats = SchedulerStats()
+        self.running = 0
+        self.queued = 0
+        self._session_running: Dict[str, int] = {}
+        # Users with waiting runs in round-robin order, each with its
+        # sessions' waiting runs, also in round-robin order
+        self._waiting: "OrderedDict[str, OrderedDict[str, Deque[asyncio.Future]]]" = (
+            OrderedDict()
+        )
+        self._buckets: Dict[str, TokenBucket] = {}
+
+    def session_busy(self, session_id: str) -> bool:
+        """Whether a new run of the session would have to wait for another."""
+        return self._session_running.get(session_id, 0) >= self.max_per_session
+
+    def admit(self, user_id: str) -> None:
+        """Take one of the user's tokens, or raise ``RateLimited``."""
+        bucket = self._buckets.get(user_id)
+        if bucket is None:
+            bucket = self._buckets[user_id] = TokenBucket(
+                self.user_rate, self.user_burst
+            )
+        wait = bucket.take()
+        if wait:
+            self.stats.rate_limited += 1
+            raise RateLimited(
+                f"User {user_id} is sending messages too fast", retry_after=wait
+            )
+
+    def evict_idle(self) -> int:
+        """Forget users whose buckets refilled; they start out full anyway."""
+        idle = [user for user, bucket in self._buckets.items() if bucket.full]
+        for user in idle:
+            del self._buckets[user]
+        return len(idle)
+
+    @asynccontextmanager
+    async def slot(
+        self, session_id: str, user_id: Optional[str] = None
+    ) -> AsyncIterator[None]:
+        """Hold a run slot for the session, admitting the user's message first."""
+        if user_id is not None:
+            self.admit(user_id)
+        await self._acquire(session_id, user_id or f"session:{session_id}")
+        try:
+            yield
+        finally:
+            self._release(session_id)
+
+    async def _acquire(self, session_id: str, user_key: str) -> None:
+        if not self.queued and self._can_run(session_id):
+            self._grant(session_id)
+            return
+        if self.queued >= self.max_queued:
+            self.stats.queue_full += 1
+            raise QueueFull("Too many messages are waiting", retry_after=1.0)
+
+        future = asyncio.get_running_loop().create_future()
+        sessions = self._waiting.setdefault(user_key, OrderedDict())
+        sessions.setdefault(session_id, deque()).append(future)
+        self.queued += 1
+        self._dispatch()
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.cancelled():
+                self._forget(user_key, session_id, future)
+            else:
+                # Granted just as it was cancelled
+                self._release(session_id)
+            raise
+
+    def _can_run(self, session_id: str) -> bool:
+        return self.running < self.max_concurrent and not self.session_busy(session_id)
+
+    def _grant(self, session_id: str) -> None:
+        self.running += 1
+        self._session_running[session_id] = self._session_running.get(session_id, 0) + 1
+        self.stats.granted += 1
+
+    def _release(self, session_id: str) -> None:
+        self.running -= 1
+        self._session_running[session_id] -= 1
+        if not self._session_running[session_id]:
+            del self._session_running[session_id]
+        self._dispatch()
+
+    def _dispatch(self) -> None:
+        """Hand free slots to waiting runs, taking turns."""
+        while self.running < self.max_concurrent:
+            turn = self._next_turn()
+            if turn is None:
+                return
+            session_id, future = turn
+            if future.done():
+                # Cancelled while waiting
+                continue
+            self._grant(session_id)
+            future.set_result(None)
+
+    def _next_turn(self) -> Optional[Tuple[str, asyncio.Future]]:
+        for user_key, sessions in self._waiting.items():
+            for session_id, waiters in sessions.items():
+                if self.session_busy(session_id):
+                    continue
+                future = waiters.popleft()
+                self.queued -= 1
+                # Both go to the back of their round
+                del sessions[session_id]
+                if waiters:
+                    sessions[session_id] = waiters
+                del self._waiting[user_key]
+                if sessions:
+                    self._waiting[user_key] = sessions
+                return session_id, future
+        return None
+
+    def _forget(self, user_key: str, session_id: str, future: asyncio.Future) -> None:
+        sessions = self._waiting.get(user_key, {})
+        waiters = sessions.get(session_id)
+        if waiters is None or future not in waiters:
+            return
+        waiters.remove(future)
+        self.queued -= 1
+        if not waiters:
+            del sessions[session_id]
+        if not sessions:
+            del self._waiting[user_key]
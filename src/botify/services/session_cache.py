@@ -0,0 +1,145 @@
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Callable, Dict, Iterator, Optional
+from botify.config import settings
+from botify.logging.logger import logger
+from botify.models.agent_session import AgentSession
+
+
+class SessionCache:
+    """Bounded store of live agent sessions with idle expiry and LRU eviction.
+
+    Sessions are kept in an ``OrderedDict`` ordered by last access, so the
+    least recently used session is always at the front. Expiry walks from the
+    front and stops at the first session that is still fresh, and capacity
+    eviction pops from the front, both in amortized O(1) per evicted session.
+
+    Capacity is bounded both by session count and by the total
+    ``resource_weight()`` of the agents, a rough proxy for their memory use.
+    Weights are taken when a session is added and refreshed by ``reweigh``,
+    not on every access.
+    Sessions pinned by an in-flight run are never evicted. ``on_evict`` is
+    called for every evicted session so its resources can be freed.
+    """
+
+    def __init__(
+        self,
+        max_sessions: int = settings.session_max_count,
+        idle_ttl_seconds: float = settings.session_idle_ttl_seconds,
+        max_weight: int = settings.session_max_weight,
+        on_evict: Optional[Callable[[AgentSession], None]] = None,
+    ):
+        self.max_sessions = max_sessions
+        self.idle_ttl_seconds = idle_ttl_seconds
+        self.max_weight = max_weight
+        self.on_evict = on_evict
+        self._sessions: "OrderedDict[str, AgentSession]" = OrderedDict()
+        self._last_access: Dict[str, float] = {}
+        self._weights: Dict[str, int] = {}
+        self._pins: Dict[str, int] = {}
+        self.total_weight = 0
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def __contains__(self, session_id: str) -> bool:
+        return session_id in self._sessions
+
+    def __iter__(self) -> Iterator[AgentSession]:
+        return iter(list(self._sessions.values()))
+
+    def get(self, session_id: str) -> Optional[AgentSession]:
+        """Return a session and mark it as most recently used."""
+        session = self._sessions.get(session_id)
+        if session is not None:
+            self.touch(session_id)
+        return session
+
+    def put(self, session: AgentSession) -> None:
+        """Add or replace a session, evicting others if over capacity."""
+        self._sessions[session.session_id] = session
+        self.touch(session.session_id)
+        self.reweigh(session.session_id)
+
+    def touch(self, session_id: str) -> None:
+        """Mark a session as used now."""
+        session = self._sessions[session_id]
+        session.last_used = datetime.now()
+        self._last_access[session_id] = time.monotonic()
+        self._sessions.move_to_end(session_id)
+
+    def reweigh(self, session_id: str) -> None:
+        """Refresh a session's weight, evicting others if now over capacity.
+
+        Called after runs, which may have grown the agent.
+        """
+        session = self._sessions.get(session_id)
+        if session is None:
+            return
+        weight = max(1, session.agent.resource_weight())
+        self.total_weight += weight - self._weights.get(session_id, 0)
+        self._weights[session_id] = weight
+        self._evict_over_capacity()
+
+    def pop(self, session_id: str) -> Optional[AgentSession]:
+        """Remove a session without calling ``on_evict``."""
+        session = self._sessions.pop(session_id, None)
+        self._last_access.pop(session_id, None)
+        self._pins.pop(session_id, None)
+        self.total_weight -= self._weights.pop(session_id, 0)
+        return session
+
+    def pin(self, session_id: str) -> None:
+        """Protect a session from eviction until the matching ``unpin``."""
+        self._pins[session_id] = self._pins.get(session_id, 0) + 1
+
+    def unpin(self, session_id: str) -> None:
+        count = self._pins.get(session_id, 0) - 1
+        if count > 0:
+            self._pins[session_id] = count
+        else:
+            self._pins.pop(session_id, None)
+
+    def evict_expired(self, idle_ttl_seconds: Optional[float] = None) -> int:
+        """Evict sessions idle for longer than the TTL."""
+        ttl = self.idle_ttl_seconds if idle_ttl_seconds is None else idle_ttl_seconds
+        cutoff = time.monotonic() - ttl
+        evicted = 0
+        skipped = []
+        while self._sessions:
+            session_id = next(iter(self._sessions))
+            if self._last_access[session_id] > cutoff:
+                break
+            if session_id in self._pins:
+                # Park pinned sessions at the back so the walk can continue
+                skipped.append(session_id)
+                self._sessions.move_to_end(session_id)
+                if len(skipped) == len(self._sessions):
+                    break
+                continue
+            self._evict(session_id, "idle")
+            evicted += 1
+        return evicted
+
+    def _evict_over_capacity(self) -> None:
+        checked = 0
+        while (
+            len(self._sessions) > self.max_sessions
+            or self.total_weight > self.max_weight
+        ) and checked < len(self._sessions):
+            session_id = next(iter(self._sessions))
+            if session_id in self._pins:
+                self._sessions.move_to_end(session_id)
+                checked += 1
+                continue
+            self._evict(session_id, "capacity")
+
+    def _evict(self, session_id: str, reason: str) -> None:
+        session = self.pop(session_id)
+        logger.info(f"Evicting session {session_id} ({reason})")
+        if self.on_evict is not None and session is not None:
+            try:
+                self.on_evict(session)
+            except Exception as e:
+                logger.warning(f"Failed to release session {session_id}: {e}")
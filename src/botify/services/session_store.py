@@ -0,0 +1,406 @@
+import dataclasses
+import json
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from langchain_core.chat_history import BaseChatMessageHistory
+from langchain_core.messages import BaseMessage, message_to_dict, messages_from_dict
+from botify.config import settings
+from botify.logging.logger import logger
+
+
+@dataclass
+class SessionRecord:
+    """Everything needed to rebuild an ``AgentSession`` without its agent."""
+
+    session_id: str
+    agent_type: str
+    created_at: datetime
+    last_used: datetime
+    metadata: dict
+
+
+class SessionStore(ABC):
+    """Durable storage for session metadata, chat history and per-user data.
+
+    Live agents stay in the ``SessionCache``; the store only keeps what is
+    needed to rebuild them, so a session evicted from memory or lost to a
+    restart can be rehydrated on its next message.
+    """
+
+    @abstractmethod
+    def save_session(self, record: SessionRecord) -> None:
+        pass
+
+    @abstractmethod
+    def load_session(self, session_id: str) -> Optional[SessionRecord]:
+        pass
+
+    @abstractmethod
+    def touch_session(self, session_id: str, last_used: datetime) -> None:
+        pass
+
+    @abstractmethod
+    def delete_session(self, session_id: str) -> None:
+        """Delete a session together with its chat history."""
+        pass
+
+    @abstractmethod
+    def purge_before(self, cutoff: datetime) -> int:
+        """Delete sessions last used before ``cutoff``, returning how many."""
+        pass
+
+    @abstractmethod
+    def append_messages(self, session_id: str, messages: Sequence[BaseMessage]) -> None:
+        pass
+
+    @abstractmethod
+    def load_messages(self, session_id: str) -> List[BaseMessage]:
+        pass
+
+    @abstractmethod
+    def clear_messages(self, session_id: str) -> None:
+        pass
+
+    def messages_version(self, session_id: str) -> Optional[Tuple[int, int]]:
+        """How many messages a session has stored, and the id of the last.
+
+        Changes whenever another process changes them; None for stores only
+        this process writes to.
+        """
+        return None
+
+    @abstractmethod
+    def save_user_data(self, user_id: int, data: dict) -> None:
+        pass
+
+    @abstractmethod
+    def load_user_data(self) -> Dict[int, dict]:
+        pass
+
+    @abstractmethod
+    def delete_user_data(self, user_id: int) -> None:
+        pass
+
+    def flush(self) -> None:
+        """Write out any buffered changes."""
+        pass
+
+    def close(self) -> None:
+        self.flush()
+
+    def chat_history(self, session_id: str) -> "StoredChatMessageHistory":
+        """Chat history for a session, backed by this store."""
+        return StoredChatMessageHistory(self, session_id)
+
+
+class StoredChatMessageHistory(BaseChatMessageHistory):
+    """Chat history kept in memory and written through to a ``SessionStore``.
+
+    The messages are loaded again only when the store's
+    ``messages_version`` shows another process changed them. Added
+    messages are flushed at once, so a turn is stored before it is
+    answered.
+    """
+
+    def __init__(self, store: SessionStore, session_id: str):
+        self.store = store
+        self.session_id = session_id
+        self._messages: Optional[List[BaseMessage]] = None
+        self._version: Optional[Tuple[int, int]] = None
+
+    @property
+    def messages(self) -> List[BaseMessage]:
+        version = self.store.messages_version(self.session_id)
+        if self._messages is None or version != self._version:
+            self._messages = self.store.load_messages(self.session_id)
+            self._version = version
+        return self._messages
+
+    def add_messages(self, messages: Sequence[BaseMessage]) -> None:
+        messages = list(messages)
+        self.messages.extend(messages)
+        self.store.append_messages(self.session_id, messages)
+        self._written()
+
+    def clear(self) -> None:
+        self._messages = []
+        self.store.clear_messages(self.session_id)
+        self._written()
+
+    def _written(self) -> None:
+        self.store.flush()
+        self._version = self.store.messages_version(self.session_id)
+        if self._version is not None and self._version[0] != len(self._messages):
+            # Another process wrote too; load its messages on the next read
+            self._messages = None
+
+
+class InMemorySessionStore(SessionStore):
+    """Process-local store; sessions survive cache eviction but not restarts."""
+
+    def __init__(self):
+        self._sessions: Dict[str, SessionRecord] = {}
+        self._messages: Dict[str, List[BaseMessage]] = {}
+        self._user_data: Dict[int, dict] = {}
+        self._lock = threading.Lock()
+
+    def save_session(self, record: SessionRecord) -> None:
+        with self._lock:
+            self._sessions[record.session_id] = dataclasses.replace(record)
+
+    def load_session(self, session_id: str) -> Optional[SessionRecord]:
+        with self._lock:
+            record = self._sessions.get(session_id)
+            return dataclasses.replace(record) if record is not None else None
+
+    def touch_session(self, session_id: str, last_used: datetime) -> None:
+        with self._lock:
+            if session_id in self._sessions:
+                self._sessions[session_id].last_used = last_used
+
+    def delete_session(self, session_id: str) -> None:
+        with self._lock:
+            self._sessions.pop(session_id, None)
+            self._messages.pop(session_id, None)
+
+    def purge_before(self, cutoff: datetime) -> int:
+        with self._lock:
+            stale = [
+                sid for sid, record in self._sessions.items()
+                if record.last_used < cutoff
+            ]
+            for sid in stale:
+                del self._sessions[sid]
+                self._messages.pop(sid, None)
+            return len(stale)
+
+    def append_messages(self, session_id: str, messages: Sequence[BaseMessage]) -> None:
+        with self._lock:
+            self._messages.setdefault(session_id, []).extend(messages)
+
+    def load_messages(self, session_id: str) -> List[BaseMessage]:
+        with self._lock:
+            return list(self._messages.get(session_id, []))
+
+    def clear_messages(self, session_id: str) -> None:
+        with self._lock:
+            self._messages.pop(session_id, None)
+
+    def save_user_data(self, user_id: int, data: dict) -> None:
+        with self._lock:
+            self._user_data[user_id] = dict(data)
+
+    def load_user_data(self) -> Dict[int, dict]:
+        with self._lock:
+            return {user_id: dict(data) for user_id, data in self._user_data.items()}
+
+    def delete_user_data(self, user_id: int) -> None:
+        with self._lock:
+            self._user_data.pop(user_id, None)
+
+
+def _encode(value: Any) -> Any:
+    """JSON fallback for session metadata such as ``ChunkingConfig``."""
+    if dataclasses.is_dataclass(value) and not isinstance(value, type):
+        return dataclasses.asdict(value)
+    return str(value)
+
+
+class SQLiteSessionStore(SessionStore):
+    """Session store in a SQLite database in WAL mode.
+
+    Writes are buffered and committed together, in one transaction, once
+    ``batch_size`` statements are pending or ``flush_interval_seconds`` have
+    passed since the last commit. Reads flush first, so they always see
+    earlier writes. Call ``flush`` (the session reaper does) or ``close`` to
+    bound how much an unclean shutdown can lose.
+
+    Several processes may share the database. Chat histories are flushed
+    as turns are added and reloaded when another process changed them;
+    other writes, like ``touch_session``, reach other processes with the
+    next flush.
+    """
+
+    def __init__(
+        self,
+        path: str = settings.session_store_path,
+        batch_size: int = settings.session_store_batch_size,
+        flush_interval_seconds: float = settings.session_store_flush_interval_seconds,
+    ):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval_seconds = flush_interval_seconds
+        self._pending: List[Tuple[str, tuple]] = []
+        self._last_flush = time.monotonic()
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn: Optional[sqlite3.Connection] = sqlite3.connect(
+            path, check_same_thread=False
+        )
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            " session_id TEXT PRIMARY KEY,"
+            " agent_type TEXT NOT NULL,"
+            " created_at TEXT NOT NULL,"
+            " last_used TEXT NOT NULL,"
+            " metadata TEXT NOT NULL);"
+            "CREATE INDEX IF NOT EXISTS sessions_last_used ON sessions (last_used);"
+            "CREATE TABLE IF NOT EXISTS messages ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " session_id TEXT NOT NULL,"
+            " message TEXT NOT NULL);"
+            "CREATE INDEX IF NOT EXISTS messages_session ON messages (session_id, id);"
+            "CREATE TABLE IF NOT EXISTS user_data ("
+            " user_id INTEGER PRIMARY KEY,"
+            " data TEXT NOT NULL);"
+        )
+        self._conn.commit()
+
+    @property
+    def pending_writes(self) -> int:
+        return len(self._pending)
+
+    def _write(self, sql: str, params: tuple) -> None:
+        with self._lock:
+            self._pending.append((sql, params))
+            if (
+                len(self._pending) >= self.batch_size
+                or time.monotonic() - self._last_flush >= self.flush_interval_seconds
+            ):
+                self._flush_locked()
+
+    def _read(self, sql: str, params: tuple) -> list:
+        with self._lock:
+            self._flush_locked()
+            return self._conn.execute(sql, params).fetchall()
+
+    def _flush_locked(self) -> None:
+        self._last_flush = time.monotonic()
+        if not self._pending or self._conn is None:
+            return
+        pending, self._pending = self._pending, []
+        try:
+            with self._conn:
+                for sql, params in pending:
+                    self._conn.execute(sql, params)
+        except sqlite3.Error as e:
+            logger.error(f"Failed to write {len(pending)} session store changes: {e}")
+            raise
+
+    def flush(self) -> None:
+        with self._lock:
+            self._flush_locked()
+
+    def close(self) -> None:
+        with self._lock:
+            self._flush_locked()
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def save_session(self, record: SessionRecord) -> None:
+        self._write(
+            "INSERT OR REPLACE INTO sessions"
+            " (session_id, agent_type, created_at, last_used, metadata)"
+            " VALUES (?, ?, ?, ?, ?)",
+            (
+                record.session_id,
+                record.agent_type,
+                record.created_at.isoformat(),
+                record.last_used.isoformat(),
+                json.dumps(record.metadata, default=_encode),
+            ),
+        )
+
+    def load_session(self, session_id: str) -> Optional[SessionRecord]:
+        rows = self._read(
+            "SELECT agent_type, created_at, last_used, metadata FROM sessions"
+            " WHERE session_id = ?",
+            (session_id,),
+        )
+        if not rows:
+            return None
+        agent_type, created_at, last_used, metadata = rows[0]
+        return SessionRecord(
+            session_id=session_id,
+            agent_type=agent_type,
+            created_at=datetime.fromisoformat(created_at),
+            last_used=datetime.fromisoformat(last_used),
+            metadata=json.loads(metadata),
+        )
+
+    def touch_session(self, session_id: str, last_used: datetime) -> None:
+        self._write(
+            "UPDATE sessions SET last_used = ? WHERE session_id = ?",
+            (last_used.isoformat(), session_id),
+        )
+
+    def delete_session(self, session_id: str) -> None:
+        self._write("DELETE FROM messages WHERE session_id = ?", (session_id,))
+        self._write("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+
+    def purge_before(self, cutoff: datetime) -> int:
+        with self._lock:
+            self._flush_locked()
+            with self._conn:
+                self._conn.execute(
+                    "DELETE FROM messages WHERE session_id IN"
+                    " (SELECT session_id FROM sessions WHERE last_used < ?)",
+                    (cutoff.isoformat(),),
+                )
+                return self._conn.execute(
+                    "DELETE FROM sessions WHERE last_used < ?", (cutoff.isoformat(),)
+                ).rowcount
+
+    def append_messages(self, session_id: str, messages: Sequence[BaseMessage]) -> None:
+        for message in messages:
+            self._write(
+                "INSERT INTO messages (session_id, message) VALUES (?, ?)",
+                (session_id, json.dumps(message_to_dict(message))),
+            )
+
+    def load_messages(self, session_id: str) -> List[BaseMessage]:
+        rows = self._read(
+            "SELECT message FROM messages WHERE session_id = ? ORDER BY id",
+            (session_id,),
+        )
+        return messages_from_dict([json.loads(row[0]) for row in rows])
+
+    def clear_messages(self, session_id: str) -> None:
+        self._write("DELETE FROM messages WHERE session_id = ?", (session_id,))
+
+    def messages_version(self, session_id: str) -> Optional[Tuple[int, int]]:
+        # Message ids are never reused, so appends and clears both change it
+        rows = self._read(
+            "SELECT COUNT(*), COALESCE(MAX(id), 0) FROM messages WHERE session_id = ?",
+            (session_id,),
+        )
+        return tuple(rows[0])
+
+    def save_user_data(self, user_id: int, data: dict) -> None:
+        self._write(
+            "INSERT OR REPLACE INTO user_data (user_id, data) VALUES (?, ?)",
+            (user_id, json.dumps(data, default=_encode)),
+        )
+
+    def load_user_data(self) -> Dict[int, dict]:
+        rows = self._read("SELECT user_id, data FROM user_data", ())
+        return {user_id: json.loads(data) for user_id, data in rows}
+
+    def delete_user_data(self, user_id: int) -> None:
+        self._write("DELETE FROM user_data WHERE user_id = ?", (user_id,))
+
+
+def create_session_store(path: str = settings.session_store_path) -> SessionStore:
+    """SQLite store at ``path``, or an in-memory store if ``path`` is empty."""
+    if path:
+        return SQLiteSessionStore(path)
+    return InMemorySessionStore()
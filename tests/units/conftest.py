@@ -0,0 +1,252 @@
+import asyncio
+import hashlib
+import json
+import math
+import os
+import re
+import shutil
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, AsyncIterator, Iterator, List, Optional, Type
+import pytest
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_core.vectorstores import InMemoryVectorStore
+
+# Stores persisting to disk default to paths under the working directory.
+# Point them at a directory of the test run's own, before botify reads its
+# settings, so runs neither leave files in the checkout nor share state
+STATE_DIR = tempfile.mkdtemp(prefix="botify-tests-")
+os.environ["BOTIFY_SESSION_STORE_PATH"] = os.path.join(STATE_DIR, "sessions.sqlite3")
+os.environ["BOTIFY_EMBEDDING_CACHE_PATH"] = os.path.join(STATE_DIR, "embeddings.sqlite3")
+os.environ["BOTIFY_SCRAPER_CACHE_DIR"] = os.path.join(STATE_DIR, "pages")
+
+from botify.rag.document_index import DocumentIndex
+from botify.scraper import scraper as scraper_module
+from botify.scraper.scraper import ScraperEngine
+
+
+@pytest.fixture(scope="session", autouse=True)
+def state_dir() -> Iterator[str]:
+    yield STATE_DIR
+    shutil.rmtree(STATE_DIR, ignore_errors=True)
+
+
+class SlowFakeChatModel(BaseChatModel):
+    """Chat model that answers with a fixed reply after a fixed delay."""
+
+    delay: float = 0.1
+    reply: str = "fake response"
+
+    @property
+    def _llm_type(self) -> str:
+        return "slow-fake"
+
+    def bind_tools(self, tools: Any, **kwargs: Any) -> "BaseChatModel":
+        # Fake replies never call tools
+        return self
+
+    def _result(self) -> ChatResult:
+        return ChatResult(
+            generations=[ChatGeneration(message=AIMessage(content=self.reply))]
+        )
+
+    def _generate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Any = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        time.sleep(self.delay)
+        return self._result()
+
+    async def _agenerate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Any = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        await asyncio.sleep(self.delay)
+        return self._result()
+
+
+@pytest.fixture
+def slow_llm():
+    return SlowFakeChatModel(delay=0.2)
+
+
+class StreamingFakeChatModel(BaseChatModel):
+    """Chat model that streams a fixed reply word by word, with a delay per word."""
+
+    token_delay: float = 0.05
+    reply: str = "the quick brown fox jumps over the lazy dog"
+
+    @property
+    def _llm_type(self) -> str:
+        return "streaming-fake"
+
+    def bind_tools(self, tools: Any, **kwargs: Any) -> "BaseChatModel":
+        # Fake replies never call tools
+        return self
+
+    def _tokens(self) -> List[str]:
+        return re.split(r"(?<=\s)", self.reply)
+
+    def _generate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Any = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        time.sleep(self.token_delay * len(self._tokens()))
+        return ChatResult(
+            generations=[ChatGeneration(message=AIMessage(content=self.reply))]
+        )
+
+    async def _astream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Any = None,
+        **kwargs: Any,
+    ) -> AsyncIterator[ChatGenerationChunk]:
+        for token in self._tokens():
+            await asyncio.sleep(self.token_delay)
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=token))
+            if run_manager:
+                await run_manager.on_llm_new_token(token, chunk=chunk)
+            yield chunk
+
+
+class HashingEmbeddings(Embeddings):
+    """Bag-of-words embeddings that count how many texts they embed.
+
+    Texts sharing words get similar vectors, which is enough for retrieval
+    tests without a real embedding model.
+    """
+
+    def __init__(self, size: int = 256):
+        self.size = size
+        self.calls = 0
+        self.embedded_texts = 0
+
+    def _embed(self, text: str) -> List[float]:
+        vector = [0.0] * self.size
+        # Skip short words so function words don't dominate similarity
+        for word in re.findall(r"\w{4,}", text.lower()):
+            bucket = int(hashlib.md5(word.encode()).hexdigest(), 16) % self.size
+            vector[bucket] += 1.0
+        norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+        return [v / norm for v in vector]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        self.calls += 1
+        self.embedded_texts += len(texts)
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed(text)
+
+
+@pytest.fixture
+def embeddings():
+    return HashingEmbeddings()
+
+
+CORPUS_DIR = Path(__file__).parent.parent / "fixtures" / "corpus"
+
+
+@pytest.fixture
+def corpus() -> List[Document]:
+    return [
+        Document(page_content=path.read_text(), metadata={"source": path.name})
+        for path in sorted(CORPUS_DIR.glob("*.txt"))
+    ]
+
+
+@pytest.fixture
+def qa() -> List[dict]:
+    """Questions about the corpus, each with a phrase of its source answering it."""
+    return json.loads((CORPUS_DIR / "qa.json").read_text())
+
+
+def in_memory_store(collection_name, embeddings, persist_dir):
+    return InMemoryVectorStore(embeddings)
+
+
+@pytest.fixture
+def document_index(embeddings):
+    return DocumentIndex(embeddings, in_memory_store)
+
+
+class PageServer(ThreadingHTTPServer):
+    # The default backlog of 5 makes bursts of connections wait for SYN retries
+    request_queue_size = 128
+
+
+@contextmanager
+def serving(handler: Type[BaseHTTPRequestHandler]) -> Iterator[str]:
+    """Run a local HTTP server in a thread, yielding its base URL."""
+    httpd = PageServer(("127.0.0.1", 0), handler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield f"http://127.0.0.1:{httpd.server_address[1]}"
+    finally:
+        httpd.shutdown()
+        httpd.server_close()
+
+
+ANIMALS = "zebra walrus heron bison otter lemur falcon gecko".split()
+
+
+def topic_page(n: int) -> str:
+    """A page of distinct paragraphs about one animal, named after the page."""
+    name = f"{ANIMALS[n % len(ANIMALS)]}{n}"
+    paragraphs = "".join(
+        f"<p>Field note {i}: the {name} herd crossed the {name} valley "
+        f"during season {i}, watched by {name} rangers.</p>"
+        for i in range(30)
+    )
+    return f"<html><head><title>{name}</title></head><body>{paragraphs}</body></html>"
+
+
+class TopicHandler(BaseHTTPRequestHandler):
+    """Serves ``/topic/<n>`` pages after a fixed latency; other paths are 404."""
+
+    latency = 0.02
+
+    def do_GET(self):
+        time.sleep(self.latency)
+        if not self.path.startswith("/topic/"):
+            self.send_error(404)
+            return
+        body = topic_page(int(self.path.rsplit("/", 1)[-1])).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def topics(monkeypatch):
+    """Base URL of a local server of topic pages, read by the global scraper."""
+    engine = ScraperEngine(max_per_host=20)
+    monkeypatch.setattr(scraper_module, "_engine", engine)
+    with serving(TopicHandler) as url:
+        yield f"{url}/topic"
+    engine.close()
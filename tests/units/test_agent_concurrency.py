@@ -0,0 +1,120 @@
+import asyncio
+import time
+from datetime import datetime
+import pytest
+from langchain_core.messages import AIMessage
+from botify.agent.agents.base_agent import BaseAgent
+from botify.agent.agents.chat_agent import ChatAgent
+from botify.models.agent_session import AgentSession
+from botify.services.agent_service import AgentService
+
+
+class SyncOnlyAgent(BaseAgent):
+    """Agent without a compiled graph, exercising the executor fallback."""
+
+    def __init__(self, delay: float):
+        self.delay = delay
+
+    def generate_flow(self):
+        return None
+
+    def run(self, inputs, config):
+        time.sleep(self.delay)
+        return {"messages": [AIMessage(content="sync response")]}
+
+
+def add_session(service: AgentService, session_id: str, agent: BaseAgent) -> None:
+    service.sessions.put(
+        AgentSession(
+            session_id=session_id,
+            agent_type="test",
+            created_at=datetime.now(),
+            last_used=datetime.now(),
+            metadata={},
+            agent=agent,
+        )
+    )
+
+
+async def timed_gather(service: AgentService, requests) -> tuple[float, list]:
+    start = time.perf_counter()
+    results = await asyncio.gather(
+        *(service.process_message(message, sid) for message, sid in requests)
+    )
+    return time.perf_counter() - start, results
+
+
+@pytest.mark.parametrize("chats", [5, 20])
+def test_concurrent_chats_finish_in_slowest_time(slow_llm, chats):
+    """N concurrent chats take about as long as one, not N times as long."""
+    service = AgentService(max_concurrent_runs=chats)
+    for i in range(chats):
+        add_session(service, f"session-{i}", ChatAgent(slow_llm))
+
+    elapsed, results = asyncio.run(
+        timed_gather(service, [("hi", f"session-{i}") for i in range(chats)])
+    )
+
+    print(
+        f"\n{chats} chats, {slow_llm.delay:.2f}s per LLM call: "
+        f"{elapsed:.3f}s total (sequential would be {chats * slow_llm.delay:.2f}s)"
+    )
+    assert results == ["fake response"] * chats
+    assert elapsed < slow_llm.delay * 3
+
+
+def test_event_loop_stays_responsive(slow_llm):
+    service = AgentService()
+    add_session(service, "session", ChatAgent(slow_llm))
+
+    async def scenario():
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        task = asyncio.create_task(ticker())
+        await service.process_message("hi", "session")
+        task.cancel()
+        return ticks
+
+    assert asyncio.run(scenario()) >= 5
+
+
+def test_messages_within_a_session_are_serialized(slow_llm):
+    service = AgentService(max_concurrent_runs=10, max_runs_per_session=1)
+    add_session(service, "session", ChatAgent(slow_llm))
+
+    elapsed, _ = asyncio.run(
+        timed_gather(service, [("one", "session"), ("two", "session")])
+    )
+
+    assert elapsed >= slow_llm.delay * 2
+
+
+def test_global_concurrency_limit(slow_llm):
+    service = AgentService(max_concurrent_runs=2)
+    for i in range(4):
+        add_session(service, f"session-{i}", ChatAgent(slow_llm))
+
+    elapsed, _ = asyncio.run(
+        timed_gather(service, [("hi", f"session-{i}") for i in range(4)])
+    )
+
+    assert elapsed >= slow_llm.delay * 2
+
+
+def test_sync_only_agent_runs_on_executor():
+    service = AgentService(max_concurrent_runs=4)
+    for i in range(4):
+        add_session(service, f"session-{i}", SyncOnlyAgent(delay=0.2))
+
+    elapsed, results = asyncio.run(
+        timed_gather(service, [("hi", f"session-{i}") for i in range(4)])
+    )
+
+    assert results == ["sync response"] * 4
+    assert elapsed < 0.2 * 3
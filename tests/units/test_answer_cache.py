@@ -0,0 +1,280 @@
+import asyncio
+import time
+from typing import List
+from unittest.mock import AsyncMock, Mock
+import pytest
+import botify.handlers.bot_handler as bot_handler_module
+from botify.agent.agents.chat_agent import ChatAgent
+from botify.agent.agents.reader_agent import FALLBACK_ANSWER
+from botify.config import Settings
+from botify.handlers.bot_handler import BotHandler
+from botify.services.agent_service import AgentService
+from botify.services.answer_cache import AnswerCache
+from conftest import HashingEmbeddings
+from test_agent_concurrency import add_session
+from test_reader_agent import UNANSWERABLE
+from test_retrieval import install_fake_models, reader_for
+
+SCOPE = ("reader", "abc")
+
+
+@pytest.fixture(autouse=True)
+def openai_key(monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+
+
+class QueryCountingEmbeddings(HashingEmbeddings):
+    def __init__(self):
+        super().__init__()
+        self.queries = 0
+
+    def embed_query(self, text: str) -> List[float]:
+        self.queries += 1
+        return super().embed_query(text)
+
+
+@pytest.fixture
+def cache():
+    return AnswerCache(QueryCountingEmbeddings(), threshold=0.95)
+
+
+def cached_service(cache: AnswerCache) -> AgentService:
+    return AgentService(answer_cache=cache)
+
+
+async def settle(service: AgentService) -> None:
+    """Wait until answers are written to the cache."""
+    await asyncio.gather(*service._cache_writes)
+
+
+def test_repeated_question_hits_without_embedding(cache):
+    async def scenario():
+        await cache.store(SCOPE, "How long is the autolyse rest?", "An hour.")
+        queries = cache.embeddings.queries
+        answer = await cache.lookup(SCOPE, "  how long is the AUTOLYSE rest ")
+        return answer, cache.embeddings.queries - queries
+
+    answer, queries = asyncio.run(scenario())
+
+    assert answer == "An hour."
+    assert queries == 0
+    assert cache.stats.exact_hits == 1
+
+
+def test_similar_questions_hit_and_others_miss(cache):
+    async def scenario():
+        await cache.store(SCOPE, "How long is the autolyse rest?", "An hour.")
+        return (
+            await cache.lookup(SCOPE, "For how long is the autolyse rest?"),
+            await cache.lookup(SCOPE, "How long is the bulk fermentation?"),
+        )
+
+    similar, other = asyncio.run(scenario())
+
+    assert similar == "An hour."
+    assert other is None
+    assert cache.stats.semantic_hits == 1
+    assert cache.stats.hit_rate == 0.5
+
+
+def test_near_miss_questions_miss(cache):
+    class AlikeEmbeddings(QueryCountingEmbeddings):
+        """Embeds every question alike, as models nearly do for near misses."""
+
+        def embed_query(self, text: str) -> List[float]:
+            super().embed_query(text)
+            return [1.0, 0.0]
+
+    cache._embeddings = AlikeEmbeddings()
+
+    async def scenario():
+        await cache.store(SCOPE, "What is the boiling point of water?", "100C.")
+        return (
+            await cache.lookup(SCOPE, "What is the freezing point of water?"),
+            await cache.lookup(SCOPE, "Water: what is its boiling point?"),
+        )
+
+    near_miss, reworded = asyncio.run(scenario())
+
+    assert near_miss is None
+    assert reworded == "100C."
+    # The near miss had no candidate with its terms, so was not embedded
+    assert cache.embeddings.queries == 2
+
+
+def test_cached_answers_do_not_wait_for_a_run_slot(corpus, qa, cache):
+    from botify.services.scheduler import FairScheduler
+
+    service = AgentService(
+        answer_cache=cache, scheduler=FairScheduler(max_concurrent=1)
+    )
+    reader = reader_for(corpus)
+    install_fake_models(reader, qa)
+    add_session(service, "session", reader)
+    question = "What is the autolyse rest?"
+
+    async def scenario():
+        await service.process_message(question, "session")
+        await settle(service)
+        # Another session holds the only slot
+        async with service.scheduler.slot("other"):
+            return await asyncio.wait_for(
+                service.process_message(question, "session"), timeout=1
+            )
+
+    assert asyncio.run(scenario()) == "answer"
+    reader.close()
+    assert cache.stats.exact_hits == 1
+
+
+def test_answers_are_kept_per_scope(cache):
+    async def scenario():
+        await cache.store(SCOPE, "What is a redd?", "A gravel nest.")
+        return await cache.lookup(("reader", "other pages"), "What is a redd?")
+
+    assert asyncio.run(scenario()) is None
+
+
+def test_answers_expire_and_least_recently_used_go_first(cache):
+    cache.max_entries = 2
+
+    async def scenario():
+        await cache.store(SCOPE, "first question", "1")
+        await cache.store(SCOPE, "second question", "2")
+        await cache.lookup(SCOPE, "first question")
+        await cache.store(SCOPE, "third question", "3")
+        return [await cache.lookup(SCOPE, f"{n} question") for n in ("first", "second")]
+
+    assert asyncio.run(scenario()) == ["1", None]
+
+    cache.ttl_seconds = 0
+    time.sleep(0.01)
+    assert cache.evict_expired() == 2
+    assert len(cache) == 0
+
+
+def test_reader_sessions_share_answers_about_the_same_pages(corpus, qa, cache):
+    service = cached_service(cache)
+    readers = [reader_for(corpus), reader_for(corpus)]
+    calls = [install_fake_models(reader, qa) for reader in readers]
+    for n, reader in enumerate(readers):
+        add_session(service, f"session-{n}", reader)
+    question = "What is the autolyse rest?"
+
+    async def scenario():
+        first = await service.process_message(question, "session-0")
+        await settle(service)
+        second = await service.process_message(question, "session-1")
+        fresh = await service.process_message(question, "session-1", use_cache=False)
+        return first, second, fresh
+
+    first, second, fresh = asyncio.run(scenario())
+    for reader in readers:
+        reader.close()
+
+    assert first == second == fresh == "answer"
+    assert calls[0]["agent"] == 1
+    assert calls[1]["agent"] == 1
+    assert cache.stats.bypassed == 1
+
+
+def test_fallback_answers_are_not_cached(corpus, cache):
+    service = cached_service(cache)
+    reader = reader_for(corpus)
+    install_fake_models(reader, UNANSWERABLE)
+    add_session(service, "session", reader)
+
+    async def scenario():
+        answer = await service.process_message(UNANSWERABLE[0]["question"], "session")
+        await settle(service)
+        return answer
+
+    assert asyncio.run(scenario()) == FALLBACK_ANSWER
+    reader.close()
+    assert len(cache) == 0
+
+
+def test_chat_answers_are_never_cached(slow_llm, cache):
+    slow_llm.delay = 0
+    service = cached_service(cache)
+    for n in range(2):
+        add_session(service, f"chat-{n}", ChatAgent(slow_llm))
+
+    async def scenario():
+        # First turns of two chats, which would share an empty history
+        await service.process_message("weather in Paris", "chat-0")
+        await settle(service)
+        await service.process_message("weather in Paris", "chat-1")
+
+    asyncio.run(scenario())
+
+    assert cache.stats.lookups == 0
+    assert len(cache) == 0
+
+
+def test_fresh_command_bypasses_the_cache(monkeypatch):
+    monkeypatch.setattr(bot_handler_module, "settings", Settings(stream_responses=False))
+    handler = BotHandler()
+    handler.agent_service = Mock()
+    handler.agent_service.aget_session = AsyncMock(return_value=None)
+    handler.agent_service.process_message = AsyncMock(return_value="new answer")
+    message = Mock()
+    message.reply_text = AsyncMock()
+    context = Mock(user_data={"session_id": "session"}, args=["What", "is", "it?"])
+
+    update = Mock(message=message, effective_user=Mock(id=42))
+    asyncio.run(handler.fresh(update, context))
+
+    handler.agent_service.process_message.assert_awaited_once_with(
+        "What is it?", "session", use_cache=False, user_id="42"
+    )
+    message.reply_text.assert_awaited_once_with("new answer")
+
+
+def test_answer_cache_benchmark(corpus, qa):
+    """Latency of cached and uncached answers over a workload with repeats."""
+    # Generation time modelled as proportional to its prompt
+    seconds_per_token = 0.0002
+    cache = AnswerCache(HashingEmbeddings())
+    service = cached_service(cache)
+    readers = [reader_for(corpus) for _ in range(3)]
+    for n, reader in enumerate(readers):
+        rephrased = [dict(item, question=f"And {item['question']}") for item in qa]
+        install_fake_models(
+            reader, qa + rephrased, seconds_per_prompt_token=seconds_per_token
+        )
+        add_session(service, f"session-{n}", reader)
+    # Every session asks every question, the last one rephrased
+    workload = [
+        (f"And {item['question']}" if n == 2 else item["question"], f"session-{n}")
+        for n in range(len(readers))
+        for item in qa
+    ]
+
+    async def scenario():
+        latencies = []
+        for question, session_id in workload:
+            hits = cache.stats.hits
+            start = time.perf_counter()
+            await service.process_message(question, session_id)
+            latencies.append((cache.stats.hits > hits, time.perf_counter() - start))
+            await settle(service)
+        return latencies
+
+    latencies = asyncio.run(scenario())
+    for reader in readers:
+        reader.close()
+
+    hit_times = [seconds for hit, seconds in latencies if hit]
+    miss_times = [seconds for hit, seconds in latencies if not hit]
+    hit_ms = sum(hit_times) / len(hit_times) * 1e3
+    miss_ms = sum(miss_times) / len(miss_times) * 1e3
+    print(
+        f"\n{len(workload)} questions from {len(readers)} sessions: "
+        f"{cache.stats.hit_rate:.0%} hit rate "
+        f"({cache.stats.exact_hits} exact, {cache.stats.semantic_hits} semantic), "
+        f"{hit_ms:.2f}ms per hit, {miss_ms:.1f}ms per miss"
+    )
+    assert cache.stats.exact_hits >= len(qa)
+    assert cache.stats.semantic_hits > 0
+    assert hit_ms < miss_ms / 10
@@ -0,0 +1,256 @@
+import asyncio
+import json
+import statistics
+import time
+import httpx
+import pytest
+from botify.agent.agents.chat_agent import ChatAgent
+from botify.app import create_api
+from botify.services.agent_service import AgentService
+from botify.services.scheduler import FairScheduler
+from conftest import SlowFakeChatModel, StreamingFakeChatModel
+from test_agent_concurrency import add_session
+
+
+@pytest.fixture(autouse=True)
+def openai_key(monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+
+
+def api_client(
+    service: AgentService, inflight: int = 64, api_key: str = ""
+) -> httpx.AsyncClient:
+    api = create_api(agent_service=service)
+    api.state.chat_limit.limit = inflight
+    api.state.api_key = api_key
+    return httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=api), base_url="http://api"
+    )
+
+
+def parse_events(body: str) -> list:
+    events = []
+    for block in body.strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in block.splitlines())
+        events.append((lines["event"], json.loads(lines["data"])))
+    return events
+
+
+def test_sessions_are_created_and_resumed():
+    service = AgentService()
+
+    async def scenario():
+        async with api_client(service) as client:
+            created = await client.post("/api/v1/sessions", json={"agent_type": "chat"})
+            session_id = created.json()["session_id"]
+            # Resuming after eviction rebuilds the session from the store
+            service.sessions.pop(session_id)
+            resumed = await client.get(f"/api/v1/sessions/{session_id}")
+            missing = await client.get("/api/v1/sessions/nope")
+            unknown = await client.post("/api/v1/sessions", json={"agent_type": "x"})
+            return created, resumed, missing, unknown
+
+    created, resumed, missing, unknown = asyncio.run(scenario())
+
+    assert created.status_code == 201
+    assert created.json()["agent_type"] == "chat"
+    assert resumed.status_code == 200
+    assert resumed.json()["session_id"] == created.json()["session_id"]
+    assert missing.status_code == 404
+    assert unknown.status_code == 422
+
+
+def test_chat_replies_with_the_agent_answer(slow_llm):
+    slow_llm.delay = 0
+    service = AgentService()
+    add_session(service, "session", ChatAgent(slow_llm))
+
+    async def scenario():
+        async with api_client(service) as client:
+            return (
+                await client.post(
+                    "/api/v1/chat", json={"session_id": "session", "message": "hi"}
+                ),
+                await client.post(
+                    "/api/v1/chat", json={"session_id": "session", "message": ""}
+                ),
+                await client.post(
+                    "/api/v1/chat", json={"session_id": "other", "message": "hi"}
+                ),
+            )
+
+    answered, empty, missing = asyncio.run(scenario())
+
+    assert answered.status_code == 200
+    assert answered.json() == {"session_id": "session", "answer": "fake response"}
+    assert empty.status_code == 422
+    assert missing.status_code == 404
+
+
+def test_chat_streams_server_sent_events():
+    service = AgentService()
+    llm = StreamingFakeChatModel(delay=0)
+    add_session(service, "session", ChatAgent(llm))
+
+    async def scenario():
+        async with api_client(service) as client:
+            return await client.post(
+                "/api/v1/chat",
+                json={"session_id": "session", "message": "hi", "stream": True},
+            )
+
+    response = asyncio.run(scenario())
+
+    assert response.headers["content-type"].startswith("text/event-stream")
+    events = parse_events(response.text)
+    deltas = [data["text"] for name, data in events if name == "delta"]
+    assert len(deltas) > 1
+    assert events[-1] == ("done", {"session_id": "session", "answer": "".join(deltas)})
+
+
+def test_restarted_answers_stream_a_reset(slow_llm):
+    service = AgentService()
+    add_session(service, "session", ChatAgent(slow_llm))
+
+    async def restarting_answer(*args, **kwargs):
+        # A reader's answer run after its rewrite run
+        for text in ("Paris is", "Paris is the", "Berlin", "Berlin is it"):
+            yield text
+
+    service.stream_message = restarting_answer
+
+    async def scenario():
+        async with api_client(service) as client:
+            return await client.post(
+                "/api/v1/chat",
+                json={"session_id": "session", "message": "hi", "stream": True},
+            )
+
+    events = parse_events(asyncio.run(scenario()).text)
+
+    assert [name for name, _ in events] == ["delta", "delta", "reset", "delta", "done"]
+    assert events[2][1] == {"text": "Berlin"}
+    assert events[-1][1]["answer"] == "Berlin is it"
+
+
+def test_chat_api_requires_the_api_key_when_set(slow_llm):
+    slow_llm.delay = 0
+    service = AgentService()
+    add_session(service, "session", ChatAgent(slow_llm))
+
+    async def scenario():
+        async with api_client(service, api_key="secret") as client:
+            body = {"session_id": "session", "message": "hi"}
+            return (
+                await client.post("/api/v1/chat", json=body),
+                await client.get(
+                    "/api/v1/sessions/session",
+                    headers={"Authorization": "Bearer wrong"},
+                ),
+                await client.post(
+                    "/api/v1/chat",
+                    json=body,
+                    headers={"Authorization": "Bearer secret"},
+                ),
+            )
+
+    missing, wrong, authorized = asyncio.run(scenario())
+
+    assert missing.status_code == 401
+    assert missing.headers["WWW-Authenticate"] == "Bearer"
+    assert wrong.status_code == 401
+    assert authorized.status_code == 200
+
+
+def test_requests_past_the_limits_get_429(slow_llm):
+    service = AgentService()
+    for n in range(3):
+        add_session(service, f"session-{n}", ChatAgent(slow_llm))
+
+    async def scenario():
+        async with api_client(service, inflight=2) as client:
+
+            def send(session_id):
+                return client.post(
+                    "/api/v1/chat", json={"session_id": session_id, "message": "hi"}
+                )
+
+            first = asyncio.create_task(send("session-0"))
+            await asyncio.sleep(0.05)
+            # The session is busy, then the API is full
+            busy = await send("session-0")
+            second = asyncio.create_task(send("session-1"))
+            await asyncio.sleep(0.05)
+            full = await send("session-2")
+            return [await first, busy, await second, full]
+
+    responses = asyncio.run(scenario())
+
+    assert [response.status_code for response in responses] == [200, 429, 200, 429]
+    assert responses[1].headers["Retry-After"] == "1"
+
+
+def test_users_sending_too_fast_get_429(slow_llm):
+    slow_llm.delay = 0
+    service = AgentService(scheduler=FairScheduler(user_rate=0.5, user_burst=1))
+    add_session(service, "session", ChatAgent(slow_llm))
+
+    async def scenario():
+        async with api_client(service) as client:
+            body = {"session_id": "session", "message": "hi", "user_id": "alice"}
+            return [await client.post("/api/v1/chat", json=body) for _ in range(2)]
+
+    answered, limited = asyncio.run(scenario())
+
+    assert answered.status_code == 200
+    assert limited.status_code == 429
+    assert limited.headers["Retry-After"] == "2"
+
+
+def test_chat_api_throughput_benchmark():
+    """Latency percentiles and throughput of the chat API under load.
+
+    Every client chats in its own session, one message at a time, and
+    retries shortly after a 429; latencies include the retries.
+    """
+    clients, messages, inflight = 48, 3, 32
+    llm = SlowFakeChatModel(delay=0.05)
+    service = AgentService(max_concurrent_runs=inflight)
+    for n in range(clients):
+        add_session(service, f"session-{n}", ChatAgent(llm))
+    rejected = []
+
+    async def scenario():
+        latencies = []
+        async with api_client(service, inflight=inflight) as client:
+
+            async def chat(session_id):
+                for _ in range(messages):
+                    start = time.perf_counter()
+                    while True:
+                        response = await client.post(
+                            "/api/v1/chat",
+                            json={"session_id": session_id, "message": "hi"},
+                        )
+                        if response.status_code != 429:
+                            break
+                        rejected.append(session_id)
+                        await asyncio.sleep(0.01)
+                    assert response.status_code == 200
+                    latencies.append(time.perf_counter() - start)
+
+            start = time.perf_counter()
+            await asyncio.gather(*(chat(f"session-{n}") for n in range(clients)))
+            return time.perf_counter() - start, latencies
+
+    elapsed, latencies = asyncio.run(scenario())
+
+    quantiles = statistics.quantiles(latencies, n=100)
+    print(
+        f"\n{clients} clients x {messages} messages, {inflight} in flight, "
+        f"{llm.delay * 1e3:.0f}ms LLM: p50 {quantiles[49] * 1e3:.0f}ms, "
+        f"p99 {quantiles[98] * 1e3:.0f}ms, {len(latencies) / elapsed:.0f} requests/s, "
+        f"{len(rejected)} retried after 429"
+    )
+    assert len(latencies) == clients * messages
+    assert rejected
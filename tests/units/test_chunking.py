@@ -0,0 +1,107 @@
+import pytest
+from langchain_core.documents import Document
+from langchain_core.vectorstores import InMemoryVectorStore
+from botify.rag.chunking import (
+    ChunkDeduplicator,
+    Chunker,
+    ChunkingConfig,
+    token_length,
+)
+from conftest import HashingEmbeddings
+
+
+# The splitter ReaderAgent used before chunking became configurable
+LEGACY = ChunkingConfig("token", chunk_size=100, chunk_overlap=50, dedupe_threshold=2)
+
+
+@pytest.mark.parametrize("strategy", ["token", "sentence", "html"])
+def test_chunks_respect_size(corpus, strategy):
+    config = ChunkingConfig(strategy, chunk_size=120, chunk_overlap=20)
+
+    chunks = Chunker(config).split_documents(corpus)
+
+    assert chunks
+    assert all(token_length(chunk.page_content) <= 120 for chunk in chunks)
+    assert {chunk.metadata["source"] for chunk in chunks} == {
+        doc.metadata["source"] for doc in corpus
+    }
+
+
+def test_html_strategy_follows_headings():
+    html = (
+        "<html><body><nav>Home Blog</nav><h1>Intro</h1><p>First paragraph.</p>"
+        "<h2>Details</h2><p>Second paragraph.</p><footer>Copyright</footer>"
+        "</body></html>"
+    )
+    chunks = Chunker(
+        ChunkingConfig("html", chunk_size=200, chunk_overlap=0)
+    ).split_documents([Document(page_content=html)])
+
+    assert [chunk.metadata["section"] for chunk in chunks] == ["Intro", "Details"]
+    assert "Home" not in " ".join(chunk.page_content for chunk in chunks)
+    assert "Copyright" not in " ".join(chunk.page_content for chunk in chunks)
+
+
+def test_boilerplate_is_deduplicated(corpus):
+    chunks = Chunker(
+        ChunkingConfig("html", chunk_size=200, chunk_overlap=0)
+    ).split_documents(corpus)
+    menus = [chunk for chunk in chunks if chunk.page_content.startswith("Home Docs")]
+
+    assert len(menus) == 1
+
+
+def test_near_duplicates_are_dropped():
+    deduplicator = ChunkDeduplicator(threshold=0.8)
+    text = "the quick brown fox jumps over the lazy dog near the quiet river bank today"
+
+    assert deduplicator.is_new(text)
+    assert not deduplicator.is_new(text.replace("today", "tonight"))
+    assert deduplicator.is_new("a completely different sentence about baking bread")
+    assert deduplicator.dropped == 1
+
+
+def test_invalid_config():
+    with pytest.raises(ValueError):
+        ChunkingConfig("paragraph")
+    with pytest.raises(ValueError):
+        ChunkingConfig("token", chunk_size=100, chunk_overlap=100)
+
+
+def evaluate(config: ChunkingConfig, corpus, qa, k: int = 2) -> dict:
+    embeddings = HashingEmbeddings()
+    store = InMemoryVectorStore(embeddings)
+    chunks = Chunker(config).split_documents(corpus)
+    store.add_documents(chunks)
+
+    hits = 0
+    for item in qa:
+        retrieved = store.similarity_search(item["question"], k=k)
+        if any(
+            item["answer"] in " ".join(doc.page_content.split()) for doc in retrieved
+        ):
+            hits += 1
+    return {
+        "chunks": len(chunks),
+        "embedded": embeddings.embedded_texts,
+        "hit_rate": hits / len(qa),
+    }
+
+
+def test_chunking_benchmark(corpus, qa):
+    """Chunk count, embedding calls and retrieval hit rate per strategy."""
+    configs = {"legacy": LEGACY} | {
+        strategy: ChunkingConfig(strategy) for strategy in ("token", "sentence", "html")
+    }
+    results = {name: evaluate(config, corpus, qa) for name, config in configs.items()}
+
+    print("\nstrategy   chunks  embedded  hit@2")
+    for name, result in results.items():
+        print(
+            f"{name:<10} {result['chunks']:>6}  {result['embedded']:>8}"
+            f"  {result['hit_rate']:>5.0%}"
+        )
+
+    for name in ("token", "sentence", "html"):
+        assert results[name]["embedded"] <= results["legacy"]["embedded"] / 2
+        assert results[name]["hit_rate"] >= results["legacy"]["hit_rate"]
@@ -0,0 +1,243 @@
+import os
+import time
+import pytest
+from langchain_core.documents import Document
+from langchain_core.vectorstores import InMemoryVectorStore
+from botify.rag.chunking import Chunker, ChunkingConfig
+from botify.rag.document_index import DocumentIndex
+
+
+def in_memory_factory(collection_name, embeddings, persist_dir):
+    return InMemoryVectorStore(embeddings)
+
+
+@pytest.fixture
+def splitter():
+    return Chunker(ChunkingConfig(chunk_size=10, chunk_overlap=0))
+
+
+@pytest.fixture
+def index(embeddings):
+    return DocumentIndex(embeddings, in_memory_factory, max_entries=2, ttl_seconds=60)
+
+
+def page(url: str, text: str) -> list[Document]:
+    return [Document(page_content=text, metadata={"source": url})]
+
+
+def test_same_source_is_embedded_once(index, embeddings, splitter):
+    documents = page(
+        "https://a.com", "the quick brown fox jumps over the lazy dog " * 5
+    )
+
+    first = index.acquire(documents, splitter)
+    embedded = embeddings.embedded_texts
+    second = index.acquire(page("https://a.com", documents[0].page_content), splitter)
+
+    assert second is first
+    assert first.refcount == 2
+    assert embeddings.embedded_texts == embedded
+    assert len(index) == 1
+
+
+def test_chunking_settings_get_their_own_entry(index, splitter):
+    documents = page("https://a.com", "the quick brown fox jumps over the lazy dog")
+
+    first = index.acquire(documents, splitter)
+    second = index.acquire(documents, Chunker(ChunkingConfig("sentence")))
+
+    assert first is not second
+
+
+def test_changed_content_gets_a_new_entry(index, splitter):
+    first = index.acquire(page("https://a.com", "version one"), splitter)
+    second = index.acquire(page("https://a.com", "version two"), splitter)
+
+    assert first is not second
+    assert first.key[0] == second.key[0]
+    assert first.key[1] != second.key[1]
+
+
+def test_referenced_entries_are_never_evicted(index, splitter):
+    entries = [
+        index.acquire(page(f"https://{i}.com", f"page {i}"), splitter) for i in range(3)
+    ]
+
+    # Over capacity, but every entry is still referenced
+    assert len(index) == 3
+
+    index.release(entries[1])
+    assert entries[1].key not in index
+    assert not os.path.exists(entries[1].persist_dir)
+    assert entries[0].key in index and entries[2].key in index
+
+
+def test_lru_eviction_keeps_recently_used(index, splitter):
+    a = index.acquire(page("https://a.com", "a"), splitter)
+    b = index.acquire(page("https://b.com", "b"), splitter)
+    index.release(a)
+    index.release(b)
+    # Reusing "a" makes "b" the least recently used entry
+    index.release(index.acquire(page("https://a.com", "a"), splitter))
+
+    c = index.acquire(page("https://c.com", "c"), splitter)
+
+    assert a.key in index
+    assert b.key not in index
+    assert c.key in index
+
+
+def test_ttl_eviction(embeddings, splitter):
+    index = DocumentIndex(embeddings, in_memory_factory, ttl_seconds=0)
+    held = index.acquire(page("https://a.com", "a"), splitter)
+    idle = index.acquire(page("https://b.com", "b"), splitter)
+    index.release(idle)
+
+    assert index.evict_expired() == 1
+    assert held.key in index
+    assert idle.key not in index
+
+
+def changelog(url: str, releases: int, changed=()) -> list[Document]:
+    """A page of release notes, one paragraph per release."""
+    paragraphs = [
+        f"Release {n} {'patched' if n in changed else 'shipped'} the parser "
+        f"fixes for bucket {n} and the exporter tweaks for channel {n}."
+        for n in range(releases)
+    ]
+    return page(url, "\n\n".join(paragraphs))
+
+
+@pytest.fixture
+def sentences():
+    return Chunker(ChunkingConfig("sentence", chunk_size=40, chunk_overlap=0))
+
+
+def test_reingesting_a_changed_page_embeds_only_new_chunks(
+    index, embeddings, sentences
+):
+    first = index.acquire(changelog("https://a.com", 20), sentences)
+    embedded = embeddings.embedded_texts
+
+    second = index.acquire(
+        changelog("https://a.com", 20, changed={3, 7}), sentences, previous=first
+    )
+
+    assert second is first
+    assert second.refcount == 1
+    assert embeddings.embedded_texts - embedded == 2
+    assert second.chunk_count == 20
+    assert len(index) == 1
+    hits = second.vectorstore.similarity_search("release 3 parser bucket", k=20)
+    texts = [hit.page_content for hit in hits]
+    assert any("Release 3 patched" in text for text in texts)
+    assert not any("Release 3 shipped" in text for text in texts)
+
+
+def test_shared_versions_are_not_updated_in_place(index, embeddings, sentences):
+    old = index.acquire(changelog("https://a.com", 20), sentences)
+    index.acquire(changelog("https://a.com", 20), sentences)
+
+    new = index.acquire(
+        changelog("https://a.com", 20, changed={3}), sentences, previous=old
+    )
+
+    # Another session still reads the old version
+    assert new is not old
+    assert old.refcount == 1
+    assert old.key in index and new.key in index
+
+
+def test_idle_versions_are_updated_in_place(index, embeddings, sentences):
+    old = index.acquire(changelog("https://a.com", 20), sentences)
+    index.release(old)
+    embedded = embeddings.embedded_texts
+
+    new = index.acquire(changelog("https://a.com", 20, changed={3}), sentences)
+
+    assert new is old
+    assert new.refcount == 1
+    assert embeddings.embedded_texts - embedded == 1
+
+
+def test_incremental_reingestion_benchmark(embeddings, sentences):
+    """Re-reading a 400-release changelog after 5% of it changed."""
+    index = DocumentIndex(embeddings, in_memory_factory, max_entries=10)
+    url = "https://changelog.example.com"
+    releases, changed = 400, set(range(0, 400, 20))
+
+    held = index.acquire(changelog(url, releases), sentences)
+    embedded = embeddings.embedded_texts
+    start = time.perf_counter()
+    index.acquire(changelog(url, releases, changed), sentences, previous=held)
+    incremental_seconds = time.perf_counter() - start
+    incremental = embeddings.embedded_texts - embedded
+
+    # What every re-read did before: a new store built from scratch
+    index = DocumentIndex(embeddings, in_memory_factory, max_entries=10)
+    other = index.acquire(changelog(url, releases), sentences)
+    embedded = embeddings.embedded_texts
+    start = time.perf_counter()
+    rebuilt = index.acquire(changelog(url, releases, changed), sentences)
+    rebuild_seconds = time.perf_counter() - start
+    rebuild = embeddings.embedded_texts - embedded
+
+    print(
+        f"\nre-ingesting {releases} chunks, {len(changed)} changed: rebuild embeds "
+        f"{rebuild} in {rebuild_seconds * 1e3:.0f}ms, incremental embeds "
+        f"{incremental} in {incremental_seconds * 1e3:.0f}ms"
+    )
+    assert rebuilt is not other
+    assert rebuild == releases
+    assert incremental == len(changed)
+
+
+def test_chunks_are_embedded_in_batches(embeddings, sentences):
+    index = DocumentIndex(embeddings, in_memory_factory, batch_size=8)
+
+    entry = index.acquire(changelog("https://a.com", 20), sentences)
+
+    assert entry.chunk_count == 20
+    assert embeddings.calls == 3
+    assert embeddings.embedded_texts == 20
+
+
+def test_failed_update_is_rolled_back(embeddings, sentences, monkeypatch):
+    index = DocumentIndex(embeddings, in_memory_factory, batch_size=2)
+    old = index.acquire(changelog("https://a.com", 20), sentences)
+    ids, key = set(old.chunk_ids), old.key
+
+    embed = embeddings.embed_documents
+    calls = []
+
+    def flaky(texts):
+        calls.append(texts)
+        if len(calls) == 2:
+            raise RuntimeError("provider down")
+        return embed(texts)
+
+    monkeypatch.setattr(embeddings, "embed_documents", flaky)
+    with pytest.raises(RuntimeError):
+        index.acquire(
+            changelog("https://a.com", 20, changed={1, 2, 3, 4}), sentences, previous=old
+        )
+
+    assert old.chunk_ids == ids
+    assert old.key == key and key in index
+    assert len(old.vectorstore.store) == 20
+
+
+def test_lexical_index_follows_incremental_updates(index, sentences):
+    first = index.acquire(changelog("https://a.com", 20), sentences)
+
+    second = index.acquire(
+        changelog("https://a.com", 20, changed={3}), sentences, previous=first
+    )
+
+    assert len(second.lexical) == second.chunk_count == 20
+    matches = [doc.page_content for doc, _ in second.lexical.search("patched", k=5)]
+    assert len(matches) == 1 and matches[0].startswith("Release 3 patched")
+    assert not any(
+        "Release 3 shipped" in doc.page_content
+        for doc, _ in second.lexical.search("release 3 bucket", k=20)
+    )
@@ -0,0 +1,102 @@
+import pytest
+from botify.rag.embedding_cache import CachedEmbeddings, EmbeddingCache, text_hash
+from conftest import HashingEmbeddings
+
+
+@pytest.fixture
+def cache_path(tmp_path):
+    return str(tmp_path / "embeddings.sqlite3")
+
+
+def test_only_misses_reach_the_provider(embeddings, cache_path):
+    cached = CachedEmbeddings(embeddings, EmbeddingCache(cache_path), model="fake")
+
+    cached.embed_documents(["nav bar", "intro", "footer"])
+    cached.embed_documents(["nav bar", "new paragraph", "footer"])
+
+    assert embeddings.calls == 2
+    assert embeddings.embedded_texts == 4
+    assert cached.stats.memory_hits == 2
+    assert cached.stats.misses == 4
+
+
+def test_duplicate_texts_in_a_batch_are_embedded_once(embeddings):
+    cached = CachedEmbeddings(embeddings, EmbeddingCache(None), model="fake")
+
+    vectors = cached.embed_documents(["same", "same", "other", "same"])
+
+    assert embeddings.embedded_texts == 2
+    assert vectors[0] == vectors[1] == vectors[3]
+
+
+def test_cached_vectors_match_provider_vectors(embeddings, cache_path):
+    cached = CachedEmbeddings(embeddings, EmbeddingCache(cache_path), model="fake")
+    texts = ["alpha beta", "gamma"]
+
+    first = cached.embed_documents(texts)
+    second = cached.embed_documents(texts)
+
+    expected = embeddings.embed_documents(texts)
+    for got, want in zip(second, expected):
+        assert got == pytest.approx(want, abs=1e-6)
+    assert first == second
+
+
+def test_disk_tier_survives_restart(embeddings, cache_path):
+    CachedEmbeddings(
+        embeddings, EmbeddingCache(cache_path), model="fake"
+    ).embed_documents(["persisted text"])
+
+    restarted = CachedEmbeddings(embeddings, EmbeddingCache(cache_path), model="fake")
+    restarted.embed_documents(["persisted text"])
+
+    assert embeddings.calls == 1
+    assert restarted.stats.disk_hits == 1
+    assert restarted.stats.hit_rate == 1.0
+
+
+def test_cache_is_scoped_by_model(embeddings, cache_path):
+    cache = EmbeddingCache(cache_path)
+    CachedEmbeddings(embeddings, cache, model="small").embed_documents(["text"])
+    CachedEmbeddings(embeddings, cache, model="large").embed_documents(["text"])
+
+    assert embeddings.calls == 2
+
+
+def test_memory_tier_is_bounded(embeddings):
+    cache = EmbeddingCache(None, max_memory_entries=2)
+    cached = CachedEmbeddings(embeddings, cache, model="fake")
+
+    cached.embed_documents(["a", "b", "c"])
+    cached.embed_documents(["a"])
+
+    assert embeddings.calls == 2
+    assert cached.stats.misses == 4
+
+
+class QueryEmbeddings(HashingEmbeddings):
+    """Embeds queries differently from documents, as some providers do."""
+
+    query_calls = 0
+
+    def embed_query(self, text):
+        self.query_calls += 1
+        return self._embed(f"search query: {text}")
+
+
+def test_queries_are_embedded_as_queries_and_kept_in_memory(cache_path):
+    embeddings = QueryEmbeddings()
+    cache = EmbeddingCache(cache_path)
+    cached = CachedEmbeddings(embeddings, cache, model="fake")
+    question = "Where does the river deposit its sediment?"
+
+    first = cached.embed_query(question)
+    second = cached.embed_query(question)
+
+    assert first == second == embeddings.embed_query(question)
+    assert first != embeddings.embed_documents([question])[0]
+    # One call from the wrapper, one from the check above
+    assert embeddings.query_calls == 2
+    assert cached.stats.memory_hits == 1
+    # The question never reached the document cache
+    assert cache.get_many("fake", [text_hash(question)]) == {}
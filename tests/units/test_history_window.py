@@ -0,0 +1,151 @@
+import time
+from typing import Any, List, Optional
+from langchain_core.chat_history import InMemoryChatMessageHistory
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, ToolMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_core.runnables import RunnableLambda
+import botify.agent.history as history_module
+from botify.agent.agents.chat_agent import ChatAgent
+from botify.agent.history import HistoryWindow, message_tokens
+from conftest import SlowFakeChatModel
+
+
+WORDS = "river delta basin current meander estuary tributary floodplain".split()
+
+
+def sentence(turn: int, words: int) -> str:
+    return " ".join(WORDS[(turn + i) % len(WORDS)] for i in range(words))
+
+
+class RecordingChatModel(SlowFakeChatModel):
+    """Fake chat model remembering the prompt token count of every call."""
+
+    delay: float = 0.0
+    prompt_tokens: List[int] = []
+
+    def _generate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Any = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        self.prompt_tokens.append(sum(message_tokens(m) for m in messages))
+        reply = AIMessage(content=sentence(len(self.prompt_tokens), 60))
+        return ChatResult(generations=[ChatGeneration(message=reply)])
+
+
+def add_turns(history: InMemoryChatMessageHistory, turns: int) -> None:
+    for turn in range(turns):
+        history.add_messages(
+            [
+                HumanMessage(content=sentence(turn, 30)),
+                AIMessage(
+                    content="",
+                    tool_calls=[{"name": "search", "args": {"q": "x"}, "id": str(turn)}],
+                ),
+                ToolMessage(content=sentence(turn, 40), tool_call_id=str(turn)),
+                AIMessage(content=sentence(turn, 30)),
+            ]
+        )
+
+
+def test_window_stays_under_budget_and_starts_at_a_turn():
+    history = InMemoryChatMessageHistory()
+    window = HistoryWindow(history, max_tokens=600)
+    incoming = [HumanMessage(content="what about the delta?")]
+
+    for _ in range(30):
+        add_turns(history, 1)
+        prompt = window.prompt(incoming)
+        assert sum(message_tokens(m) for m in prompt) <= 600
+        assert isinstance(prompt[0], HumanMessage)
+
+    assert window.start > 0
+
+
+def test_window_start_only_moves_on_overflow():
+    history = InMemoryChatMessageHistory()
+    window = HistoryWindow(history, max_tokens=2000)
+    incoming = [HumanMessage(content="next")]
+
+    starts = []
+    for _ in range(40):
+        add_turns(history, 1)
+        window.prompt(incoming)
+        starts.append(window.start)
+
+    # The window jumps forward a few turns at a time, keeping the prompt
+    # prefix unchanged in between
+    assert len(set(starts)) < len(starts) / 3
+
+
+def test_rolling_summary():
+    calls = []
+
+    def summarize(inputs: dict) -> str:
+        calls.append(inputs)
+        return f"summary {len(calls)}"
+
+    history = InMemoryChatMessageHistory()
+    window = HistoryWindow(
+        history, max_tokens=600, summarizer=RunnableLambda(summarize)
+    )
+    for _ in range(20):
+        add_turns(history, 1)
+        prompt = window.prompt([HumanMessage(content="next")])
+
+    assert calls
+    assert len(calls) < 20
+    assert calls[-1]["summary"] == f"summary {len(calls) - 1}"
+    assert prompt[0].content.endswith(f"summary {len(calls)}")
+    assert isinstance(prompt[1], HumanMessage)
+
+
+def test_token_counts_are_cached(monkeypatch):
+    counted = []
+    token_length = history_module.token_length
+    monkeypatch.setattr(
+        history_module,
+        "token_length",
+        lambda text: counted.append(text) or token_length(text),
+    )
+    history = InMemoryChatMessageHistory()
+    window = HistoryWindow(history, max_tokens=1000)
+
+    for _ in range(50):
+        add_turns(history, 1)
+        window.prompt([])
+
+    # Each stored message is counted once (tool calls count their arguments too)
+    assert len(counted) == 50 * 5
+
+
+def test_chat_agent_prompt_tokens_stay_flat():
+    """Prompt tokens per turn over a 500-turn synthetic conversation."""
+    config = {"configurable": {"session_id": "bench"}}
+    turns = 500
+
+    windowed = RecordingChatModel(prompt_tokens=[])
+    agent = ChatAgent(windowed, max_history_tokens=3000)
+    start = time.perf_counter()
+    for turn in range(turns):
+        agent.run({"messages": [HumanMessage(content=sentence(turn, 30))]}, config)
+    elapsed = time.perf_counter() - start
+
+    unbounded = RecordingChatModel(prompt_tokens=[])
+    legacy = ChatAgent(unbounded, max_history_tokens=10**9)
+    for turn in range(turns):
+        legacy.run({"messages": [HumanMessage(content=sentence(turn, 30))]}, config)
+
+    print("\nturn   unbounded  windowed")
+    for turn in (1, 10, 50, 100, 250, 500):
+        print(
+            f"{turn:>4}  {unbounded.prompt_tokens[turn - 1]:>10}"
+            f"  {windowed.prompt_tokens[turn - 1]:>8}"
+        )
+    print(f"{elapsed / turns * 1000:.2f}ms per windowed turn, including the graph")
+
+    assert max(windowed.prompt_tokens) <= 3000
+    assert max(windowed.prompt_tokens[250:]) <= max(windowed.prompt_tokens[:100])
+    assert unbounded.prompt_tokens[-1] > 10 * windowed.prompt_tokens[-1]
@@ -0,0 +1,217 @@
+import asyncio
+import time
+from unittest.mock import AsyncMock, Mock
+import pytest
+import botify.rag.document_index as document_index_module
+from botify.agent.agents.chat_agent import ChatAgent
+from botify.handlers.bot_handler import BotHandler
+from botify.services.agent_service import AgentService
+from botify.services.ingestion import IngestionJob, IngestionQueue
+from botify.services.session_store import InMemorySessionStore
+from test_agent_concurrency import add_session
+
+
+@pytest.fixture(autouse=True)
+def openai_key(monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+
+
+class StubMessage:
+    """An incoming message recording the replies and edits made to it."""
+
+    def __init__(self, text: str):
+        self.text = text
+        self.replies = []
+        self.edits = []
+        self.placeholder = Mock()
+        self.placeholder.edit_text = AsyncMock(side_effect=self.edits.append)
+        self.reply_text = AsyncMock(side_effect=self._reply)
+
+    async def _reply(self, text):
+        self.replies.append(text)
+        return self.placeholder
+
+
+def test_queue_reports_progress_until_done():
+    reports = []
+
+    async def ingest(job):
+        job.progress.pages = 3
+        for _ in range(3):
+            await asyncio.sleep(0.03)
+            job.progress.fetched += 1
+
+    async def report(job):
+        reports.append((job.status, job.progress.fetched))
+
+    async def scenario():
+        queue = IngestionQueue(ingest, workers=1, progress_interval=0.02)
+        job = await queue.submit(IngestionJob("s", ["u"]), report)
+        assert job.status == "queued"
+        await queue.join()
+        await queue.stop()
+        return job
+
+    job = asyncio.run(scenario())
+
+    assert job.status == "done"
+    assert reports[-1] == ("done", 3)
+    assert len(reports) >= 3
+    fetched = [count for _, count in reports]
+    assert fetched == sorted(fetched)
+
+
+def test_failed_jobs_are_reported():
+    reports = []
+
+    async def ingest(job):
+        raise ValueError("unreadable")
+
+    async def report(job):
+        reports.append(job.status)
+
+    async def scenario():
+        queue = IngestionQueue(ingest, workers=1, progress_interval=0.02)
+        job = await queue.submit(IngestionJob("s", ["u"]), report)
+        await queue.join()
+        await queue.stop()
+        return job
+
+    job = asyncio.run(scenario())
+
+    assert job.status == "failed"
+    assert job.error == "unreadable"
+    assert reports == ["failed"]
+
+
+@pytest.fixture
+def handler(monkeypatch, document_index, slow_llm):
+    monkeypatch.setattr(document_index_module, "_document_index", document_index)
+    handler = BotHandler()
+    handler.agent_service = AgentService(store=InMemorySessionStore())
+    handler.agent_service.ingestion.progress_interval = 0.05
+    add_session(handler.agent_service, "chat", ChatAgent(slow_llm))
+    return handler
+
+
+def context(**user_data):
+    return Mock(user_data=user_data)
+
+
+def test_reader_is_ingested_in_the_background(handler, topics):
+    urls = [f"{topics}/{n}" for n in range(40)]
+    message = StubMessage(" ".join(urls))
+    reader = context(waiting_for_url=True)
+    question = StubMessage("hello?")
+
+    async def scenario():
+        await handler.echo(Mock(message=message), reader)
+        session_id = reader.user_data["session_id"]
+        session = handler.agent_service.sessions.get(session_id)
+        status = session.status
+        await handler.echo(Mock(message=question), reader)
+        await handler.agent_service.ingestion.join()
+        await handler.agent_service.ingestion.stop()
+        return session, status
+
+    session, status_after_ack = asyncio.run(scenario())
+
+    assert status_after_ack == "ingesting"
+    assert question.replies[0].startswith("Still reading")
+    assert session.status == "ready"
+    assert len(session.agent.sources) == 40
+    assert session.metadata["urls"] == session.agent.sources
+    assert message.replies == ["Reading 40 page(s)…"]
+    assert any(edit.startswith("Fetched") for edit in message.edits)
+    assert message.edits[-1].startswith("Reader ready: read 40 page(s)")
+
+
+def test_reader_that_read_nothing_is_failed(handler, topics):
+    message = StubMessage(f"{topics}/../missing")
+    reader = context(waiting_for_url=True)
+    question = StubMessage("hello?")
+
+    async def scenario():
+        await handler.echo(Mock(message=message), reader)
+        await handler.agent_service.ingestion.join()
+        await handler.echo(Mock(message=question), reader)
+        await handler.agent_service.ingestion.stop()
+        return handler.agent_service.sessions.get(reader.user_data["session_id"])
+
+    session = asyncio.run(scenario())
+
+    assert session.status == "failed"
+    assert message.edits[-1] == "Could not read the page(s). Please send other URLs."
+    assert question.replies == [
+        "I could not read any of your pages. Please send other URLs."
+    ]
+
+
+def test_session_ingests_until_its_last_job_finishes(handler, topics):
+    service = handler.agent_service
+    statuses = []
+
+    async def report(job):
+        if job.status in ("done", "failed"):
+            statuses.append(service.sessions.get(job.session_id).status)
+
+    async def scenario():
+        service.ingestion.workers = 2
+        first = await service.create_reader_session([f"{topics}/1"], report)
+        await service.ingest_reader_urls(
+            first.session_id, [f"{topics}/{n}" for n in range(2, 30)], report
+        )
+        await service.ingestion.join()
+        await service.ingestion.stop()
+
+    asyncio.run(scenario())
+
+    assert statuses == ["ingesting", "ready"]
+
+
+def test_ingestion_does_not_block_other_users(handler, topics, slow_llm):
+    """Time to acknowledge a 40-page reader, and another user's reply meanwhile."""
+    urls = [f"{topics}/{n}" for n in range(40)]
+    service = handler.agent_service
+
+    async def chat(sent: float) -> float:
+        # Sent 10ms after the URLs; the reply time counts from then
+        await asyncio.sleep(0.01)
+        await service.process_message("hi", "chat")
+        return time.perf_counter() - sent - 0.01
+
+    async def inline():
+        # What _handle_url_input did before: read the pages inside the update
+        async def read():
+            start = time.perf_counter()
+            service.create_reader_agent(urls)
+            return time.perf_counter() - start
+
+        return await asyncio.gather(read(), chat(time.perf_counter()))
+
+    async def queued():
+        message = StubMessage(" ".join(urls))
+        reader = context(waiting_for_url=True)
+
+        async def read():
+            start = time.perf_counter()
+            await handler.echo(Mock(message=message), reader)
+            return time.perf_counter() - start
+
+        ack, reply = await asyncio.gather(read(), chat(time.perf_counter()))
+        await service.ingestion.join()
+        await service.ingestion.stop()
+        return ack, reply
+
+    inline_ack, inline_reply = asyncio.run(inline())
+    queued_ack, queued_reply = asyncio.run(queued())
+
+    print(
+        f"\n40-page reader: acknowledged after {inline_ack * 1e3:.0f}ms inline, "
+        f"{queued_ack * 1e3:.0f}ms queued; another user's reply took "
+        f"{inline_reply * 1e3:.0f}ms inline, {queued_reply * 1e3:.0f}ms queued "
+        f"(LLM delay {slow_llm.delay * 1e3:.0f}ms)"
+    )
+    assert queued_ack < inline_ack / 5
+    assert queued_reply < inline_reply
+    assert inline_reply > inline_ack
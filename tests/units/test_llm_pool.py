@@ -0,0 +1,71 @@
+import time
+import pytest
+from langchain_openai import ChatOpenAI
+from botify.agent.agent_factory import AgentFactory
+from botify.agent.agent_tools import get_tools
+from botify.agent.agents.chat_agent import ChatAgent
+from botify.agent.llm_pool import (
+    get_chat_model,
+    get_embeddings,
+    get_http_async_client,
+    get_http_client,
+)
+
+
+@pytest.fixture(autouse=True)
+def openai_key(monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+
+
+def test_models_are_shared_per_configuration():
+    assert get_chat_model("gpt-4") is get_chat_model("gpt-4")
+    assert get_chat_model("gpt-4") is not get_chat_model("gpt-4", temperature=0)
+
+
+def test_clients_share_one_connection_pool():
+    chat = get_chat_model("gpt-4")
+    other = get_chat_model("gpt-3.5-turbo", temperature=0, streaming=True)
+    embeddings = get_embeddings()
+
+    for client in (chat, other):
+        assert client.root_client._client is get_http_client()
+        assert client.root_async_client._client is get_http_async_client()
+    assert embeddings.client._client._client is get_http_client()
+
+
+def test_factory_injects_llm(slow_llm):
+    agent = AgentFactory.create("chat", llm=slow_llm)
+
+    assert isinstance(agent, ChatAgent)
+    assert agent.llm is slow_llm
+
+
+def test_factory_defaults_to_pooled_model():
+    first = AgentFactory.create("chat")
+    second = AgentFactory.create("chat")
+
+    assert first.llm.bound is second.llm.bound is get_chat_model("gpt-4")
+
+
+def test_agent_creation_benchmark():
+    """Per-agent cost of building the chat model, and HTTP pools created."""
+    agents = 50
+
+    start = time.perf_counter()
+    legacy = [ChatOpenAI(model="gpt-4").bind_tools(get_tools()) for _ in range(agents)]
+    legacy_seconds = (time.perf_counter() - start) / agents
+
+    start = time.perf_counter()
+    pooled = [get_chat_model("gpt-4").bind_tools(get_tools()) for _ in range(agents)]
+    pooled_seconds = (time.perf_counter() - start) / agents
+
+    legacy_pools = {id(llm.bound.root_client._client) for llm in legacy}
+    pooled_pools = {id(llm.bound.root_client._client) for llm in pooled}
+    print(
+        f"\nchat model per agent: before {legacy_seconds * 1e3:.2f}ms "
+        f"({len(legacy_pools)} HTTP pools), after {pooled_seconds * 1e3:.2f}ms "
+        f"({len(pooled_pools)} HTTP pool)"
+    )
+    assert len(legacy_pools) == agents
+    assert len(pooled_pools) == 1
+    assert pooled_seconds < legacy_seconds
@@ -0,0 +1,108 @@
+import json
+import time
+from collections import Counter
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage
+from botify.agent.agents.chat_agent import ChatAgent
+from botify.logging import logger as logger_module
+from botify.logging.logger import configure_logging, log_payload, logger
+
+
+@pytest.fixture(autouse=True)
+def restore_logging(monkeypatch):
+    monkeypatch.setattr(logger_module, "_payload_calls", Counter())
+    yield
+    configure_logging()
+
+
+def capture(level: str = "DEBUG") -> list:
+    records = []
+    logger.remove()
+    logger.add(lambda message: records.append(message.record), level=level)
+    return records
+
+
+def test_payloads_are_sampled_per_call_site():
+    records = capture()
+    built = []
+
+    def payload():
+        built.append(1)
+        return "state"
+
+    for _ in range(25):
+        log_payload("site-a", "state: {}", payload, every=10)
+    log_payload("site-b", "state: {}", payload, every=10)
+
+    assert [record["message"] for record in records] == ["state: state"] * 4
+    # The payload is only built for the records that were logged
+    assert len(built) == 4
+    assert records[0]["function"] == "test_payloads_are_sampled_per_call_site"
+
+
+def test_payloads_are_not_built_below_debug():
+    capture(level="INFO")
+    built = []
+
+    log_payload("site", "state: {}", lambda: built.append(1), every=1)
+
+    assert built == []
+
+
+@pytest.mark.parametrize("enqueue", [False, True])
+def test_json_logs(tmp_path, enqueue):
+    log_file = tmp_path / "botify.log"
+    configure_logging(json_logs=True, enqueue=enqueue, log_file=str(log_file))
+
+    logger.info("Hello {}", "world")
+    logger.complete()
+
+    record = json.loads(log_file.read_text().splitlines()[-1])["record"]
+    assert record["message"] == "Hello world"
+    assert record["level"]["name"] == "INFO"
+
+
+def legacy_turn_logging(state) -> None:
+    """What every chat turn logged before, at INFO."""
+    logger.info(f"call_llm State: {state}")
+    ai_message = state["messages"][-1]
+    logger.info(f"Type of aiMessage: {type(ai_message)}")
+    logger.info(f"AiMessage: {ai_message}")
+    logger.info(f"AiMessage tool_calls: {ai_message.tool_calls}")
+
+
+def test_turn_logging_benchmark(tmp_path, slow_llm):
+    """Logging cost per chat turn with a long history, by configuration."""
+    history = []
+    for n in range(100):
+        history.append(HumanMessage(content=f"Question {n} " + "words " * 80))
+        history.append(AIMessage(content=f"Answer {n} " + "words " * 80))
+    state = {"messages": history}
+    agent = ChatAgent(slow_llm)
+    turns = 50
+
+    def turn(state):
+        log_payload("chat.call_llm", "call_llm state: {}", lambda: state)
+        agent.should_continue(state, {})
+
+    configs = {
+        "before: every payload at INFO": (legacy_turn_logging, {"level": "DEBUG"}),
+        "INFO": (turn, {}),
+        "DEBUG, 1 in 10 payloads": (turn, {"level": "DEBUG"}),
+        "DEBUG, 1 in 10 payloads, enqueued": (
+            turn,
+            {"level": "DEBUG", "enqueue": True},
+        ),
+    }
+    results = {}
+    print()
+    for n, (name, (log_turn, options)) in enumerate(configs.items()):
+        configure_logging(log_file=str(tmp_path / f"botify-{n}.log"), **options)
+        start = time.perf_counter()
+        for _ in range(turns):
+            log_turn(state)
+        results[name] = (time.perf_counter() - start) / turns
+        logger.complete()
+        print(f"{name}: {results[name] * 1e6:.0f}us per turn")
+
+    assert results["INFO"] < results["before: every payload at INFO"] / 10
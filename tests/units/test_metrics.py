@@ -0,0 +1,140 @@
+import asyncio
+import time
+import httpx
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from botify.agent.agents.chat_agent import ChatAgent
+from botify.app import create_api
+from botify.services.agent_service import AgentService
+from botify.services.metrics import GraphMetrics, GraphMetricsHandler, Histogram
+from conftest import SlowFakeChatModel
+from test_agent_concurrency import add_session
+from test_retrieval import install_fake_models, reader_for
+
+
+class MeteredFakeChatModel(SlowFakeChatModel):
+    """Fake chat model reporting token usage, as OpenAI models do."""
+
+    def _result(self) -> ChatResult:
+        usage = {"input_tokens": 120, "output_tokens": 30, "total_tokens": 150}
+        message = AIMessage(content=self.reply, usage_metadata=usage)
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+
+def metered_service(metrics: GraphMetrics) -> AgentService:
+    service = AgentService()
+    service.callbacks = [GraphMetricsHandler(metrics)]
+    return service
+
+
+def test_histograms_render_in_prometheus_format():
+    histogram = Histogram("latency_seconds", "Latency", ("node",), (0.1, 1))
+    for value in (0.05, 0.5, 5):
+        histogram.observe(value, "agent")
+
+    assert histogram.render() == [
+        "# HELP latency_seconds Latency",
+        "# TYPE latency_seconds histogram",
+        'latency_seconds_bucket{node="agent",le="0.1"} 1',
+        'latency_seconds_bucket{node="agent",le="1"} 2',
+        'latency_seconds_bucket{node="agent",le="+Inf"} 3',
+        'latency_seconds_sum{node="agent"} 5.55',
+        'latency_seconds_count{node="agent"} 3',
+    ]
+
+
+def test_chat_runs_record_node_times_and_tokens():
+    metrics = GraphMetrics()
+    service = metered_service(metrics)
+    add_session(service, "session", ChatAgent(MeteredFakeChatModel(delay=0.05)))
+
+    async def scenario():
+        await service.process_message("hi", "session")
+        async for _ in service.stream_message("hi again", "session"):
+            pass
+
+    asyncio.run(scenario())
+
+    assert metrics.node_seconds.count("test", "agent") == 2
+    assert metrics.llm_tokens.count("test", "agent", "input") == 2
+    assert metrics.node_visits.count("test", "agent") == 2
+    _, total = metrics.node_seconds._series[("test", "agent")]
+    assert total[0] >= 0.1
+
+
+def test_reader_runs_record_retrievals_and_loops(corpus, qa):
+    metrics = GraphMetrics()
+    reader = reader_for(corpus)
+    reader.pregrade_thresholds = None
+    # Nothing in the corpus answers it, so every rewrite is used up
+    unanswerable = {"question": "Who won the 1954 World Cup?", "answer": None}
+    install_fake_models(reader, qa + [unanswerable])
+    config = {
+        "metadata": {"agent_type": "reader"},
+        "callbacks": [GraphMetricsHandler(metrics)],
+    }
+
+    reader.run({"messages": [("user", unanswerable["question"])]}, config)
+
+    retrievals = reader.max_rewrites + 1
+    assert metrics.retrieved_chunks.count("reader") == retrievals
+    assert metrics.retrieval_score.count("reader") > 0
+    assert metrics.node_seconds.count("reader", "grade") == retrievals
+    visits = metrics.node_visits._series[("reader", "rewrite")]
+    assert visits[1][0] == reader.max_rewrites
+
+
+def test_metrics_endpoint(slow_llm):
+    slow_llm.delay = 0
+    service = AgentService()
+    add_session(service, "session", ChatAgent(slow_llm))
+    api = create_api(agent_service=service)
+
+    async def scenario():
+        await service.process_message("hi", "session")
+        async with httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=api), base_url="http://api"
+        ) as client:
+            return await client.get("/metrics")
+
+    response = asyncio.run(scenario())
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    body = response.text
+    assert 'botify_node_seconds_count{agent="test",node="agent"}' in body
+    assert "botify_scheduler_granted_total" in body
+    assert "botify_sessions 1" in body
+
+
+def test_instrumentation_overhead_benchmark():
+    """Time per chat turn with and without the metrics callback.
+
+    Turns alternate between the two services, so both see the same noise.
+    """
+    turns = 300
+    services = {"without": AgentService(), "with": AgentService()}
+    services["without"].callbacks = []
+    services["with"].callbacks = [GraphMetricsHandler(GraphMetrics())]
+    for service in services.values():
+        add_session(service, "session", ChatAgent(MeteredFakeChatModel(delay=0)))
+    elapsed = {name: 0.0 for name in services}
+
+    async def scenario():
+        for turn in range(turns + 10):
+            for name, service in services.items():
+                start = time.perf_counter()
+                await service.process_message("hi", "session")
+                # The first turns warm up imports and caches
+                if turn >= 10:
+                    elapsed[name] += time.perf_counter() - start
+
+    asyncio.run(scenario())
+
+    per_turn = {name: seconds / turns for name, seconds in elapsed.items()}
+    overhead = per_turn["with"] - per_turn["without"]
+    print(
+        f"\nper chat turn: {per_turn['without'] * 1e3:.2f}ms without metrics, "
+        f"{per_turn['with'] * 1e3:.2f}ms with ({overhead * 1e6:+.0f}us)"
+    )
+    assert overhead < 0.005
@@ -0,0 +1,360 @@
+import time
+import pytest
+from langchain_core.documents import Document
+from langchain_core.messages import AIMessage, HumanMessage
+from langchain_core.output_parsers import StrOutputParser
+from langchain_core.prompts import PromptTemplate
+from langchain_core.runnables import RunnableLambda
+from langchain_openai import ChatOpenAI
+from langgraph.errors import GraphRecursionError
+from pydantic import BaseModel, Field
+from botify.agent.agents.reader_agent import (
+    FALLBACK_ANSWER,
+    ChunkGrades,
+    ReaderAgent,
+)
+from botify.agent.prompts import RAG_PROMPT
+from botify.rag.chunking import ChunkingConfig
+from botify.scraper.scraper import Scraper
+from test_retrieval import LLM_NODES, install_fake_models, reader_for
+
+
+@pytest.fixture(autouse=True)
+def openai_key(monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+
+
+@pytest.fixture
+def reader(document_index):
+    agent = ReaderAgent(None, None, index=document_index)
+    agent.set_context_documents(
+        [Document(page_content="Botify is a telegram bot.", metadata={"source": "x"})]
+    )
+    # Zero-latency stand-ins so only per-turn overhead is measured
+    agent.pregrade_thresholds = None
+    agent.grade_chain = RunnableLambda(lambda _: ChunkGrades(relevant_chunks=[1]))
+    agent.rag_chain = RunnableLambda(lambda _: "answer")
+    yield agent
+    agent.close()
+
+
+@pytest.fixture
+def state():
+    return {
+        "messages": [
+            HumanMessage(content="What is botify?"),
+            AIMessage(content="[source: x]\nBotify is a telegram bot."),
+        ]
+    }
+
+
+# The per-document grading prompt used before chunks were graded together
+LEGACY_GRADE_PROMPT = PromptTemplate(
+    template="""You are a grader assessing relevance of a retrieved document to a user question. \n
+    Here is the retrieved document: \n\n {context} \n\n
+    Here is the user question: {question} \n
+    If the document contains keyword(s) or semantic meaning related to the user question, grade it as relevant. \n
+    Give a binary score 'yes' or 'no' score to indicate whether the document is relevant to the question.""",
+    input_variables=["context", "question"],
+)
+
+
+def legacy_turn_setup():
+    """What grade_documents and generate built on every call before hoisting.
+
+    The ``hub.pull("rlm/rag-prompt")`` network fetch is left out, so this
+    understates the old overhead.
+    """
+
+    class grade(BaseModel):
+        binary_score: str = Field(description="Relevance score 'yes' or 'no'")
+
+    model = ChatOpenAI(temperature=0, model="gpt-4-0125-preview", streaming=True)
+    LEGACY_GRADE_PROMPT.model_copy() | model.with_structured_output(grade)
+    llm = ChatOpenAI(model_name="gpt-3.5-turbo", temperature=0, streaming=True)
+    RAG_PROMPT.model_copy() | llm | StrOutputParser()
+
+
+def per_turn_seconds(fn, turns: int = 10) -> float:
+    start = time.perf_counter()
+    for _ in range(turns):
+        fn()
+    return (time.perf_counter() - start) / turns
+
+
+def test_models_and_chains_are_shared(document_index):
+    first = ReaderAgent(None, None, index=document_index)
+    second = ReaderAgent(None, None, index=document_index)
+
+    assert first.grade_chain is second.grade_chain
+    assert first.rag_chain is second.rag_chain
+    assert first.grading_model is second.grading_model
+
+
+def test_nodes_use_hoisted_chains(reader, state):
+    graded = reader.grade(state)
+    assert graded == {"context": "[source: x]\nBotify is a telegram bot."}
+    assert reader.grade_documents(state | graded) == "generate"
+    assert reader.generate(state | graded) == {"messages": ["answer"]}
+
+
+def test_per_turn_overhead_benchmark(reader, state):
+    """Per-turn overhead of grading and generation, excluding LLM time."""
+
+    def hoisted_turn():
+        graded = reader.grade(state)
+        reader.grade_documents(state | graded)
+        reader.generate(state | graded)
+
+    def legacy_turn():
+        legacy_turn_setup()
+        hoisted_turn()
+
+    legacy = per_turn_seconds(legacy_turn)
+    hoisted = per_turn_seconds(hoisted_turn)
+
+    print(
+        f"\nper-turn overhead: before {legacy * 1e3:.2f}ms, after {hoisted * 1e3:.2f}ms"
+    )
+    assert hoisted < legacy
+
+
+SENTENCES = ChunkingConfig("sentence", chunk_size=40, chunk_overlap=0)
+
+
+def test_retrieval_spans_sources_with_provenance(topics, document_index):
+    urls = [f"{topics}/0", f"{topics}/1"]
+    agent = ReaderAgent(None, urls=urls, index=document_index, chunking=SENTENCES)
+
+    zebra = agent.retriever_tool.invoke({"query": "zebra0 herd valley"})
+    walrus = agent.retriever_tool.invoke({"query": "walrus1 herd valley"})
+
+    assert set(agent.sources) == set(urls)
+    assert zebra.startswith(f"[source: {urls[0]}]")
+    assert walrus.startswith(f"[source: {urls[1]}]")
+    agent.close()
+
+
+def test_urls_can_be_added_later(topics, document_index):
+    agent = ReaderAgent(None, f"{topics}/0", index=document_index, chunking=SENTENCES)
+    weight = agent.resource_weight()
+
+    failed = agent.add_urls([f"{topics}/1", f"{topics}/../missing"])
+
+    assert failed == [f"{topics}/../missing"]
+    assert agent.sources == [f"{topics}/0", f"{topics}/1"]
+    assert agent.resource_weight() > weight
+    assert "walrus1" in agent.retriever_tool.invoke({"query": "walrus1 rangers"})
+
+    agent.close()
+    assert len(document_index) == 2
+    assert all(entry.refcount == 0 for entry in document_index._entries.values())
+
+
+def test_unreadable_urls_fail_the_reader(topics, document_index):
+    with pytest.raises(ValueError):
+        ReaderAgent(None, f"{topics}/../missing", index=document_index)
+
+
+def test_set_context_documents_replaces_sources(document_index):
+    agent = ReaderAgent(None, None, index=document_index, chunking=SENTENCES)
+    agent.set_context_documents(
+        [
+            Document(page_content="Zebras graze.", metadata={"source": "a"}),
+            Document(page_content="Otters swim.", metadata={"source": "b"}),
+        ]
+    )
+    agent.set_context_documents(
+        [Document(page_content="Herons fish.", metadata={"source": "c"})]
+    )
+
+    assert agent.sources == ["c"]
+    agent.close()
+
+
+def test_multi_url_ingestion_benchmark(topics, embeddings):
+    """Ingesting 100 local pages into one reader, pipelined vs. one by one."""
+    from botify.rag.document_index import DocumentIndex
+    from conftest import in_memory_store
+
+    urls = [f"{topics}/{n}" for n in range(100)]
+
+    index = DocumentIndex(embeddings, in_memory_store, max_entries=200)
+    start = time.perf_counter()
+    reader = ReaderAgent(None, urls=urls, index=index, chunking=SENTENCES)
+    pipelined = time.perf_counter() - start
+    chunks = reader.resource_weight() - 1
+
+    # One fetch at a time, each page indexed before the next is requested
+    index = DocumentIndex(embeddings, in_memory_store, max_entries=200)
+    sequential_reader = ReaderAgent(None, None, index=index, chunking=SENTENCES)
+    start = time.perf_counter()
+    for url in urls:
+        sequential_reader.add_documents(Scraper([url]).run())
+    sequential = time.perf_counter() - start
+
+    print(
+        f"\ningesting 100 pages ({chunks} chunks): pipelined {pipelined:.2f}s "
+        f"({chunks / pipelined:.0f} chunks/s), one by one {sequential:.2f}s "
+        f"({chunks / sequential:.0f} chunks/s)"
+    )
+    assert len(reader.sources) == 100
+    assert sequential_reader.resource_weight() == reader.resource_weight()
+    assert pipelined < sequential
+
+
+# Questions the corpus does not answer, so every retrieval is graded irrelevant
+UNANSWERABLE = [
+    {"question": "Who painted the ceiling of the Sistine Chapel?"},
+    {"question": "What is the capital city of Mongolia?"},
+    {"question": "How do vaccines train the immune system?"},
+    {"question": "Which year did the first moon landing happen?"},
+]
+
+
+@pytest.fixture
+def corpus_reader(corpus):
+    agent = reader_for(corpus)
+    yield agent
+    agent.close()
+
+
+def ask(agent: ReaderAgent, question: str) -> str:
+    try:
+        result = agent.run({"messages": [("user", question)]}, {})
+    except GraphRecursionError:
+        return ""
+    return result["messages"][-1].content
+
+
+def test_rewrites_are_capped_with_a_fallback_answer(corpus_reader):
+    corpus_reader.max_rewrites = 2
+    calls = install_fake_models(corpus_reader, UNANSWERABLE)
+
+    answer = ask(corpus_reader, UNANSWERABLE[0]["question"])
+
+    assert answer == FALLBACK_ANSWER
+    assert calls["rewrite"] == 2
+    assert calls["agent"] == 3
+    assert calls["generate"] == 0
+
+
+def test_clear_cut_retrievals_skip_the_grader(corpus_reader, qa):
+    calls = install_fake_models(corpus_reader, qa + UNANSWERABLE)
+
+    ask(corpus_reader, "What is the autolyse rest?")
+    assert calls["grade"] == 0
+    assert calls["generate"] == 1
+
+    # Irrelevant retrievals still go to the grader before the fallback
+    ask(corpus_reader, UNANSWERABLE[0]["question"])
+    assert calls["grade"] > 0
+    assert calls["generate"] == 1
+
+
+def test_pregrade_only_keeps_confident_hits(reader):
+    reader.pregrade_thresholds = (0.03, 0.8)
+    question = "When was the autolyse rest introduced?"
+
+    def chunk(text, score, source="https://example.com/autolyse-rest-introduced"):
+        return Document(page_content=text, metadata={"source": source, "score": score})
+
+    hit = chunk("The autolyse rest was introduced in 1974.", 0.032)
+    assert reader.pregrade(question, [hit]) == [
+        "[source: https://example.com/autolyse-rest-introduced]\n"
+        "The autolyse rest was introduced in 1974."
+    ]
+    # Top ranked but sharing no words: the grader decides, not the fallback
+    assert reader.pregrade(question, [chunk("Raymond Calvel, 1974.", 0.032)]) is None
+    # The question's words in a ranked-low chunk, or only in its source URL
+    assert reader.pregrade(question, [chunk(hit.page_content, 0.016)]) is None
+    assert reader.pregrade(question, [chunk("Flour and water.", 0.032)]) is None
+
+
+def test_rewrite_budget_benchmark(corpus, qa):
+    """LLM calls per answered question, before and after the rewrite budget."""
+    workload = qa + UNANSWERABLE
+    results = {}
+    for name in ("before", "after"):
+        agent = reader_for(corpus)
+        if name == "before":
+            # Rewrite until LangGraph's recursion limit, grading every retrieval
+            agent.max_rewrites = 10**6
+            agent.pregrade_thresholds = None
+        calls = install_fake_models(agent, workload)
+        for item in workload:
+            ask(agent, item["question"])
+        agent.close()
+        results[name] = calls
+
+    print(f"\n{len(qa)} answerable and {len(UNANSWERABLE)} unanswerable questions:")
+    per_answer = {}
+    for name, calls in results.items():
+        per_answer[name] = sum(calls[node] for node in LLM_NODES) / calls["generate"]
+        print(
+            f"{name:<6} {per_answer[name]:.1f} LLM calls per answered question "
+            f"({calls['generate']} answered; {calls['agent']} agent, "
+            f"{calls['grade']} grade, {calls['rewrite']} rewrite calls)"
+        )
+    assert results["after"]["generate"] >= results["before"]["generate"] - 1
+    assert per_answer["after"] < per_answer["before"] / 2
+
+
+def test_chunks_are_graded_in_one_call(reader):
+    grades = []
+
+    def grade(inputs):
+        grades.append(inputs["chunks"])
+        return ChunkGrades(relevant_chunks=[2])
+
+    reader.grade_chain = RunnableLambda(grade)
+    chunks = ["[source: a]\nOtters swim.", "[source: b]\nBotify is a bot."]
+    state = {
+        "messages": [
+            HumanMessage(content="What is botify?"),
+            AIMessage(content="\n\n".join(chunks)),
+        ]
+    }
+
+    assert reader.grade(state) == {"context": chunks[1]}
+    assert grades == ["Chunk 1:\n" + chunks[0] + "\n\nChunk 2:\n" + chunks[1]]
+
+
+def test_chunk_grading_benchmark(corpus, qa):
+    """Generation prompt tokens and latency per question, by grading mode."""
+    # Generation time modelled as proportional to its prompt
+    seconds_per_token = 0.0002
+    results = {}
+    for name in ("whole retrieval", "per chunk"):
+        agent = reader_for(corpus)
+        agent.pregrade_thresholds = None
+        calls = install_fake_models(
+            agent,
+            qa,
+            all_or_nothing=name == "whole retrieval",
+            seconds_per_prompt_token=seconds_per_token,
+        )
+        start = time.perf_counter()
+        for item in qa:
+            ask(agent, item["question"])
+        elapsed = time.perf_counter() - start
+        agent.close()
+        results[name] = {
+            "tokens": calls["generation_tokens"] / calls["generate"],
+            "latency": elapsed / len(qa),
+            "grade_calls": calls["grade"],
+            "answered": calls["generate"],
+        }
+
+    print(f"\n{len(qa)} questions, generation at {seconds_per_token * 1e3}ms/token:")
+    for name, result in results.items():
+        print(
+            f"{name:<16} {result['tokens']:.0f} generation prompt tokens, "
+            f"{result['latency'] * 1e3:.1f}ms per question, "
+            f"{result['grade_calls']} grading calls, {result['answered']} answered"
+        )
+    whole, per_chunk = results["whole retrieval"], results["per chunk"]
+    assert per_chunk["grade_calls"] == whole["grade_calls"]
+    assert per_chunk["answered"] == whole["answered"]
+    assert per_chunk["tokens"] < whole["tokens"] * 0.75
+    assert per_chunk["latency"] < whole["latency"]
@@ -0,0 +1,233 @@
+import re
+import time
+from collections import Counter
+import pytest
+from langchain_core.documents import Document
+from langchain_core.messages import AIMessage
+from langchain_core.runnables import RunnableLambda
+from botify.agent.agents.reader_agent import ChunkGrades, ReaderAgent
+from botify.agent.prompts import RAG_PROMPT
+from botify.rag.bm25 import BM25Index, tokenize
+from botify.rag.chunking import ChunkingConfig, token_length
+from botify.rag.document_index import DocumentIndex
+from botify.rag import retriever as retriever_module
+from botify.rag.retriever import (
+    CrossEncoderReranker,
+    lexical_rerank,
+    reciprocal_rank_fusion,
+)
+from conftest import HashingEmbeddings, in_memory_store
+
+
+# Small chunks, so finding the one holding an answer takes more than topic words
+EVAL_CHUNKING = ChunkingConfig("sentence", chunk_size=40, chunk_overlap=0)
+
+# Retriever settings compared by the eval harness
+CONFIGS = {
+    "vector": dict(hybrid=False, reranker=None),
+    "hybrid": dict(hybrid=True, reranker=None),
+    "hybrid+rerank": dict(hybrid=True, reranker=lexical_rerank),
+}
+
+# Agent loops allowed per question before it counts as unanswered
+MAX_ITERATIONS = 3
+
+
+@pytest.fixture(autouse=True)
+def openai_key(monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+
+
+def contains(text: str, answer: str) -> bool:
+    return answer in " ".join(text.split())
+
+
+# Graph nodes calling an LLM, as counted by ``install_fake_models``
+LLM_NODES = ("agent", "grade", "rewrite", "generate")
+
+
+def install_fake_models(
+    agent: ReaderAgent,
+    qa,
+    all_or_nothing: bool = False,
+    seconds_per_prompt_token: float = 0.0,
+) -> Counter:
+    """Replace the reader's models with fakes, returning their call counts.
+
+    The tool-calling model always retrieves with the last message. The
+    grader is an oracle that accepts the chunks holding the answer, or with
+    ``all_or_nothing`` every chunk when one holds it, like grading the whole
+    retrieval at once; questions without an answer are never accepted.
+    Rewriting keeps the question's keywords. Generation counts its prompt
+    tokens into "generation_tokens" and takes ``seconds_per_prompt_token``.
+    """
+    calls = Counter()
+    answers = {item["question"]: item.get("answer") for item in qa}
+
+    def call_tool(messages):
+        calls["agent"] += 1
+        return AIMessage(
+            content="",
+            tool_calls=[
+                {
+                    "name": "retrieve_web_content",
+                    "args": {"query": messages[-1].content},
+                    "id": f"call-{calls['agent']}",
+                }
+            ],
+        )
+
+    def grade(inputs: dict) -> ChunkGrades:
+        calls["grade"] += 1
+        answer = answers[inputs["question"]]
+        chunks = re.split(r"^Chunk \d+:\n", inputs["chunks"], flags=re.M)[1:]
+        relevant = [
+            number
+            for number, chunk in enumerate(chunks, start=1)
+            if answer is not None and contains(chunk, answer)
+        ]
+        if all_or_nothing and relevant:
+            relevant = list(range(1, len(chunks) + 1))
+        return ChunkGrades(relevant_chunks=relevant)
+
+    def rewrite(messages):
+        calls["rewrite"] += 1
+        question = next(q for q in answers if q in messages[0].content)
+        return AIMessage(content=" ".join(tokenize(question)))
+
+    def generate(inputs: dict) -> str:
+        calls["generate"] += 1
+        tokens = token_length(RAG_PROMPT.format(**inputs))
+        calls["generation_tokens"] += tokens
+        time.sleep(tokens * seconds_per_prompt_token)
+        return "answer"
+
+    agent.chat_model_with_tools = RunnableLambda(call_tool)
+    agent.grade_chain = RunnableLambda(grade)
+    agent.grading_model = RunnableLambda(rewrite)
+    agent.rag_chain = RunnableLambda(generate)
+    agent.flow = agent.generate_flow()
+    return calls
+
+
+def reader_for(corpus, **retriever) -> ReaderAgent:
+    index = DocumentIndex(HashingEmbeddings(), in_memory_store)
+    agent = ReaderAgent(None, None, index=index, chunking=EVAL_CHUNKING)
+    agent.set_context_documents(corpus)
+    # The retriever tool holds this retriever, so the graph uses it too
+    for name, value in retriever.items():
+        setattr(agent.retriever, name, value)
+    return agent
+
+
+def ranking_metrics(agent: ReaderAgent, qa, k: int = 4) -> dict:
+    """Recall at 1 and ``k``, and the mean reciprocal rank of the answer."""
+    agent.retriever.k = k
+    ranks = []
+    for item in qa:
+        documents = agent.retriever.invoke(item["question"])
+        found = [
+            rank
+            for rank, document in enumerate(documents, start=1)
+            if contains(document.page_content, item["answer"])
+        ]
+        ranks.append(found[0] if found else None)
+    return {
+        "recall@1": ranks.count(1) / len(qa),
+        f"recall@{k}": sum(rank is not None for rank in ranks) / len(qa),
+        "mrr": sum(1 / rank for rank in ranks if rank) / len(qa),
+    }
+
+
+def graph_iterations(agent: ReaderAgent, qa) -> dict:
+    """Run every question through the reader's graph with fake models.
+
+    Retrievals are graded by the oracle only, and agent loops per question
+    are counted, up to ``MAX_ITERATIONS``.
+    """
+    agent.retriever.k = 4
+    agent.max_rewrites = MAX_ITERATIONS - 1
+    agent.pregrade_thresholds = None
+    calls = install_fake_models(agent, qa)
+    for item in qa:
+        agent.run({"messages": [("user", item["question"])]}, {})
+    return {
+        "iterations": calls["agent"] / len(qa),
+        "unanswered": len(qa) - calls["generate"],
+    }
+
+
+def test_bm25_follows_incremental_changes():
+    index = BM25Index()
+    index.add("a", Document(page_content="The aperture of a telescope"))
+    index.add("b", Document(page_content="Sourdough starter doubles in volume"))
+
+    assert [doc.page_content for doc, _ in index.search("telescope aperture")] == [
+        "The aperture of a telescope"
+    ]
+    index.remove("a")
+    assert index.search("telescope aperture") == []
+    assert len(index) == 1
+
+
+def test_bm25_prefers_rare_terms():
+    index = BM25Index()
+    for n in range(5):
+        index.add(str(n), Document(page_content=f"river bank number {n}"))
+    index.add("otter", Document(page_content="river otter"))
+
+    best, _ = index.search("otter river", k=1)[0]
+
+    assert best.page_content == "river otter"
+
+
+def test_reciprocal_rank_fusion_rewards_agreement():
+    a, b, c = (Document(page_content=text) for text in "abc")
+
+    fused = reciprocal_rank_fusion([[a, b, c], [c, b, a], [b]])
+
+    assert fused[0] is b
+
+
+def test_lexical_rerank_keeps_order_of_ties():
+    documents = [
+        Document(page_content="mirror"),
+        Document(page_content="aligning the mirrors"),
+        Document(page_content="mirror alignment"),
+    ]
+
+    ranked = lexical_rerank("aligning mirrors", documents)
+
+    assert [doc.page_content for doc in ranked] == [
+        "aligning the mirrors",
+        "mirror",
+        "mirror alignment",
+    ]
+
+
+def test_cross_encoder_without_its_extra_fails_clearly(monkeypatch):
+    monkeypatch.setattr(retriever_module, "find_spec", lambda name: None)
+
+    with pytest.raises(ImportError, match=r"botify\[rerank\]"):
+        CrossEncoderReranker()
+
+
+def test_retrieval_benchmark(corpus, qa):
+    """Answer ranks and agent loops per question, by retriever configuration."""
+    results = {}
+    for name, retriever in CONFIGS.items():
+        agent = reader_for(corpus, **retriever)
+        results[name] = ranking_metrics(agent, qa) | graph_iterations(agent, qa)
+        agent.close()
+
+    print("\nretriever      recall@1  recall@4   mrr  iterations  unanswered")
+    for name, result in results.items():
+        print(
+            f"{name:<14} {result['recall@1']:>8.0%}  {result['recall@4']:>8.0%}"
+            f"  {result['mrr']:.2f}  {result['iterations']:>10.2f}"
+            f"  {result['unanswered']:>10}"
+        )
+
+    assert results["hybrid"]["recall@4"] >= results["vector"]["recall@4"]
+    assert results["hybrid+rerank"]["mrr"] > results["hybrid"]["mrr"]
+    assert results["hybrid+rerank"]["iterations"] < results["vector"]["iterations"]
@@ -0,0 +1,211 @@
+import asyncio
+import statistics
+import time
+from contextlib import asynccontextmanager
+from typing import Dict, Optional
+import pytest
+from botify.agent.agents.chat_agent import ChatAgent
+from botify.services.agent_service import AgentService
+from botify.services.scheduler import (
+    FairScheduler,
+    QueueFull,
+    RateLimited,
+    TokenBucket,
+)
+from test_agent_concurrency import add_session
+
+
+def test_token_bucket_allows_a_burst_then_the_rate():
+    bucket = TokenBucket(rate=2, capacity=3)
+
+    assert [bucket.take() for _ in range(3)] == [0, 0, 0]
+    wait = bucket.take()
+    assert 0.4 < wait <= 0.5
+    # Half a second later, one more token has refilled
+    bucket.updated -= 0.5
+    assert bucket.take() == 0
+    assert not bucket.full
+
+
+def test_waiting_runs_take_turns_by_user_then_by_session():
+    scheduler = FairScheduler(max_concurrent=1, max_per_session=1)
+    order = []
+
+    async def run(session_id, user_id):
+        async with scheduler.slot(session_id, user_id):
+            order.append(session_id)
+            await asyncio.sleep(0.01)
+
+    async def scenario():
+        holder = asyncio.create_task(run("first", "holder"))
+        await asyncio.sleep(0)
+        tasks = [
+            asyncio.create_task(run(session_id, user_id))
+            for session_id, user_id in [
+                ("a-1", "a"),
+                ("a-1", "a"),
+                ("a-2", "a"),
+                ("b-1", "b"),
+            ]
+        ]
+        await asyncio.gather(holder, *tasks)
+
+    asyncio.run(scenario())
+
+    # User b is served after a's first run, not after all of them, and a's
+    # second chat before the second message of its first
+    assert order == ["first", "a-1", "b-1", "a-2", "a-1"]
+
+
+def test_runs_of_a_session_never_overlap():
+    scheduler = FairScheduler(max_concurrent=4, max_per_session=1)
+    running: Dict[str, int] = {}
+    most: Dict[str, int] = {}
+
+    async def run(session_id):
+        async with scheduler.slot(session_id):
+            running[session_id] = running.get(session_id, 0) + 1
+            most[session_id] = max(most.get(session_id, 0), running[session_id])
+            await asyncio.sleep(0.01)
+            running[session_id] -= 1
+
+    async def scenario():
+        start = time.perf_counter()
+        await asyncio.gather(*(run(f"session-{n % 2}") for n in range(6)))
+        return time.perf_counter() - start
+
+    elapsed = asyncio.run(scenario())
+
+    assert most == {"session-0": 1, "session-1": 1}
+    # The two sessions still run side by side
+    assert elapsed < 0.05
+    assert scheduler.running == scheduler.queued == 0
+
+
+def test_full_queue_refuses_runs_and_cancelled_waiters_leave_it():
+    scheduler = FairScheduler(max_concurrent=1, max_per_session=1, max_queued=1)
+
+    async def hold(session_id, release):
+        async with scheduler.slot(session_id):
+            await release.wait()
+
+    async def scenario():
+        release = asyncio.Event()
+        holder = asyncio.create_task(hold("a", release))
+        waiter = asyncio.create_task(hold("b", release))
+        await asyncio.sleep(0)
+        with pytest.raises(QueueFull):
+            async with scheduler.slot("c"):
+                pass
+        waiter.cancel()
+        await asyncio.sleep(0)
+        queued_after_cancel = scheduler.queued
+        release.set()
+        await holder
+        return queued_after_cancel
+
+    assert asyncio.run(scenario()) == 0
+    assert scheduler.running == 0
+    assert scheduler.stats.queue_full == 1
+
+
+def test_agent_service_rate_limits_each_user(slow_llm):
+    slow_llm.delay = 0
+    scheduler = FairScheduler(user_rate=0.01, user_burst=2)
+    service = AgentService(scheduler=scheduler)
+    add_session(service, "session", ChatAgent(slow_llm))
+
+    async def scenario():
+        for _ in range(2):
+            await service.process_message("hi", "session", user_id="flooder")
+        with pytest.raises(RateLimited) as rejected:
+            await service.process_message("hi", "session", user_id="flooder")
+        # Other users, and runs without a user, are not affected
+        other = await service.process_message("hi", "session", user_id="other")
+        anonymous = await service.process_message("hi", "session")
+        return rejected.value, other, anonymous
+
+    rejected, other, anonymous = asyncio.run(scenario())
+
+    assert rejected.retry_after > 50
+    assert other == anonymous == "fake response"
+    assert scheduler.stats.rate_limited == 1
+
+
+class FifoSlots:
+    """The earlier scheduling: a semaphore per session, then a global one."""
+
+    def __init__(self, max_concurrent: int):
+        self.run_slots = asyncio.Semaphore(max_concurrent)
+        self.session_slots: Dict[str, asyncio.Semaphore] = {}
+
+    @asynccontextmanager
+    async def slot(self, session_id: str, user_id: Optional[str] = None):
+        session_slot = self.session_slots.setdefault(session_id, asyncio.Semaphore(1))
+        async with session_slot, self.run_slots:
+            yield
+
+
+def simulate(slots, flood_sessions=20, flood_messages=5, light_users=8):
+    """One user floods many chats while light users ask a question at a time.
+
+    Returns the light users' latencies, and the flood messages refused.
+    """
+    run_time = 0.02
+    latencies, refused = [], []
+
+    async def ask(session_id, user_id):
+        async with slots.slot(session_id, user_id):
+            await asyncio.sleep(run_time)
+
+    async def flood(session_id):
+        async def message():
+            try:
+                await ask(session_id, "flooder")
+            except RateLimited:
+                refused.append(session_id)
+
+        await asyncio.gather(*(message() for _ in range(flood_messages)))
+
+    async def light(user_id):
+        await asyncio.sleep(0.01)
+        for _ in range(3):
+            start = time.perf_counter()
+            await ask(f"{user_id}-chat", user_id)
+            latencies.append(time.perf_counter() - start)
+            await asyncio.sleep(0.03)
+
+    async def scenario():
+        await asyncio.gather(
+            *(flood(f"flood-{n}") for n in range(flood_sessions)),
+            *(light(f"user-{n}") for n in range(light_users)),
+        )
+
+    asyncio.run(scenario())
+    return latencies, refused
+
+
+def test_fair_scheduling_benchmark():
+    """Light users' latency next to a flooding user, by scheduling policy."""
+    policies = {
+        "fifo": lambda: FifoSlots(max_concurrent=4),
+        "round-robin": lambda: FairScheduler(
+            max_concurrent=4, max_per_session=1, user_rate=1e9, user_burst=10**9
+        ),
+        "round-robin + rate limit": lambda: FairScheduler(
+            max_concurrent=4, max_per_session=1, user_rate=1, user_burst=5
+        ),
+    }
+    results = {}
+    print()
+    for name, make in policies.items():
+        latencies, refused = simulate(make())
+        quantiles = statistics.quantiles(latencies, n=100)
+        results[name] = quantiles[98]
+        print(
+            f"{name}: light users p50 {quantiles[49] * 1e3:.0f}ms, "
+            f"p99 {quantiles[98] * 1e3:.0f}ms; {len(refused)} flood messages refused"
+        )
+
+    assert results["round-robin"] < results["fifo"]
+    assert results["round-robin + rate limit"] < results["fifo"]
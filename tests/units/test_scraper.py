@@ -1,6 +1,13 @@
+import asyncio
+import hashlib
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler
 import pytest
-from botify.scraper.scraper import Scraper
+from botify.scraper.scraper import PageCache, Scraper, ScraperEngine
 from langchain_core.documents import Document
+from conftest import serving
 
 
 @pytest.fixture
@@ -29,7 +36,6 @@ def test_scrape_html():
     assert "LangChain" in result[0].page_content
 
 
-@pytest.mark.skip(reason="PDF scraping is not implemented yet")
 def test_scrape_pdf():
     """Test PDF scraping functionality with real HTTP request."""
     url = "https://pdfobject.com/pdf/sample.pdf"  # "Large Language Models as General Pattern Machines" paper
@@ -54,3 +60,323 @@ def test_run_with_multiple_urls():
     # print(results)
     assert all(isinstance(doc, Document) for doc in results)
     assert any("LangChain" in doc.page_content for doc in results)
+
+
+class PageHandler(BaseHTTPRequestHandler):
+    """Serves generated pages with an ETag, honouring If-None-Match."""
+
+    latency = 0.03
+    requests = 0
+    in_flight = 0
+    max_in_flight = 0
+    lock = threading.Lock()
+
+    def do_GET(self):
+        if self.path.startswith("/pdf"):
+            return self.send_pdf()
+        cls = type(self)
+        with cls.lock:
+            cls.requests += 1
+            cls.in_flight += 1
+            cls.max_in_flight = max(cls.max_in_flight, cls.in_flight)
+        try:
+            time.sleep(cls.latency)
+            body = page_html(self.path).encode()
+            etag = '"%s"' % hashlib.md5(body).hexdigest()
+            if self.headers.get("If-None-Match") == etag:
+                self.send_response(304)
+                self.send_header("ETag", etag)
+                self.end_headers()
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.send_header("ETag", etag)
+            self.end_headers()
+            self.wfile.write(body)
+        finally:
+            with cls.lock:
+                cls.in_flight -= 1
+
+    def send_pdf(self):
+        content_type = "application/octet-stream" if "generic" in self.path else (
+            "application/pdf"
+        )
+        etag = '"%s"' % hashlib.md5(self.pdf).hexdigest()
+        if "cached" in self.path and self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        if "cached" in self.path:
+            self.send_header("ETag", etag)
+        self.send_header("Content-Length", str(len(self.pdf)))
+        self.end_headers()
+        self.wfile.write(self.pdf)
+
+    def log_message(self, *args):
+        pass
+
+
+def page_html(path: str) -> str:
+    paragraphs = "".join(
+        f"<p>Paragraph {i} of {path} about rivers, deltas and floodplains.</p>"
+        for i in range(1500)
+    )
+    return (
+        f'<html lang="en"><head><title>Page {path}</title></head>'
+        f"<body><h1>{path}</h1>{paragraphs}</body></html>"
+    )
+
+
+def make_pdf(pages: int, lines: int = 40, figure: int = 0) -> bytes:
+    """A PDF with ``pages`` pages of ``lines`` lines of text each.
+
+    With ``figure`` set, every page also draws an image of that many bytes.
+    """
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        None,  # The page tree, once the page ids are known
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    kids = []
+    for page in range(1, pages + 1):
+        text = "".join(
+            f"(Page {page} line {line}: sediment carried by the river settles "
+            f"in the delta.) Tj T* "
+            for line in range(lines)
+        )
+        stream = f"BT /F1 9 Tf 11 TL 40 800 Td {text}ET".encode()
+        resources = b"/Font << /F1 3 0 R >>"
+        if figure:
+            pixels = hashlib.sha256(b"%d" % page).digest() * (figure // 32)
+            objects.append(
+                b"<< /Type /XObject /Subtype /Image /Width %d /Height 32"
+                b" /ColorSpace /DeviceGray /BitsPerComponent 8 /Length %d >>\n"
+                b"stream\n%s\nendstream" % (len(pixels) // 32, len(pixels), pixels)
+            )
+            resources += b" /XObject << /Im1 %d 0 R >>" % len(objects)
+            stream = b"q 200 0 0 100 40 40 cm /Im1 Do Q " + stream
+        objects.append(
+            b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream)
+        )
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842]"
+            b" /Resources << %s >> /Contents %d 0 R >>" % (resources, len(objects))
+        )
+        kids.append(b"%d 0 R" % len(objects))
+    objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (b" ".join(kids), pages)
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n%s\nendobj\n" % (number, body)
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    out += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (
+        len(objects) + 1,
+        xref,
+    )
+    return bytes(out)
+
+
+@pytest.fixture
+def server():
+    PageHandler.requests = PageHandler.max_in_flight = 0
+    with serving(PageHandler) as url:
+        yield url
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = ScraperEngine(PageCache(str(tmp_path / "pages")), max_per_host=10)
+    yield engine
+    engine.close()
+
+
+def test_parses_like_web_base_loader(server, engine):
+    from langchain_community.document_loaders import WebBaseLoader
+
+    url = f"{server}/page/1"
+
+    assert Scraper([url], engine).run() == WebBaseLoader(url).load()
+
+
+def test_revalidates_cached_pages(server, engine):
+    urls = [f"{server}/page/{i}" for i in range(5)]
+
+    first = Scraper(urls, engine).run()
+    second = Scraper(urls, engine).run()
+
+    assert [d.page_content for d in first] == [d.page_content for d in second]
+    assert engine.stats.downloads == 5
+    assert engine.stats.revalidated == 5
+
+
+def test_limits_requests_per_host(server, tmp_path):
+    engine = ScraperEngine(None, max_per_host=2)
+    try:
+        Scraper([f"{server}/page/{i}" for i in range(8)], engine).run()
+    finally:
+        engine.close()
+
+    assert PageHandler.max_in_flight == 2
+
+
+def test_arun_shares_the_engine(server, engine):
+    async def scrape():
+        return await Scraper([f"{server}/page/1"], engine).arun()
+
+    assert asyncio.run(scrape())[0].metadata["title"] == "Page /page/1"
+    assert asyncio.run(scrape())[0].metadata["title"] == "Page /page/1"
+    assert engine.stats.revalidated == 1
+
+
+def legacy_run(urls):
+    """The scraper before the engine: a new thread pool and loader per call."""
+    from langchain_community.document_loaders import WebBaseLoader
+
+    with ThreadPoolExecutor(max_workers=10) as executor:
+        futures = [executor.submit(lambda u: WebBaseLoader(u).load(), url) for url in urls]
+        return [doc for future in futures for doc in future.result()]
+
+
+def test_scraper_benchmark(server, engine):
+    """Reading 30 local pages: legacy, engine cold, engine revalidating."""
+    urls = [f"{server}/page/{i}" for i in range(30)]
+
+    def timed(fn):
+        start = time.perf_counter()
+        documents = fn()
+        return time.perf_counter() - start, documents
+
+    legacy, expected = timed(lambda: legacy_run(urls))
+    cold, documents = timed(lambda: Scraper(urls, engine).run())
+    warm, revalidated = timed(lambda: Scraper(urls, engine).run())
+
+    print(
+        f"\n30 pages, {PageHandler.latency * 1000:.0f}ms server latency: "
+        f"legacy {legacy:.3f}s, cold {cold:.3f}s, revalidated {warm:.3f}s "
+        f"({engine.stats.revalidated} x 304)"
+    )
+    assert [d.page_content for d in documents] == [d.page_content for d in expected]
+    assert revalidated == documents
+    assert engine.stats.revalidated == 30
+    assert warm < legacy / 2
+
+
+@pytest.fixture(scope="module")
+def paper():
+    return make_pdf(500, lines=10, figure=32 * 1024)
+
+
+def test_pdf_dispatches_on_content_type(server, engine):
+    PageHandler.pdf = make_pdf(3)
+
+    for path in ("/pdf/paper", "/pdf/generic/paper.pdf"):
+        pages = Scraper([f"{server}{path}"], engine).run()
+        assert [page.metadata["page"] for page in pages] == [1, 2, 3]
+        assert "Page 2 line 0: sediment" in pages[1].page_content
+
+
+def test_pdf_peak_memory(server, engine, paper):
+    """Peak memory chunking a 500-page illustrated PDF, streamed vs. buffered."""
+    import io
+    import tracemalloc
+    import httpx
+    from pypdf import PdfReader
+    from botify.rag.chunking import Chunker
+
+    PageHandler.pdf = paper
+    url = f"{server}/pdf/paper"
+    chunker = Chunker()
+
+    def buffered():
+        reader = PdfReader(io.BytesIO(httpx.get(url).content))
+        text = "\n".join(page.extract_text() for page in reader.pages)
+        return chunker.split_documents([Document(page_content=text)])
+
+    def streamed():
+        pages = engine.submit(engine.scrape(url)).result()
+        # Chunks are counted, not kept, as the index embeds them in batches
+        return len(pages), sum(1 for _ in chunker.iter_chunks(pages))
+
+    def peak(fn):
+        tracemalloc.start()
+        result = fn()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        return peak, result
+
+    buffered_peak, buffered_chunks = peak(buffered)
+    streamed_peak, (pages, chunks) = peak(streamed)
+
+    print(
+        f"\n500-page PDF ({len(paper) / 1e6:.1f}MB) to {chunks} chunks: peak "
+        f"memory buffered {buffered_peak / 1e6:.1f}MB, "
+        f"streamed {streamed_peak / 1e6:.1f}MB"
+    )
+    assert pages == 500
+    assert chunks >= len(buffered_chunks) > 0
+    # The streamed peak does not grow with the file size
+    assert streamed_peak < len(paper) / 2 < buffered_peak
+
+
+def test_spooled_pages_are_read_back_from_disk(server, engine):
+    import os
+
+    PageHandler.pdf = make_pdf(3)
+
+    pages = engine.submit(engine.scrape(f"{server}/pdf/paper")).result()
+
+    assert len(pages) == 3
+    # Iterable more than once, as the index keys and then chunks them
+    assert [p.metadata["page"] for p in pages] == [1, 2, 3]
+    assert list(pages) == list(pages)
+    pages.close()
+    assert not os.path.exists(pages.path)
+
+
+def test_revalidated_pdfs_are_spooled_from_the_cache(server, engine):
+    from botify.scraper.scraper import SpooledDocuments
+
+    PageHandler.pdf = make_pdf(3)
+    url = f"{server}/pdf/cached/paper"
+
+    first = engine.submit(engine.scrape(url)).result()
+    second = engine.submit(engine.scrape(url)).result()
+
+    assert engine.stats.revalidated == 1
+    assert isinstance(second, SpooledDocuments)
+    assert list(second) == list(first)
+    first.close()
+    second.close()
+
+
+def test_page_cache_evicts_least_recently_used_pages(tmp_path):
+    import os
+    from botify.scraper.scraper import CachedPage
+
+    def page(url, text="text"):
+        return CachedPage(url, '"etag"', None, [Document(page_content=text)])
+
+    cache = PageCache(str(tmp_path), max_bytes=10**6, max_entries=2)
+
+    def cached():
+        return sorted(url for url in "abcd" if os.path.exists(cache._path(url)))
+
+    cache.put(page("a"))
+    cache.put(page("b"))
+    os.utime(cache._path("a"), (1, 1))
+    os.utime(cache._path("b"), (2, 2))
+    # Revalidating "a" makes "b" the least recently used
+    cache.get("a").documents.close()
+    cache.put(page("c"))
+    assert cached() == ["a", "c"]
+
+    cache.max_bytes = 1000
+    cache.put(page("d", "x" * 900))
+    assert cached() == ["d"]
@@ -0,0 +1,174 @@
+import asyncio
+from datetime import datetime
+import pytest
+from botify.agent.agents.base_agent import BaseAgent
+from botify.models.agent_session import AgentSession
+from botify.services.agent_service import AgentService
+from botify.services.session_cache import SessionCache
+
+
+class WeightedAgent(BaseAgent):
+    def __init__(self, weight: int = 1):
+        self.weight = weight
+        self.weighed = 0
+        self.closed = False
+
+    def generate_flow(self):
+        return None
+
+    def run(self, inputs, config):
+        return {"messages": []}
+
+    def resource_weight(self) -> int:
+        self.weighed += 1
+        return self.weight
+
+    def close(self) -> None:
+        self.closed = True
+
+
+def make_session(session_id: str, weight: int = 1) -> AgentSession:
+    return AgentSession(
+        session_id=session_id,
+        agent_type="test",
+        created_at=datetime.now(),
+        last_used=datetime.now(),
+        metadata={},
+        agent=WeightedAgent(weight),
+    )
+
+
+@pytest.fixture
+def evicted():
+    return []
+
+
+def make_cache(evicted, **kwargs) -> SessionCache:
+    kwargs.setdefault("max_sessions", 100)
+    kwargs.setdefault("idle_ttl_seconds", 3600)
+    kwargs.setdefault("max_weight", 1000)
+    return SessionCache(on_evict=lambda s: evicted.append(s.session_id), **kwargs)
+
+
+def test_evicts_least_recently_used_over_max_sessions(evicted):
+    cache = make_cache(evicted, max_sessions=2)
+    cache.put(make_session("a"))
+    cache.put(make_session("b"))
+    cache.get("a")
+    cache.put(make_session("c"))
+
+    assert evicted == ["b"]
+    assert "a" in cache and "c" in cache
+
+
+def test_evicts_by_weight(evicted):
+    cache = make_cache(evicted, max_weight=10)
+    cache.put(make_session("small", weight=2))
+    cache.put(make_session("big", weight=5))
+    cache.put(make_session("new", weight=4))
+
+    assert evicted == ["small"]
+    assert cache.total_weight == 9
+
+
+def test_weights_are_only_refreshed_by_reweigh(evicted):
+    cache = make_cache(evicted, max_weight=10)
+    session = make_session("a", weight=2)
+    cache.put(session)
+    cache.put(make_session("b", weight=2))
+    for _ in range(100):
+        cache.get("a")
+
+    assert session.agent.weighed == 1
+    session.agent.weight = 9
+    cache.reweigh("a")
+    assert cache.total_weight == 9
+    assert evicted == ["b"]
+
+
+def test_idle_sessions_expire(evicted):
+    cache = make_cache(evicted, idle_ttl_seconds=0)
+    cache.put(make_session("a"))
+    cache.put(make_session("b"))
+
+    assert cache.evict_expired() == 2
+    assert evicted == ["a", "b"]
+    assert len(cache) == 0
+    assert cache.total_weight == 0
+
+
+def test_expiry_stops_at_first_fresh_session(evicted):
+    cache = make_cache(evicted, max_sessions=2000, idle_ttl_seconds=3600)
+    for i in range(1000):
+        cache.put(make_session(str(i)))
+
+    assert cache.evict_expired() == 0
+    assert evicted == []
+
+
+def test_pinned_sessions_are_not_evicted(evicted):
+    cache = make_cache(evicted, max_sessions=2, idle_ttl_seconds=0)
+    cache.put(make_session("busy"))
+    cache.pin("busy")
+    cache.put(make_session("a"))
+    cache.put(make_session("b"))
+
+    assert evicted == ["a"]
+    assert cache.evict_expired() == 1
+    assert evicted == ["a", "b"]
+    assert "busy" in cache
+
+    cache.unpin("busy")
+    assert cache.evict_expired() == 1
+
+
+def test_service_closes_evicted_agents():
+    service = AgentService(sessions=SessionCache(max_sessions=1))
+    first = make_session("first")
+    service.sessions.put(first)
+    service.sessions.put(make_session("second"))
+
+    assert first.agent.closed
+    assert service.get_session("first") is None
+
+
+def test_reaper_evicts_idle_sessions():
+    service = AgentService(sessions=SessionCache(idle_ttl_seconds=0))
+    session = make_session("idle")
+    service.sessions.put(session)
+
+    async def scenario():
+        service.start_reaper(interval_seconds=0.01)
+        await asyncio.sleep(0.05)
+        await service.stop_reaper()
+
+    asyncio.run(scenario())
+
+    assert session.agent.closed
+    assert len(service.sessions) == 0
+
+
+def test_each_message_touches_the_store_once(slow_llm):
+    from botify.agent.agents.chat_agent import ChatAgent
+    from botify.services.session_store import InMemorySessionStore
+    from test_agent_concurrency import add_session
+
+    class CountingStore(InMemorySessionStore):
+        touches = 0
+
+        def touch_session(self, session_id, last_used):
+            self.touches += 1
+            super().touch_session(session_id, last_used)
+
+    slow_llm.delay = 0
+    store = CountingStore()
+    service = AgentService(store=store)
+    add_session(service, "session", ChatAgent(slow_llm))
+
+    async def scenario():
+        for _ in range(3):
+            await service.process_message("hi", "session")
+
+    asyncio.run(scenario())
+
+    assert store.touches == 3
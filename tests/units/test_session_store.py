@@ -0,0 +1,212 @@
+import asyncio
+from datetime import datetime, timedelta
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage
+from botify.agent.agent_factory import AgentFactory
+from botify.agent.agents.base_agent import BaseAgent
+from botify.config import settings
+from botify.handlers.bot_handler import BotHandler
+from botify.handlers.persistence import SessionStorePersistence
+from botify.rag.chunking import ChunkingConfig
+from botify.services.agent_service import AgentService
+from botify.services.session_cache import SessionCache
+from botify.services.session_store import (
+    InMemorySessionStore,
+    SessionRecord,
+    SQLiteSessionStore,
+)
+
+
+class CountingAgent(BaseAgent):
+    """Replies with how many messages its history held before the turn."""
+
+    instances = 0
+
+    def __init__(self, llm, topic: str = ""):
+        self.topic = topic
+        CountingAgent.instances += 1
+
+    def generate_flow(self):
+        return None
+
+    def run(self, inputs, config):
+        history = self.history_factory(config["configurable"]["session_id"])
+        reply = AIMessage(content=f"{self.topic}:{len(history.messages)}")
+        history.add_messages(inputs["messages"] + [reply])
+        return {"messages": [reply]}
+
+
+@pytest.fixture
+def counting_agent(monkeypatch):
+    monkeypatch.setitem(AgentFactory._agent_classes, "counting", CountingAgent)
+    CountingAgent.instances = 0
+    return CountingAgent
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def store(request, tmp_path):
+    if request.param == "memory":
+        yield InMemorySessionStore()
+    else:
+        store = SQLiteSessionStore(str(tmp_path / "sessions.sqlite3"))
+        yield store
+        store.close()
+
+
+def make_record(session_id: str, last_used: datetime) -> SessionRecord:
+    return SessionRecord(
+        session_id=session_id,
+        agent_type="reader",
+        created_at=last_used,
+        last_used=last_used,
+        metadata={"url": "https://example.com"},
+    )
+
+
+def test_sessions_and_messages_round_trip(store):
+    now = datetime.now()
+    store.save_session(make_record("s1", now))
+    store.chat_history("s1").add_messages(
+        [HumanMessage(content="hi"), AIMessage(content="hello")]
+    )
+
+    assert store.load_session("s1") == make_record("s1", now)
+    assert [m.content for m in store.chat_history("s1").messages] == ["hi", "hello"]
+    assert store.load_session("missing") is None
+
+    store.delete_session("s1")
+    assert store.load_session("s1") is None
+    assert store.load_messages("s1") == []
+
+
+def test_purge_before(store):
+    now = datetime.now()
+    store.save_session(make_record("old", now - timedelta(days=40)))
+    store.save_session(make_record("new", now))
+    store.append_messages("old", [HumanMessage(content="hi")])
+
+    assert store.purge_before(now - timedelta(days=30)) == 1
+    assert store.load_session("old") is None
+    assert store.load_messages("old") == []
+    assert store.load_session("new") is not None
+
+
+def test_sqlite_survives_reopen(tmp_path):
+    path = str(tmp_path / "sessions.sqlite3")
+    store = SQLiteSessionStore(path)
+    store.save_session(make_record("s1", datetime.now()))
+    store.append_messages("s1", [HumanMessage(content="hi")])
+    store.save_user_data(42, {"session_id": "s1"})
+    store.close()
+
+    reopened = SQLiteSessionStore(path)
+    assert reopened.load_session("s1").metadata == {"url": "https://example.com"}
+    assert [m.content for m in reopened.load_messages("s1")] == ["hi"]
+    assert reopened.load_user_data() == {42: {"session_id": "s1"}}
+    reopened.close()
+
+
+def test_sqlite_batches_writes(tmp_path):
+    store = SQLiteSessionStore(
+        str(tmp_path / "sessions.sqlite3"), batch_size=10, flush_interval_seconds=3600
+    )
+    for i in range(9):
+        store.append_messages("s1", [HumanMessage(content=str(i))])
+    assert store.pending_writes == 9
+
+    store.append_messages("s1", [HumanMessage(content="9")])
+    assert store.pending_writes == 0
+
+    store.append_messages("s1", [HumanMessage(content="10")])
+    # Reads flush first, so they see buffered writes
+    assert len(store.load_messages("s1")) == 11
+    store.close()
+
+
+def test_sqlite_histories_follow_other_processes(tmp_path):
+    path = str(tmp_path / "sessions.sqlite3")
+    # One store per process, each batching its writes
+    stores = [
+        SQLiteSessionStore(path, batch_size=100, flush_interval_seconds=3600)
+        for _ in range(2)
+    ]
+    first, second = (store.chat_history("s1") for store in stores)
+
+    first.add_messages([HumanMessage(content="hi")])
+    # Added turns are written out, not left in the batch
+    assert stores[0].pending_writes == 0
+    assert [m.content for m in second.messages] == ["hi"]
+
+    second.add_messages([AIMessage(content="hello")])
+    assert [m.content for m in first.messages] == ["hi", "hello"]
+    first.add_messages([HumanMessage(content="bye")])
+    second.clear()
+    assert first.messages == []
+    for store in stores:
+        store.close()
+
+
+def test_session_rehydrates_after_restart(tmp_path, counting_agent):
+    path = str(tmp_path / "sessions.sqlite3")
+    chunking = ChunkingConfig("sentence", chunk_size=200, chunk_overlap=20)
+
+    first = AgentService(store=SQLiteSessionStore(path))
+    session = first.create_agent("counting", topic="rivers")
+    assert asyncio.run(first.process_message("one", session.session_id)) == "rivers:0"
+    first.close()
+
+    restarted = AgentService(store=SQLiteSessionStore(path))
+    assert session.session_id not in restarted.sessions
+    assert asyncio.run(restarted.process_message("two", session.session_id)) == (
+        "rivers:2"
+    )
+    assert counting_agent.instances == 2
+    restarted.close()
+
+    # Dataclass metadata is persisted as JSON
+    store = SQLiteSessionStore(path)
+    store.save_session(
+        SessionRecord("s2", "reader", datetime.now(), datetime.now(), {"chunking": chunking})
+    )
+    assert ChunkingConfig(**store.load_session("s2").metadata["chunking"]) == chunking
+    store.close()
+
+
+def test_evicted_session_rehydrates_once(counting_agent):
+    service = AgentService(
+        sessions=SessionCache(max_sessions=1), store=InMemorySessionStore()
+    )
+    session = service.create_agent("counting")
+    service.create_agent("counting")
+    assert session.session_id not in service.sessions
+
+    async def scenario():
+        return await asyncio.gather(
+            service.process_message("a", session.session_id),
+            service.process_message("b", session.session_id),
+        )
+
+    assert sorted(asyncio.run(scenario())) == [":0", ":2"]
+    assert counting_agent.instances == 3
+
+
+def test_user_data_persistence():
+    store = InMemorySessionStore()
+    persistence = SessionStorePersistence(store)
+
+    async def scenario():
+        await persistence.update_user_data(1, {"session_id": "s1"})
+        await persistence.flush()
+        return await SessionStorePersistence(store).get_user_data()
+
+    assert asyncio.run(scenario()) == {1: {"session_id": "s1"}}
+
+
+def test_only_the_bot_persists_sessions_by_default():
+    assert isinstance(AgentService().store, InMemorySessionStore)
+
+    store = BotHandler().agent_service.store
+
+    assert isinstance(store, SQLiteSessionStore)
+    assert store.path == settings.session_store_path
+    store.close()
@@ -0,0 +1,113 @@
+import json
+import os
+import subprocess
+import sys
+import time
+from importlib.metadata import EntryPoint
+from botify.agent import agent_factory
+from botify.agent.agent_factory import AgentFactory
+from botify.agent.agents.base_agent import BaseAgent
+
+# Modules only needed once an agent runs, which starting the bot must not import
+DEFERRED_MODULES = [
+    "botify.agent.agents.chat_agent",
+    "botify.agent.agents.reader_agent",
+    "langchain_community",
+    "langchain_openai",
+    "langfuse",
+]
+
+STARTUP_SCRIPT = """
+import json, sys, time
+start = time.perf_counter()
+import botify.main
+imported = time.perf_counter()
+botify.main.build_apps()
+agents = botify.main.BotHandler().agent_service.get_available_agents()
+ready = time.perf_counter()
+print(json.dumps({
+    "import": imported - start,
+    "ready": ready - start,
+    "agents": agents,
+    "loaded": [name for name in %r if name in sys.modules],
+}))
+""" % (DEFERRED_MODULES,)
+
+
+class EchoAgent(BaseAgent):
+    def generate_flow(self):
+        return None
+
+    def run(self, inputs, config):
+        return inputs
+
+
+def run_python(*args: str) -> subprocess.CompletedProcess:
+    env = dict(
+        os.environ,
+        OPENAI_API_KEY="test",
+        TAVILY_API_KEY="test",
+        TELE_BOT_TOKEN="123456:TEST-TOKEN",
+    )
+    return subprocess.run(
+        [sys.executable, *args], env=env, capture_output=True, text=True, check=True
+    )
+
+
+def test_agents_load_on_first_use(monkeypatch):
+    echo = EntryPoint(
+        name="echo",
+        value="test_startup:EchoAgent",
+        group=agent_factory.ENTRY_POINT_GROUP,
+    )
+    monkeypatch.setattr(agent_factory, "entry_points", lambda group: [echo])
+    monkeypatch.setattr(AgentFactory, "_agent_specs", {})
+    monkeypatch.setattr(AgentFactory, "_agent_classes", {})
+
+    assert AgentFactory.get_available_agents() == ["chat", "reader", "echo"]
+    assert AgentFactory._agent_classes == {}
+
+    agent = AgentFactory.create("echo")
+
+    assert isinstance(agent, EchoAgent)
+    assert list(AgentFactory._agent_classes) == ["echo"]
+
+
+def test_startup_benchmark():
+    """Import time and wall-clock time until the bot is ready to start.
+
+    Ready means the bot and API apps are built and the agents listed, as
+    the bot does before it takes its first update.
+    """
+    startup = json.loads(run_python("-c", STARTUP_SCRIPT).stdout.splitlines()[-1])
+
+    # Cumulative import time of botify.main, as reported by -X importtime
+    importtime = run_python("-X", "importtime", "-c", "import botify.main").stderr
+    cumulative_us = next(
+        int(line.split("|")[1])
+        for line in importtime.splitlines()
+        if line.split("|")[-1].strip() == "botify.main"
+    )
+    print(
+        f"\nstartup: import botify.main {startup['import']:.2f}s "
+        f"(-X importtime {cumulative_us / 1e6:.2f}s), "
+        f"ready {startup['ready']:.2f}s"
+    )
+
+    assert startup["agents"] == ["chat", "reader"]
+    assert startup["loaded"] == []
+
+
+def test_agent_creation_after_lazy_startup():
+    """Creating the first agent imports only that agent's module."""
+    start = time.perf_counter()
+    script = (
+        "import sys; from botify.agent.agent_factory import AgentFactory; "
+        "AgentFactory.create('chat'); "
+        f"print([name for name in {DEFERRED_MODULES!r} if name in sys.modules])"
+    )
+    loaded = run_python("-c", script).stdout.splitlines()[-1]
+    print(f"\nfirst chat agent, from a cold start: {time.perf_counter() - start:.2f}s")
+
+    assert "botify.agent.agents.chat_agent" in loaded
+    assert "botify.agent.agents.reader_agent" not in loaded
@@ -0,0 +1,178 @@
+import asyncio
+import time
+from datetime import datetime
+from unittest.mock import AsyncMock, Mock
+import pytest
+from telegram.error import RetryAfter
+import botify.handlers.bot_handler as bot_handler_module
+from botify.agent.agents.chat_agent import ChatAgent
+from botify.config import Settings
+from botify.handlers.bot_handler import BotHandler
+from botify.handlers.streaming import MAX_MESSAGE_LENGTH, TelegramMessageStreamer
+from botify.models.agent_session import AgentSession
+from botify.services.agent_service import AgentService
+from botify.services.session_store import InMemorySessionStore
+from conftest import StreamingFakeChatModel
+
+
+class StubChat:
+    """Records the messages a handler sends and edits, with timestamps."""
+
+    def __init__(self, text: str = "hi"):
+        self.started = time.perf_counter()
+        self.sent = []
+        self.edits = []
+        self.placeholder = Mock()
+        self.placeholder.edit_text = AsyncMock(side_effect=self._edit)
+        self.message = Mock(text=text)
+        self.message.reply_text = AsyncMock(side_effect=self._reply)
+
+    async def _reply(self, text):
+        self.sent.append((time.perf_counter() - self.started, text))
+        return self.placeholder
+
+    async def _edit(self, text):
+        self.edits.append((time.perf_counter() - self.started, text))
+
+
+@pytest.fixture
+def streaming_llm():
+    return StreamingFakeChatModel(token_delay=0.05)
+
+
+def make_handler(llm) -> BotHandler:
+    handler = BotHandler()
+    handler.agent_service = AgentService(store=InMemorySessionStore())
+    agent = ChatAgent(llm)
+    handler.agent_service.sessions.put(
+        AgentSession(
+            session_id="session",
+            agent_type="chat",
+            created_at=datetime.now(),
+            last_used=datetime.now(),
+            metadata={},
+            agent=agent,
+        )
+    )
+    return handler
+
+
+def handle(handler: BotHandler, chat: StubChat) -> None:
+    context = Mock(user_data={"session_id": "session"})
+    chat.started = time.perf_counter()
+    asyncio.run(handler.echo(Mock(message=chat.message), context))
+
+
+def test_agent_stream_yields_growing_text(streaming_llm):
+    agent = ChatAgent(streaming_llm)
+
+    async def collect():
+        return [
+            text
+            async for text in agent.astream(
+                {"messages": []}, {"configurable": {"session_id": "s"}}
+            )
+        ]
+
+    texts = asyncio.run(collect())
+
+    assert len(texts) > 5
+    assert all(b.startswith(a) for a, b in zip(texts, texts[1:]))
+    assert texts[-1] == streaming_llm.reply
+
+
+def test_rejected_messages_get_a_single_reply(streaming_llm):
+    from botify.services.scheduler import FairScheduler
+
+    handler = make_handler(streaming_llm)
+    handler.agent_service.scheduler = FairScheduler(user_rate=0.01, user_burst=1)
+    chats = [StubChat(), StubChat()]
+    context = Mock(user_data={"session_id": "session"})
+
+    async def scenario():
+        for chat in chats:
+            update = Mock(message=chat.message, effective_user=Mock(id=1))
+            await handler.echo(update, context)
+
+    asyncio.run(scenario())
+
+    answered, rejected = chats
+    assert answered.edits[-1][1] == streaming_llm.reply
+    assert len(rejected.sent) == 1
+    assert rejected.sent[0][1].startswith("You are sending messages too fast")
+    assert rejected.edits == []
+
+
+def test_streamer_throttles_edits():
+    chat = StubChat()
+    streamer = TelegramMessageStreamer(chat.message, min_edit_interval=0.1)
+
+    async def scenario():
+        await streamer.start()
+        text = ""
+        for word in "one two three four five six seven eight nine ten".split():
+            text += word + " "
+            await streamer.update(text)
+            await asyncio.sleep(0.02)
+        await streamer.finish(text.strip())
+
+    asyncio.run(scenario())
+
+    assert 2 <= len(chat.edits) <= 4
+    assert chat.edits[-1][1] == "one two three four five six seven eight nine ten"
+
+
+def test_streamer_backs_off_on_retry_after():
+    chat = StubChat()
+    chat.placeholder.edit_text = AsyncMock(side_effect=[None, RetryAfter(30), None])
+    streamer = TelegramMessageStreamer(chat.message, min_edit_interval=0)
+
+    async def scenario():
+        await streamer.start()
+        await streamer.update("a")
+        await streamer.update("a b")  # flood control, backs off for 30s
+        await streamer.update("a b c")  # skipped while backing off
+        chat.placeholder.edit_text.side_effect = [RetryAfter(0), None]
+        await streamer.finish("a b c d")
+
+    asyncio.run(scenario())
+
+    texts = [call.args[0] for call in chat.placeholder.edit_text.call_args_list]
+    assert texts == ["a", "a b", "a b c d", "a b c d"]
+
+
+def test_long_answers_are_split():
+    chat = StubChat()
+    streamer = TelegramMessageStreamer(chat.message)
+
+    async def scenario():
+        await streamer.start()
+        await streamer.finish("x" * (MAX_MESSAGE_LENGTH + 10))
+
+    asyncio.run(scenario())
+
+    assert chat.edits[-1][1] == "x" * MAX_MESSAGE_LENGTH
+    assert chat.sent[-1][1] == "x" * 10
+
+
+def test_time_to_first_token(streaming_llm, monkeypatch):
+    """Streaming shows the first words long before the full answer is ready."""
+    with monkeypatch.context() as patch:
+        patch.setattr(bot_handler_module, "settings", Settings(stream_responses=False))
+        blocking = StubChat()
+        handle(make_handler(streaming_llm), blocking)
+        reply = blocking.sent[-1][0]
+
+    streamed = StubChat()
+    handle(make_handler(streaming_llm), streamed)
+    first_token = next(at for at, text in streamed.edits if text.strip())
+    complete = streamed.edits[-1][0]
+
+    print(
+        f"\ntime to first token: streaming {first_token * 1000:.0f}ms, "
+        f"blocking {reply * 1000:.0f}ms (full answer streamed in "
+        f"{complete * 1000:.0f}ms, {len(streamed.edits)} edits)"
+    )
+    assert streamed.edits[-1][1] == streaming_llm.reply
+    assert blocking.sent[-1][1] == streaming_llm.reply
+    assert first_token < reply / 3
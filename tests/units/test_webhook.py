@@ -0,0 +1,182 @@
+import asyncio
+import json
+import time
+from pathlib import Path
+import httpx
+import pytest
+from telegram import Update
+from telegram.ext import Application, TypeHandler
+from telegram.request import BaseRequest
+import botify.api.telegram as telegram_module
+import botify.app as app_module
+from botify.app import create_api, create_app
+from botify.config import Settings
+
+UPDATES_DIR = Path(__file__).parent.parent / "fixtures" / "updates"
+
+SECRET = "s3cret-token"
+
+BOT_USER = {
+    "id": 7000001,
+    "is_bot": True,
+    "first_name": "Botify",
+    "username": "botify_bot",
+}
+
+
+def recorded_update(name: str) -> dict:
+    return json.loads((UPDATES_DIR / f"{name}.json").read_text())
+
+
+class RecordingRequest(BaseRequest):
+    """Bot API client that answers locally and records the bot's calls."""
+
+    def __init__(self):
+        self.calls = []
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
+
+    def sent(self) -> list:
+        return [params for method, params in self.calls if method == "sendMessage"]
+
+    async def do_request(self, url, method, request_data=None, **timeouts):
+        endpoint = url.rsplit("/", 1)[-1]
+        params = request_data.parameters if request_data is not None else {}
+        self.calls.append((endpoint, params))
+        if endpoint == "getMe":
+            result = BOT_USER
+        else:
+            result = {
+                "message_id": len(self.calls),
+                "date": 0,
+                "chat": {"id": params.get("chat_id"), "type": "private"},
+                "text": params.get("text", ""),
+            }
+        return 200, json.dumps({"ok": True, "result": result}).encode()
+
+
+@pytest.fixture(autouse=True)
+def webhook_settings(monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+    monkeypatch.setenv("TELE_BOT_TOKEN", "123456:TEST-TOKEN")
+    monkeypatch.setattr(
+        telegram_module, "settings", Settings(telegram_webhook_secret=SECRET)
+    )
+
+
+async def post_updates(bot_app: Application, updates, secret=SECRET) -> list:
+    """Post updates to the webhook route of a running bot, returning statuses."""
+    api = create_api(bot_app)
+    transport = httpx.ASGITransport(app=api)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bot") as client:
+        responses = await asyncio.gather(
+            *(
+                client.post(
+                    "/telegram/webhook",
+                    json=update,
+                    headers={"X-Telegram-Bot-Api-Secret-Token": secret},
+                )
+                for update in updates
+            )
+        )
+    return [response.status_code for response in responses]
+
+
+async def wait_for_replies(request: RecordingRequest, count: int, timeout: float = 5):
+    deadline = time.monotonic() + timeout
+    while len(request.sent()) < count and time.monotonic() < deadline:
+        await asyncio.sleep(0.01)
+
+
+def run_bot(bot_app: Application, scenario):
+    async def lifecycle():
+        async with bot_app:
+            await bot_app.start()
+            try:
+                return await scenario()
+            finally:
+                await bot_app.stop()
+
+    return asyncio.run(lifecycle())
+
+
+def test_recorded_updates_are_answered_through_the_webhook():
+    request = RecordingRequest()
+    bot_app = create_app(request=request)
+
+    async def scenario():
+        statuses = await post_updates(
+            bot_app, [recorded_update("message"), recorded_update("agents_command")]
+        )
+        await wait_for_replies(request, 2)
+        return statuses
+
+    assert run_bot(bot_app, scenario) == [200, 200]
+    replies = sorted(request.sent(), key=lambda params: "reply_markup" in params)
+    assert replies[0]["chat_id"] == 51873004
+    assert replies[0]["text"] == "Please select an agent first using /agents command"
+    assert replies[1]["text"].startswith("Current agent: None")
+    buttons = [row[0] for row in replies[1]["reply_markup"]["inline_keyboard"]]
+    assert {"text": "chat", "callback_data": "select_agent:chat"} in buttons
+
+
+@pytest.mark.parametrize("secret", ["wrong", ""])
+def test_updates_without_the_secret_are_rejected(secret):
+    request = RecordingRequest()
+    bot_app = create_app(request=request)
+
+    async def scenario():
+        statuses = await post_updates(bot_app, [recorded_update("message")], secret)
+        return statuses, bot_app.update_queue.qsize()
+
+    assert run_bot(bot_app, scenario) == ([403], 0)
+
+
+def test_webhook_is_closed_without_a_configured_secret(monkeypatch):
+    monkeypatch.setattr(telegram_module, "settings", Settings())
+    bot_app = create_app(request=RecordingRequest())
+
+    async def scenario():
+        return await post_updates(bot_app, [recorded_update("message")], "")
+
+    assert run_bot(bot_app, scenario) == [403]
+
+
+def test_concurrent_updates_benchmark(monkeypatch):
+    """Time to answer a burst of webhook updates, by concurrent_updates."""
+    burst, handler_seconds = 20, 0.1
+
+    async def slow_handler(update, context):
+        # Stands in for an agent run before the reply
+        await asyncio.sleep(handler_seconds)
+
+    results = {}
+    for concurrent in (1, 32):
+        monkeypatch.setattr(
+            app_module, "settings", Settings(telegram_concurrent_updates=concurrent)
+        )
+        request = RecordingRequest()
+        bot_app = create_app(request=request)
+        bot_app.add_handler(TypeHandler(Update, slow_handler), group=-1)
+        updates = [
+            recorded_update("message") | {"update_id": update_id}
+            for update_id in range(burst)
+        ]
+
+        async def scenario():
+            start = time.perf_counter()
+            await post_updates(bot_app, updates)
+            await wait_for_replies(request, burst, timeout=burst * handler_seconds * 2)
+            return time.perf_counter() - start, len(request.sent())
+
+        results[concurrent] = run_bot(bot_app, scenario)
+
+    print(f"\n{burst} updates, {handler_seconds * 1e3:.0f}ms handler each:")
+    for concurrent, (elapsed, replies) in results.items():
+        print(f"concurrent_updates={concurrent:<3} {elapsed:.2f}s, {replies} replies")
+    assert all(replies == burst for _, replies in results.values())
+    assert results[32][0] < results[1][0] / 5